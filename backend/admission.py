@@ -0,0 +1,231 @@
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from metrics import Counter, Gauge, registry as metrics_registry
+
+# ---------- Admission control ----------
+
+# Limits for the image lane (identify, batch identify, combination analysis).
+IMAGE_LANE_MAX_JOBS = int(os.environ.get("IMAGE_LANE_MAX_JOBS", 16))
+IMAGE_LANE_MAX_BYTES = int(os.environ.get("IMAGE_LANE_MAX_BYTES", 128 * 1024 * 1024))
+
+# Per-client token bucket for image routes: sustained requests/second and burst size.
+IMAGE_CLIENT_RATE = float(os.environ.get("IMAGE_CLIENT_RATE", 5))
+IMAGE_CLIENT_BURST = float(os.environ.get("IMAGE_CLIENT_BURST", 20))
+
+# Any of the above can be overridden per lane or per route; see route_policies().
+#   ADMISSION_<LANE>_MAX_JOBS, ADMISSION_<LANE>_MAX_BYTES   limits of one lane ("images" -> IMAGES)
+#   ADMISSION_<ROUTE>_RATE, ADMISSION_<ROUTE>_BURST         one route's per-client token bucket
+#   ADMISSION_<ROUTE>_LANE                                  move a route into a lane of its own name
+# Route names are the ones main.py registers (IDENTIFY, IDENTIFY_BATCH, ANALYZE).
+# Setting MAX_JOBS to 0 closes a lane: its routes answer 503 until it is raised.
+
+# Take the client address from the first X-Forwarded-For hop; only behind a trusted proxy.
+TRUST_FORWARDED_FOR = os.environ.get("TRUST_FORWARDED_FOR", "").lower() in ("1", "true", "yes")
+
+# Buckets kept for at most this many clients; the least recently seen are dropped.
+MAX_TRACKED_CLIENTS = 65536
+
+# Suggested wait when a lane is full. Jobs are short, so clients should retry soon.
+BUSY_RETRY_AFTER = 1
+
+SHED_REQUESTS = metrics_registry.register(
+    Counter("http_requests_shed_total", "Requests rejected by admission control.", ("route", "reason"))
+)
+LANE_JOBS = metrics_registry.register(Gauge("admission_lane_jobs", "Jobs in flight per lane.", ("lane",)))
+LANE_BYTES = metrics_registry.register(
+    Gauge("admission_lane_bytes", "Declared request bytes in flight per lane.", ("lane",))
+)
+
+
+class Lane:
+    """
+    A pool of capacity shared by the routes assigned to it: at most
+    `max_jobs` requests and `max_bytes` of declared request bodies in flight.
+    Routes without a lane (catalog reads) never wait on one, so they stay
+    fast while the image lane is saturated.
+    """
+
+    def __init__(self, name: str, max_jobs: int, max_bytes: Optional[int] = None):
+        self.name = name
+        self.max_jobs = max_jobs
+        self.max_bytes = max_bytes
+        self.jobs = 0
+        self.bytes = 0
+
+    def try_acquire(self, size: int) -> bool:
+        if self.jobs >= self.max_jobs:
+            return False
+        # A single request larger than the whole byte budget still gets in on an idle lane.
+        if self.max_bytes is not None and self.bytes + size > self.max_bytes and self.jobs > 0:
+            return False
+        self.jobs += 1
+        self.bytes += size
+        return True
+
+    def release(self, size: int) -> None:
+        self.jobs -= 1
+        self.bytes -= size
+
+
+class TokenBuckets:
+    """Per-client token buckets, refilled lazily on access."""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # client -> (tokens, updated)
+
+    def take(self, client: str, now: Optional[float] = None) -> float:
+        """Spend one token; returns 0 on success, else seconds until one is available."""
+        now = time.monotonic() if now is None else now
+        tokens, updated = self.buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self.buckets[client] = (tokens, now)
+        if len(self.buckets) > self.max_clients:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+class RoutePolicy:
+    """
+    Admission rules for one route: the lane it draws from, the body size to
+    reserve when a request declares no Content-Length, and an optional
+    per-client rate limit.
+    """
+
+    def __init__(self, lane: Optional[Lane] = None, max_body: int = 0, buckets: Optional[TokenBuckets] = None):
+        self.lane = lane
+        self.max_body = max_body
+        self.buckets = buckets
+
+
+class AdmissionMiddleware:
+    """
+    Shed load before any work is done on a request.
+
+    For routes listed in `policies`, a request is rejected with 429 when its
+    client is out of tokens, or 503 when the route's lane has no room for
+    another job or its declared body; both carry Retry-After. Admitted
+    requests hold their lane reservation until the response is finished.
+    Nothing is queued, so overload turns into fast rejections instead of
+    growing latency for everyone. Shed requests are counted per route and
+    reason in /metrics.
+    """
+
+    def __init__(self, app, policies: Dict[str, RoutePolicy]):
+        self.app = app
+        self.policies = policies
+
+    @staticmethod
+    def client_id(scope) -> str:
+        if TRUST_FORWARDED_FOR:
+            for name, value in scope.get("headers", ()):
+                if name == b"x-forwarded-for":
+                    return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    @staticmethod
+    def declared_size(scope) -> Optional[int]:
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                try:
+                    return int(value)
+                except ValueError:
+                    return None
+        return None
+
+    async def __call__(self, scope, receive, send):
+        policy = self.policies.get(scope["path"]) if scope["type"] == "http" else None
+        if policy is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+
+        if policy.buckets is not None:
+            wait = policy.buckets.take(self.client_id(scope))
+            if wait > 0:
+                await self._shed(send, path, 429, "rate_limited", "Too many requests", wait)
+                return
+
+        lane = policy.lane
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        # Oversize bodies are the upload limit's to reject (413), so reserve at most max_body.
+        size = self.declared_size(scope)
+        size = policy.max_body if size is None else min(size, policy.max_body)
+        if not lane.try_acquire(size):
+            await self._shed(send, path, 503, "lane_full", "Server busy, try again shortly", BUSY_RETRY_AFTER)
+            return
+        self._observe(lane)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.release(size)
+            self._observe(lane)
+
+    @staticmethod
+    def _observe(lane: Lane) -> None:
+        with metrics_registry.lock:
+            LANE_JOBS.set((lane.name,), lane.jobs)
+            LANE_BYTES.set((lane.name,), lane.bytes)
+
+    @staticmethod
+    async def _shed(send, path: str, status: int, reason: str, detail: str, retry_after: float) -> None:
+        with metrics_registry.lock:
+            SHED_REQUESTS.inc((path, reason))
+        body = json.dumps({"detail": detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def _env_override(lane_or_route: str, setting: str, default, cast):
+    value = os.environ.get(f"ADMISSION_{lane_or_route.upper()}_{setting}", "").strip()
+    return cast(value) if value else default
+
+
+def route_policies(routes: Iterable[Tuple[str, str, int]], lane: str = "images") -> Dict[str, RoutePolicy]:
+    """
+    Policies for (name, path, max body size) routes, all drawing from the
+    shared `lane` unless ADMISSION_<NAME>_LANE moves them, each with its own
+    per-client token bucket. Global IMAGE_* settings are the defaults; the
+    ADMISSION_* overrides above are read when this is called.
+    """
+    lanes: Dict[str, Lane] = {}
+    policies = {}
+    for name, path, max_body in routes:
+        lane_name = _env_override(name, "LANE", lane, str).lower()
+        if lane_name not in lanes:
+            lanes[lane_name] = Lane(
+                lane_name,
+                _env_override(lane_name, "MAX_JOBS", IMAGE_LANE_MAX_JOBS, int),
+                _env_override(lane_name, "MAX_BYTES", IMAGE_LANE_MAX_BYTES, int),
+            )
+        buckets = TokenBuckets(
+            _env_override(name, "RATE", IMAGE_CLIENT_RATE, float),
+            _env_override(name, "BURST", IMAGE_CLIENT_BURST, float),
+        )
+        policies[path] = RoutePolicy(lanes[lane_name], max_body, buckets)
+    return policies
@@ -0,0 +1,268 @@
+"""
+Load/latency benchmark for the Food Energy API.
+
+By default the FastAPI app is driven in-process through httpx's ASGI
+transport with a synthetic catalog of the chosen scale swapped in. With
+--url the same scenarios run against a live server instead; start it with
+a matching catalog first (python benchmarks/synthetic.py --out ... and
+CATALOG_PATH=... python main.py), with the admission limits lifted as
+below (e.g. IMAGE_CLIENT_RATE=1000000 IMAGE_CLIENT_BURST=1000000
+IMAGE_LANE_MAX_JOBS=100000), or image scenarios measure 429s.
+
+In-process runs lift admission control's per-client rate limit and lane
+caps: every request comes from one client, so the production defaults
+would shed most of the load and the fast rejections would read as
+throughput.
+
+Reports req/s and p50/p95/p99 latency of successful requests per scenario,
+and exits non-zero when any request fails, a scenario has no stored
+baseline, or one regresses past --threshold against its baseline.
+
+    python benchmarks/bench_api.py --scale small
+    python benchmarks/bench_api.py --scale large --requests 500 --concurrency 32
+    python benchmarks/bench_api.py --scale small --update-baseline
+    python benchmarks/bench_api.py --url http://localhost:8000 --scale small
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from benchmarks.synthetic import SCALES, catalog_for_scale  # noqa: E402
+
+# Set before main (and so admission.py) is imported; explicit environment values win.
+ADMISSION_OVERRIDES = {
+    "IMAGE_CLIENT_RATE": "1000000",
+    "IMAGE_CLIENT_BURST": "1000000",
+    "IMAGE_LANE_MAX_JOBS": "100000",
+    "IMAGE_LANE_MAX_BYTES": str(1 << 40),
+}
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# Approximate JPEG payload sizes for identify uploads.
+UPLOAD_SIZES = {"10KB": 10 * 1024, "500KB": 500 * 1024, "4MB": 4 * 1024 * 1024}
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def jpeg_of_size(target_bytes: int, seed: int) -> bytes:
+    """A noisy JPEG of roughly `target_bytes` (noise keeps it from compressing away)."""
+    rng = random.Random(seed)
+    # Noise JPEGs at quality 90 take roughly 4 bytes per pixel; grow in small
+    # steps from just under that so the result stays close to the target.
+    side = max(16, int((target_bytes / 5) ** 0.5))
+    while True:
+        img = Image.frombytes("RGB", (side, side), rng.randbytes(side * side * 3))
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=90)
+        if buffer.tell() >= target_bytes:
+            return buffer.getvalue()
+        side = int(side * 1.04) + 1
+
+
+class Scenario:
+    def __init__(self, name: str, build: Callable[[int], dict]):
+        self.name = name
+        # build(i) -> kwargs for client.request
+        self.build = build
+
+
+def scenarios(catalog: dict, seed: int) -> List[Scenario]:
+    rng = random.Random(seed)
+    food_ids = [food["id"] for food in catalog["foods"].values()]
+    names = [food["name"] for food in catalog["foods"].values()]
+    prefixes = [name.split()[0][: rng.randint(2, 5)].lower() for name in rng.sample(names, min(200, len(names)))]
+    seasons = ["spring", "summer", "fall", "winter"]
+    keys = list(catalog["foods"])
+    pantries = [rng.sample(keys, min(len(keys), rng.randint(3, 12))) for _ in range(50)]
+
+    result = [
+        Scenario("seasons", lambda i: {"method": "GET", "url": f"/api/seasons/{seasons[i % 4]}/foods"}),
+        Scenario("food details", lambda i: {"method": "GET", "url": f"/api/foods/{food_ids[i % len(food_ids)]}"}),
+        Scenario("search", lambda i: {
+            "method": "GET", "url": "/api/foods/search", "params": {"name": prefixes[i % len(prefixes)], "limit": 20},
+        }),
+        Scenario("combinations", lambda i: {
+            "method": "POST", "url": "/api/combinations/analyze",
+            "json": {"imageBase64": "aGVsbG8=", "healthNotes": "cold hands and slow digestion"},
+        }),
+        Scenario("recommendations", lambda i: {
+            "method": "POST", "url": "/api/recommendations",
+            "json": {"season": seasons[i % 4], "conditions": ["Fatigue"], "k": 20},
+        }),
+        Scenario("recipe match", lambda i: {
+            "method": "POST", "url": "/api/recipes/match",
+            "json": {"ingredients": pantries[i % len(pantries)], "season": seasons[i % 4], "k": 10},
+        }),
+        Scenario("markets nearby", lambda i: {
+            "method": "GET", "url": "/api/markets/nearby",
+            "params": {"lat": 40.7, "lon": -74.0, "k": 5, "openNow": "false"},
+        }),
+    ]
+
+    for label, size in UPLOAD_SIZES.items():
+        payload = jpeg_of_size(size, seed)
+
+        def cold(i: int, payload=payload) -> dict:
+            # Unique trailing bytes defeat the digest cache; JPEG decoders ignore them.
+            body = payload + i.to_bytes(8, "big")
+            return {"method": "POST", "url": "/api/food/identify", "files": {"file": ("p.jpg", body, "image/jpeg")}}
+
+        def warm(i: int, payload=payload) -> dict:
+            return {"method": "POST", "url": "/api/food/identify", "files": {"file": ("p.jpg", payload, "image/jpeg")}}
+
+        result.append(Scenario(f"identify {label}", cold))
+        result.append(Scenario(f"identify {label} cached", warm))
+    return result
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in counter:
+            kwargs = scenario.build(i)
+            start = time.perf_counter()
+            try:
+                response = await client.request(**kwargs)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            # Errors (429/503 shedding included) are usually fast; timing them would read as a speed-up.
+            if response.status_code >= 400:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    # One untimed request so lazy setup (process pool, render caches) isn't measured.
+    await client.request(**scenario.build(requests))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+    }
+
+
+def compare(results: Dict[str, dict], baselines: Dict[str, dict], threshold: float) -> List[str]:
+    regressions = []
+    for key, result in results.items():
+        if result["errors"]:
+            regressions.append(f"{key}: {result['errors']} of {result['requests']} requests failed")
+        baseline = baselines.get(key)
+        if baseline is None:
+            regressions.append(f"{key}: no stored baseline (record one with --update-baseline)")
+            continue
+        if result["rps"] < baseline["rps"] * (1 - threshold):
+            regressions.append(f"{key}: {result['rps']:.0f} req/s vs baseline {baseline['rps']:.0f}")
+        if result["p95_ms"] > baseline["p95_ms"] * (1 + threshold):
+            regressions.append(f"{key}: p95 {result['p95_ms']:.2f}ms vs baseline {baseline['p95_ms']:.2f}ms")
+    return regressions
+
+
+async def run(args) -> Dict[str, dict]:
+    catalog = catalog_for_scale(args.scale, args.seed)
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+        shutdown = None
+    else:
+        for name, value in ADMISSION_OVERRIDES.items():
+            os.environ.setdefault(name, value)
+        import main
+        from catalog import snapshot_from_dict
+        from imaging import shutdown_process_pool
+
+        main.catalog.swap(snapshot_from_dict(catalog))
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=60)
+        shutdown = shutdown_process_pool
+
+    selected = [s for s in scenarios(catalog, args.seed) if not args.only or any(o in s.name for o in args.only)]
+    results = {}
+    try:
+        async with client:
+            for scenario in selected:
+                result = await run_scenario(client, scenario, args.requests, args.concurrency)
+                results[f"{args.scale}/{scenario.name}"] = result
+                print(
+                    f"{scenario.name:<24} {result['rps']:9.1f} req/s  p50 {result['p50_ms']:8.2f}ms  "
+                    f"p95 {result['p95_ms']:8.2f}ms  p99 {result['p99_ms']:8.2f}ms  errors {result['errors']}"
+                )
+    finally:
+        if shutdown is not None:
+            shutdown()
+    return results
+
+
+def load_baselines(path: str) -> Dict[str, dict]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--url", help="benchmark a live server instead of the in-process app")
+    parser.add_argument("--only", nargs="*", help="run only scenarios whose name contains one of these")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    baselines = load_baselines(args.baseline)
+    if args.update_baseline:
+        failed = [key for key, r in results.items() if r["errors"]]
+        if failed:
+            sys.exit(f"Not updating baselines; scenarios with errors: {', '.join(failed)}")
+        baselines.update({key: {"rps": r["rps"], "p95_ms": r["p95_ms"]} for key, r in results.items()})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Updated baselines in {args.baseline}")
+        return
+
+    regressions = compare(results, baselines, args.threshold)
+    if regressions:
+        print("\nRegressions:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo errors and no regressions against stored baselines.")
+
+
+if __name__ == "__main__":
+    main()
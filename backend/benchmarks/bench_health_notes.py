@@ -0,0 +1,144 @@
+"""
+Health-notes matching benchmark: the compiled rule engine against per-rule
+substring tests (how /api/combinations/analyze used to read healthNotes).
+
+Generates a synthetic rule table and notes of several lengths, checks that
+the engine finds the same conditions as a per-term word-boundary regex
+scan, then reports build time and per-note latency for each approach.
+
+    python benchmarks/bench_health_notes.py
+    python benchmarks/bench_health_notes.py --rules 50000 --notes 20
+"""
+import argparse
+import os
+import random
+import re
+import statistics
+import sys
+import time
+from typing import Callable, List, Set
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from health_notes import HealthNotesMatcher, normalize_notes  # noqa: E402
+
+SYLLABLES = [
+    "ba", "bo", "chi", "da", "fen", "gu", "ha", "jin", "ka", "lo", "mi", "na",
+    "pe", "qi", "ru", "sa", "shu", "ta", "wu", "xi", "ya", "zhe", "lan", "mei",
+]
+NOTE_LENGTHS = (200, 2_000, 20_000)
+
+
+def _word(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def synthetic_rules(count: int, seed: int) -> List[dict]:
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        terms = []
+        for _ in range(rng.randint(1, 4)):
+            term = " ".join(_word(rng) for _ in range(1 if rng.random() < 0.7 else 2))
+            terms.append(term + "*" if rng.random() < 0.1 else term)
+        rules.append({
+            "id": f"c{i}",
+            "condition": f"Condition {i}",
+            "terms": terms,
+            "recommendation": f"Advice {i}",
+            "weight": rng.choice([1.0, 1.5, 2.0]),
+        })
+    return rules
+
+
+def synthetic_notes(rules: List[dict], length: int, rng: random.Random) -> str:
+    """Filler words and punctuation with a term from a random rule every dozen words or so."""
+    words = []
+    size = 0
+    while size < length:
+        if rng.random() < 0.08:
+            word = rng.choice(rng.choice(rules)["terms"]).rstrip("*")
+        else:
+            word = _word(rng)
+        if rng.random() < 0.1:
+            word += rng.choice([",", ".", ";"])
+        words.append(word.title() if rng.random() < 0.1 else word)
+        size += len(word) + 1
+    return " ".join(words)
+
+
+def substring_scan(rules: List[dict]) -> Callable[[str], Set[str]]:
+    """The old approach: lowercase the notes and test every term with `in`."""
+    def scan(notes: str) -> Set[str]:
+        return {
+            rule["condition"] for rule in rules
+            if any(term.rstrip("*") in notes.lower() for term in rule["terms"])
+        }
+    return scan
+
+
+def regex_scan(rules: List[dict]) -> Callable[[str], Set[str]]:
+    """Reference: one word-boundary regex per term over normalized notes."""
+    compiled = [
+        (rule["condition"], [
+            re.compile(r"(?<!\S)" + re.escape(normalize_notes(t.rstrip("*"))) + ("" if t.endswith("*") else r"(?!\S)"))
+            for t in rule["terms"]
+        ])
+        for rule in rules
+    ]
+
+    def scan(notes: str) -> Set[str]:
+        text = normalize_notes(notes)
+        return {condition for condition, patterns in compiled if any(p.search(text) for p in patterns)}
+    return scan
+
+
+def timed(fn: Callable[[str], object], notes: List[str]) -> float:
+    """Median milliseconds per call."""
+    samples = []
+    for text in notes:
+        start = time.perf_counter()
+        fn(text)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rules", type=int, default=10_000)
+    parser.add_argument("--notes", type=int, default=10, help="notes per length")
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules = synthetic_rules(args.rules, args.seed)
+    terms = sum(len(rule["terms"]) for rule in rules)
+
+    start = time.perf_counter()
+    engine = HealthNotesMatcher.from_rules(rules)
+    print(f"{args.rules} rules / {terms} terms compiled in {time.perf_counter() - start:.2f}s")
+
+    # Negation is an engine feature the reference scan lacks, so compare without it.
+    plain = HealthNotesMatcher.from_rules(rules, negation_cues=())
+    reference = regex_scan(rules)
+    for length in NOTE_LENGTHS:
+        for _ in range(3):
+            text = synthetic_notes(rules, length, rng)
+            if {c.condition for c in plain.match(text)} != reference(text):
+                sys.exit(f"engine and reference disagree on a {length}-character note")
+    print("engine agrees with the per-term regex reference")
+
+    approaches = {
+        "substring per term": substring_scan(rules),
+        "regex per term": reference,
+        "compiled engine": lambda text: engine.match(text),
+    }
+    print(f"{'notes':>8}  " + "".join(f"{name:>22}" for name in approaches))
+    for length in NOTE_LENGTHS:
+        notes = [synthetic_notes(rules, length, rng) for _ in range(args.notes)]
+        row = [f"{timed(fn, notes):18.2f} ms" for fn in approaches.values()]
+        print(f"{length:>8}  " + "".join(f"{cell:>22}" for cell in row))
+
+
+if __name__ == "__main__":
+    main()
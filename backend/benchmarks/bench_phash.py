@@ -0,0 +1,127 @@
+"""
+Near-duplicate matching benchmark for the perceptual-hash index.
+
+Reports how often re-encoded copies of a photo (resized, recompressed,
+EXIF stripped, converted to PNG) land on the original, how often unrelated
+photos collide, and the lookup cost at catalog-scale index sizes.
+
+    python benchmarks/bench_phash.py
+    python benchmarks/bench_phash.py --images 300 --index-size 2000000
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw, ImageFilter  # noqa: E402
+
+from phash import DEFAULT_MAX_DISTANCE, PerceptualHashIndex, dhash  # noqa: E402
+
+
+def synthetic_photo(rng: random.Random, size=(800, 600)) -> Image.Image:
+    """Smooth background with a few blurred shapes, roughly like produce on a counter."""
+    img = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(rng.randint(3, 8)):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randint(60, 400), y0 + rng.randint(60, 300)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        if rng.random() < 0.5:
+            draw.ellipse((x0, y0, x1, y1), fill=color)
+        else:
+            draw.rectangle((x0, y0, x1, y1), fill=color)
+    return img.filter(ImageFilter.GaussianBlur(4))
+
+
+def encode(img: Image.Image, fmt: str = "JPEG", **kwargs) -> Image.Image:
+    buffer = io.BytesIO()
+    img.save(buffer, fmt, **kwargs)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+VARIANTS = {
+    "recompressed q=60": lambda img: encode(img, quality=60),
+    "resized 50%": lambda img: encode(img.resize((img.width // 2, img.height // 2)), quality=85),
+    "resized 25%": lambda img: encode(img.resize((img.width // 4, img.height // 4)), quality=85),
+    "png re-encode": lambda img: encode(img, "PNG"),
+    "exif stripped": lambda img: encode(img.copy(), quality=95),
+}
+
+
+def bench_hit_rate(images: int, max_distance: int, seed: int) -> None:
+    rng = random.Random(seed)
+    index = PerceptualHashIndex(max_distance=max_distance)
+    originals = []
+    for i in range(images):
+        img = encode(synthetic_photo(rng), quality=92)
+        originals.append(img)
+        index.add(dhash(img), str(i))
+
+    print(f"hit rate over {images} photos (max distance {max_distance})")
+    for name, variant in VARIANTS.items():
+        hits = correct = 0
+        for i, img in enumerate(originals):
+            match = index.nearest(dhash(variant(img)))
+            if match is not None:
+                hits += 1
+                correct += match[0] == str(i)
+        print(f"  {name:<20} hit {hits / images:6.1%}  same photo {correct / images:6.1%}")
+
+    false_hits = sum(index.nearest(dhash(synthetic_photo(rng))) is not None for _ in range(images))
+    print(f"  {'unrelated photos':<20} hit {false_hits / images:6.1%}")
+
+
+def bench_lookup(index_size: int, queries: int, max_distance: int, seed: int) -> None:
+    rng = random.Random(seed)
+    index = PerceptualHashIndex(max_distance=max_distance, max_entries=index_size)
+    stored = [rng.getrandbits(64) for _ in range(index_size)]
+    start = time.perf_counter()
+    for value in stored:
+        index.add(value, "food")
+    build_seconds = time.perf_counter() - start
+
+    def near(value: int) -> int:
+        for bit in rng.sample(range(64), max_distance):
+            value ^= 1 << bit
+        return value
+
+    workloads = {
+        "near duplicate": [near(rng.choice(stored)) for _ in range(queries)],
+        "unseen hash": [rng.getrandbits(64) for _ in range(queries)],
+    }
+    print(f"lookup cost with {index_size:,} stored hashes (built in {build_seconds:.1f}s)")
+    for name, workload in workloads.items():
+        timings = []
+        for value in workload:
+            start = time.perf_counter()
+            index.nearest(value)
+            timings.append((time.perf_counter() - start) * 1e6)
+        timings.sort()
+        print(
+            f"  {name:<15} mean {statistics.fmean(timings):7.1f}us  "
+            f"p99 {timings[int(len(timings) * 0.99) - 1]:7.1f}us"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--index-size", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=10_000)
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE)
+    parser.add_argument("--seed", type=int, default=13)
+    args = parser.parse_args()
+
+    bench_hit_rate(args.images, args.max_distance, args.seed)
+    print()
+    bench_lookup(args.index_size, args.queries, args.max_distance, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Synthetic catalog generator for benchmarks.
+
+Produces a catalog dict in the same shape as a CATALOG_PATH file (see
+catalog.py), scaled from tens to hundreds of thousands of entries. Output is
+deterministic for a given seed.
+
+    python benchmarks/synthetic.py --scale large --out /tmp/catalog-large.json
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_data import HEALTH_CONDITIONS, HEALTH_NOTE_RULES  # noqa: E402
+
+# foods, recipes, combination rules, markets
+SCALES = {
+    "tiny": (50, 100, 100, 20),
+    "small": (1_000, 2_000, 2_000, 500),
+    "medium": (10_000, 20_000, 20_000, 5_000),
+    "large": (100_000, 200_000, 100_000, 100_000),
+}
+
+SYLLABLES = [
+    "ba", "bo", "chi", "da", "fen", "gu", "ha", "jin", "ka", "lo", "mi", "na",
+    "pe", "qi", "ru", "sa", "shu", "ta", "wu", "xi", "ya", "zhe", "lan", "mei",
+]
+KINDS = ["root", "leaf", "berry", "melon", "bean", "seed", "nut", "herb", "squash", "tea", "grain", "pepper"]
+BENEFITS = [
+    "Warms the body", "aids digestion", "clears heat", "moistens lungs", "tonifies spleen",
+    "nourishes blood", "improves circulation", "provides energy", "relieves cough", "hydrates",
+    "calms the mind", "strengthens kidneys", "reduces swelling", "promotes urination",
+]
+WARNINGS = [
+    None, "Avoid with heat conditions", "Avoid with cold constitution", "Avoid with weak digestion",
+    "Avoid if prone to diarrhea", "Avoid with high blood pressure", "May cause bloating in excess",
+]
+USES = ["tea", "soup", "stir-fry", "salad", "congee", "dessert", "juice", "stew", "roasted", "snack", "sauce"]
+SEASONS = ["spring", "summer", "fall", "winter"]
+ENERGETICS = ["warm", "cold", "neutral"]
+HOURS = ["Mon-Sun: 8AM - 9PM", "Mon-Sun: 6AM - 12AM", "Mon-Fri: 7AM - 10PM, Sat-Sun: 9AM - 8PM", "Sat-Sun: 7AM - 2PM"]
+TIMEZONES = ["America/New_York", "America/Chicago", "America/Denver", "America/Los_Angeles"]
+MARKET_TYPES = ["asian_market", "grocery_store", "farmers_market", "specialty_store"]
+
+
+def _name(rng: random.Random, i: int) -> str:
+    stem = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+    return f"{stem.title()} {rng.choice(KINDS).title()} {i}"
+
+
+def synthetic_catalog(foods: int, recipes: int, rules: int, markets: int, seed: int = 13) -> dict:
+    rng = random.Random(seed)
+
+    food_map = {}
+    for i in range(foods):
+        name = _name(rng, i)
+        key = name.lower().replace(" ", "_")
+        food_map[key] = {
+            "id": str(i + 1),
+            "name": name,
+            "energeticType": rng.choice(ENERGETICS),
+            "season": rng.choice(SEASONS + [None]),
+            "benefits": ", ".join(rng.sample(BENEFITS, 3)),
+            "warnings": rng.choice(WARNINGS),
+            "imageUrl": None,
+            "commonUses": rng.sample(USES, 3),
+        }
+    keys = list(food_map)
+
+    def pick(count: int):
+        chosen = {}
+        while len(chosen) < count:
+            if rng.random() < 0.3:
+                # Skewed towards early keys so a few ingredients are very common, like ginger or rice.
+                index = min(int(rng.paretovariate(1.2)) - 1, len(keys) - 1)
+            else:
+                index = rng.randrange(len(keys))
+            chosen[keys[index]] = None
+        return list(chosen)
+
+    recipe_list = [
+        {
+            "id": f"r{i + 1}",
+            "name": f"Recipe {i + 1}",
+            "ingredients": pick(rng.randint(3, min(8, len(keys)))),
+            "instructions": "Combine and cook.",
+            "prepTime": rng.randint(5, 90),
+            "energeticBalance": rng.choice(ENERGETICS),
+        }
+        for i in range(recipes)
+    ]
+
+    combinations = {"good": [], "bad": []}
+    for _ in range(rules):
+        size = 2 if rng.random() < 0.85 else 3
+        kind = rng.choice(["good", "bad"])
+        combinations[kind].append({
+            "ingredients": pick(size),
+            "reason": "Synthetic pairing rule",
+            "severity": rng.choice(["mild", "moderate", "severe"]),
+        })
+
+    seasonal = {season: [] for season in SEASONS}
+    for key in keys:
+        season = food_map[key]["season"]
+        if season is not None and len(seasonal[season]) < 4:
+            seasonal[season].append(key)
+
+    market_list = [
+        {
+            "id": f"m{i + 1}",
+            "name": f"Market {i + 1}",
+            "type": rng.choice(MARKET_TYPES),
+            "address": f"{rng.randint(1, 9999)} Main St",
+            "rating": round(rng.uniform(3.0, 5.0), 1),
+            "coordinates": {"latitude": rng.uniform(25.0, 49.0), "longitude": rng.uniform(-124.0, -67.0)},
+            "hours": rng.choice(HOURS),
+            "timezone": rng.choice(TIMEZONES),
+            "phone": None,
+            "hasInStock": pick(min(50, len(keys))),
+            "priceRange": rng.choice(["$", "$$", "$$$"]),
+            "specialties": [],
+        }
+        for i in range(markets)
+    ]
+
+    return {
+        "foods": food_map,
+        "recipes": recipe_list,
+        "combinations": combinations,
+        "seasonalRecommendations": seasonal,
+        "markets": market_list,
+        "healthConditions": list(HEALTH_CONDITIONS),
+        "healthNoteRules": list(HEALTH_NOTE_RULES),
+    }
+
+
+def catalog_for_scale(scale: str, seed: int = 13) -> dict:
+    return synthetic_catalog(*SCALES[scale], seed=seed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(catalog_for_scale(args.scale, args.seed), f)
+    print(f"Wrote {args.scale} catalog to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from models import EnergeticType, Season
+from names import normalize_name
+from search import FoodSearchIndex
+from compatibility import CompatibilityEngine
+from markets import MarketIndex
+from http_cache import RenderCache
+from recommend import RecommendationModel
+from recipe_match import RecipeMatcher
+from health_notes import HealthNotesMatcher
+
+# ---------- Catalog snapshot ----------
+
+# Set CATALOG_PATH to a JSON file with "foods", "recipes", "combinations",
+# "seasonalRecommendations", "markets", "healthConditions" and "healthNoteRules" keys to serve an external catalog.
+# Without it the bundled mock data is used.
+CATALOG_PATH_ENV = "CATALOG_PATH"
+
+# Set CATALOG_SNAPSHOT to a compiled catalog file (see mapped_catalog.py) to
+# map it instead of building the catalog in-process; serve.py does this for
+# its workers.
+CATALOG_SNAPSHOT_ENV = "CATALOG_SNAPSHOT"
+
+# A mapped catalog opens each index the first time it is used. The search,
+# market and rule indexes are read from the file, but the compatibility engine
+# and files compiled without those sections still build in-process; set
+# CATALOG_WARM_INDEXES=1 to open everything as the catalog loads instead.
+CATALOG_WARM_INDEXES_ENV = "CATALOG_WARM_INDEXES"
+
+
+def _coerce_food(data: dict) -> dict:
+    food = dict(data)
+    food["energeticType"] = EnergeticType(food["energeticType"])
+    if food.get("season") is not None:
+        food["season"] = Season(food["season"])
+    food.setdefault("commonUses", [])
+    return food
+
+
+def _coerce_recipe(data: dict) -> dict:
+    recipe = dict(data)
+    recipe["energeticBalance"] = EnergeticType(recipe["energeticBalance"])
+    return recipe
+
+
+def _json_default(value):
+    if isinstance(value, (EnergeticType, Season)):
+        return value.value
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of the catalog with its lookup indexes built once.
+
+    Handlers grab a snapshot once per request and only read from it, so a
+    reload can replace the repository's current snapshot without affecting
+    requests that are already running against the old one.
+    """
+
+    def __init__(
+        self,
+        foods: Dict[str, dict],
+        recipes: List[dict],
+        combinations: Dict[str, List[dict]],
+        seasonal_recommendations: Dict[Season, List[str]],
+        markets: Optional[List[dict]] = None,
+        health_conditions: Optional[List[str]] = None,
+        health_note_rules: Optional[List[dict]] = None,
+    ):
+        self.foods: Dict[str, dict] = {key: _coerce_food(data) for key, data in foods.items()}
+        self.recipes: List[dict] = [_coerce_recipe(r) for r in recipes]
+        self.combinations = {kind: list(rules) for kind, rules in combinations.items()}
+        self.seasonal_recommendations = {
+            Season(season): list(names) for season, names in seasonal_recommendations.items()
+        }
+        self.markets: List[dict] = list(markets or [])
+        self.health_conditions: List[str] = list(health_conditions or [])
+        self.health_note_rules: List[dict] = list(health_note_rules or [])
+
+        # Ordered keys; deterministic identification indexes into this.
+        self.food_keys: Tuple[str, ...] = tuple(self.foods)
+
+        self.food_key_by_id: Dict[str, str] = {}
+        self.food_key_by_name: Dict[str, str] = {}
+        for key, food in self.foods.items():
+            self.food_key_by_id[food["id"]] = key
+            self.food_key_by_name.setdefault(normalize_name(food["name"]), key)
+        # Keys win over display names when they collide.
+        for key in self.foods:
+            self.food_key_by_name[normalize_name(key)] = key
+
+        self.recipes_by_ingredient: Dict[str, List[dict]] = {}
+        for recipe in self.recipes:
+            for ingredient in dict.fromkeys(recipe["ingredients"]):
+                self.recipes_by_ingredient.setdefault(ingredient, []).append(recipe)
+
+        self.version = hashlib.sha256(self.to_json().encode()).hexdigest()[:16]
+
+        self.search_index = FoodSearchIndex.from_foods(self.foods, self.version)
+        self.compatibility = CompatibilityEngine(self.combinations)
+        self.market_index = MarketIndex.from_markets(self.markets)
+        self.recommender = RecommendationModel(self.foods, self.health_conditions)
+        self.recipe_matcher = RecipeMatcher.from_recipes(self.recipes, self.recipes_by_ingredient)
+        self.health_notes = HealthNotesMatcher.from_rules(self.health_note_rules)
+        # Pre-serialized responses for the read-only catalog endpoints.
+        self.rendered = RenderCache()
+
+    # ----- lookups -----
+
+    def food_by_id(self, food_id: str) -> Optional[dict]:
+        key = self.food_key_by_id.get(food_id)
+        return self.foods[key] if key is not None else None
+
+    def food_key_for_name(self, name: str) -> Optional[str]:
+        return self.food_key_by_name.get(normalize_name(name))
+
+    def recipes_for(self, food_key: str) -> List[dict]:
+        return self.recipes_by_ingredient.get(food_key, [])
+
+    # ----- serialization -----
+
+    def to_dict(self) -> dict:
+        return {
+            "foods": self.foods,
+            "recipes": self.recipes,
+            "combinations": self.combinations,
+            "seasonalRecommendations": {
+                season.value: names for season, names in self.seasonal_recommendations.items()
+            },
+            "markets": self.markets,
+            "healthConditions": self.health_conditions,
+            "healthNoteRules": self.health_note_rules,
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), default=_json_default, sort_keys=True)
+
+
+def snapshot_from_dict(data: dict) -> CatalogSnapshot:
+    return CatalogSnapshot(
+        foods=data.get("foods", {}),
+        recipes=data.get("recipes", []),
+        combinations=data.get("combinations", {}),
+        seasonal_recommendations=data.get("seasonalRecommendations", {}),
+        markets=data.get("markets", []),
+        health_conditions=data.get("healthConditions", []),
+        health_note_rules=data.get("healthNoteRules", []),
+    )
+
+
+def load_snapshot(path: Optional[str] = None) -> CatalogSnapshot:
+    """
+    Build a snapshot from the JSON catalog at `path` (or $CATALOG_PATH), or
+    map the compiled one at $CATALOG_SNAPSHOT. Falls back to the bundled mock
+    data when no file is configured.
+    """
+    compiled = os.environ.get(CATALOG_SNAPSHOT_ENV)
+    if path is None and compiled:
+        from mapped_catalog import MappedCatalogSnapshot
+
+        snapshot = MappedCatalogSnapshot(compiled)
+        if os.environ.get(CATALOG_WARM_INDEXES_ENV) == "1":
+            snapshot.warm()
+        return snapshot
+
+    path = path or os.environ.get(CATALOG_PATH_ENV)
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return snapshot_from_dict(json.load(f))
+
+    from mock_data import MOCK_FOODS, MOCK_RECIPES, FOOD_COMBINATIONS, SEASONAL_RECOMMENDATIONS, MOCK_MARKETS
+    from mock_data import HEALTH_CONDITIONS, HEALTH_NOTE_RULES
+
+    return CatalogSnapshot(
+        foods=MOCK_FOODS,
+        recipes=MOCK_RECIPES,
+        combinations=FOOD_COMBINATIONS,
+        seasonal_recommendations=SEASONAL_RECOMMENDATIONS,
+        markets=MOCK_MARKETS,
+        health_conditions=HEALTH_CONDITIONS,
+        health_note_rules=HEALTH_NOTE_RULES,
+    )
+
+
+# ---------- Repository ----------
+
+class CatalogRepository:
+    """
+    Holds the current catalog snapshot and swaps in rebuilt ones atomically.
+
+    Reading `repository.snapshot` is a single attribute load, so readers never
+    see a half-built catalog; the replacement is fully indexed before it is
+    published. The lock only serializes concurrent reloads.
+    """
+
+    def __init__(self, snapshot: Optional[CatalogSnapshot] = None, path: Optional[str] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot = snapshot if snapshot is not None else load_snapshot(path)
+
+    @property
+    def snapshot(self) -> CatalogSnapshot:
+        return self._snapshot
+
+    def swap(self, snapshot: CatalogSnapshot) -> CatalogSnapshot:
+        """Publish `snapshot` and return the one it replaced."""
+        with self._lock:
+            previous, self._snapshot = self._snapshot, snapshot
+        return previous
+
+    def reload(self) -> CatalogSnapshot:
+        """Rebuild from the configured source and publish the result."""
+        with self._lock:
+            snapshot = load_snapshot(self.path)
+            self._snapshot = snapshot
+        return snapshot
+
+
+if __name__ == "__main__":
+    # Export the bundled mock catalog so it can be edited and served via CATALOG_PATH:
+    #   python catalog.py catalog.json
+    import sys
+
+    target = sys.argv[1] if len(sys.argv) > 1 else "catalog.json"
+    with open(target, "w", encoding="utf-8") as f:
+        f.write(json.dumps(load_snapshot().to_dict(), default=_json_default, indent=2))
+    print(f"Wrote catalog to {target}")
@@ -0,0 +1,145 @@
+from typing import Dict, Iterable, List, Optional
+
+from names import normalize_name
+
+# ---------- Compiled food compatibility engine ----------
+
+SEVERITY_WEIGHTS = {"mild": 1.0, "moderate": 2.0, "severe": 3.0}
+DEFAULT_SEVERITY = {"good": "mild", "bad": "moderate"}
+
+
+def rule_ingredients(rule: dict) -> List[str]:
+    """Rules name their foods either as food1/food2 or as an `ingredients` list."""
+    if "ingredients" in rule:
+        return list(rule["ingredients"])
+    return [rule["food1"], rule["food2"]]
+
+
+class CompatibilityReport:
+    def __init__(self, good: List[dict], bad: List[dict], unknown: List[str]):
+        self.good = good
+        self.bad = bad
+        self.unknown = unknown
+
+    @property
+    def best(self) -> Optional[dict]:
+        return self.good[0] if self.good else None
+
+    @property
+    def worst(self) -> Optional[dict]:
+        return self.bad[0] if self.bad else None
+
+    @property
+    def score(self) -> float:
+        """Net compatibility: benefit of good combos minus severity of bad ones."""
+        return sum(r["score"] for r in self.good) - sum(r["score"] for r in self.bad)
+
+
+class CompatibilityEngine:
+    """
+    Good/bad combination rules compiled for lookups by ingredient set.
+
+    Ingredients get integer ids. Pair rules sit in a dict keyed by the id
+    pair, and every ingredient has a bitset of the partners it has a pair
+    rule with; intersecting that with the query's bitset yields only the
+    pairs that actually have rules. Rules over three or more ingredients are
+    anchored on their rarest ingredient and matched with a subset test on
+    bitsets. Analysing N ingredients therefore costs about N^2 bit tests plus
+    the rules that match, however many rules are loaded.
+    """
+
+    def __init__(self, combinations: Dict[str, List[dict]]):
+        self.vocabulary: Dict[str, int] = {}
+        self.rules: List[dict] = []
+        self.kinds: List[str] = []
+        self.pair_rules: Dict[int, List[int]] = {}
+        self.partners: List[int] = []
+        self.nary_rules: Dict[int, List[int]] = {}
+        self.nary_masks: Dict[int, int] = {}
+
+        nary: List[tuple] = []
+        for kind in ("good", "bad"):
+            for rule in combinations.get(kind, []):
+                ids = sorted({self._intern(name) for name in rule_ingredients(rule)})
+                if len(ids) < 2:
+                    continue
+                rule_id = self._compile(kind, rule)
+                if len(ids) == 2:
+                    lo, hi = ids
+                    self.pair_rules.setdefault(self._pair_key(lo, hi), []).append(rule_id)
+                    self.partners[lo] |= 1 << hi
+                    self.partners[hi] |= 1 << lo
+                else:
+                    nary.append((rule_id, ids))
+
+        frequency: Dict[int, int] = {}
+        for _, ids in nary:
+            for i in ids:
+                frequency[i] = frequency.get(i, 0) + 1
+        for rule_id, ids in nary:
+            anchor = min(ids, key=lambda i: (frequency[i], i))
+            self.nary_rules.setdefault(anchor, []).append(rule_id)
+            mask = 0
+            for i in ids:
+                mask |= 1 << i
+            self.nary_masks[rule_id] = mask
+
+    def _intern(self, name: str) -> int:
+        key = normalize_name(name)
+        ingredient_id = self.vocabulary.get(key)
+        if ingredient_id is None:
+            ingredient_id = self.vocabulary[key] = len(self.vocabulary)
+            self.partners.append(0)
+        return ingredient_id
+
+    def _pair_key(self, lo: int, hi: int) -> int:
+        return (lo << 32) | hi
+
+    def _compile(self, kind: str, rule: dict) -> int:
+        severity = rule.get("severity") or DEFAULT_SEVERITY[kind]
+        self.rules.append({
+            **rule,
+            "ingredients": rule_ingredients(rule),
+            "severity": severity,
+            "score": SEVERITY_WEIGHTS.get(severity, SEVERITY_WEIGHTS["moderate"]),
+        })
+        self.kinds.append(kind)
+        return len(self.rules) - 1
+
+    def analyze(self, ingredients: Iterable[str]) -> CompatibilityReport:
+        ids = []
+        unknown = []
+        for name in dict.fromkeys(ingredients):
+            ingredient_id = self.vocabulary.get(normalize_name(name))
+            if ingredient_id is None:
+                unknown.append(name)
+            else:
+                ids.append(ingredient_id)
+
+        query_mask = 0
+        for i in ids:
+            query_mask |= 1 << i
+
+        matched: List[int] = []
+        for i in ids:
+            # Each pair once: only partners with a higher id.
+            candidates = (self.partners[i] & query_mask) >> (i + 1) << (i + 1)
+            while candidates:
+                low = candidates & -candidates
+                j = low.bit_length() - 1
+                matched.extend(self.pair_rules[self._pair_key(i, j)])
+                candidates ^= low
+
+            for rule_id in self.nary_rules.get(i, ()):
+                mask = self.nary_masks[rule_id]
+                if mask & query_mask == mask:
+                    matched.append(rule_id)
+
+        good, bad = [], []
+        for rule_id in matched:
+            (good if self.kinds[rule_id] == "good" else bad).append(self.rules[rule_id])
+
+        # Strongest first: best synergies and worst conflicts lead their lists.
+        good.sort(key=lambda r: (-r["score"], -len(r["ingredients"])))
+        bad.sort(key=lambda r: (-r["score"], -len(r["ingredients"])))
+        return CompatibilityReport(good, bad, unknown)
@@ -0,0 +1,287 @@
+import re
+import unicodedata
+from array import array
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# ---------- Health-notes rule engine ----------
+
+# Words that negate the terms following them in the same clause.
+NEGATION_CUES = (
+    "no", "not", "never", "without", "none", "denies", "deny", "free of",
+    "don't", "doesn't", "didn't", "isn't", "aren't", "haven't", "no longer",
+    "sin", "nunca", "ningún", "ninguna", "没有", "没", "不", "无",
+)
+# How many words after a cue it still applies to ("no fever or chills").
+NEGATION_WINDOW = 3
+# Unspaced scripts (CJK) have no words to count, so there a cue reaches this
+# many characters past its end instead ("没有发烧或咳嗽").
+NEGATION_CHAR_WINDOW = 6
+
+FALLBACK_RECOMMENDATION = "Balance your meal with neutral foods like rice"
+
+_CLAUSE_BREAKS = re.compile(r"[.!?;:,\n\r。，；！？]+|\b(?:but|however|although|pero)\b|但是|不过|可是|然而")
+_SEPARATORS = re.compile(r"[^\w|]+|_+")
+
+CLAUSE = "|"
+NEGATION = -1
+
+# Pattern flags.
+PREFIX = 1  # term ended in "*": may be followed by more word characters
+OPEN_START = 2  # starts with an unspaced (CJK) character: no boundary needed before it
+OPEN_END = 4  # ends with an unspaced character: no boundary needed after it
+
+# Automaton transitions are keyed by state * CODE_POINTS + code point.
+CODE_POINTS = 0x110000
+
+
+def normalize_notes(text: str) -> str:
+    """
+    Casefold and reduce `text` to words separated by single spaces, with
+    clause breaks (punctuation, "but") turned into a "|" token. Terms go
+    through the same folding, so "Cold-hands" matches "cold hands".
+    """
+    text = _CLAUSE_BREAKS.sub(f" {CLAUSE} ", text.casefold())
+    return " ".join(_SEPARATORS.sub(" ", text).split())
+
+
+def _unspaced(char: str) -> bool:
+    # Scripts written without spaces (CJK) have no word boundaries to check.
+    # Nothing below U+1100 is wide, which spares the lookup for Latin text.
+    return char >= "\u1100" and unicodedata.east_asian_width(char) in ("W", "F")
+
+
+class ConditionMatch:
+    __slots__ = ("rule", "hits", "first")
+
+    def __init__(self, rule: dict, first: int):
+        self.rule = rule
+        self.hits = 0
+        self.first = first  # offset of the first mention, for ranking ties
+
+    @property
+    def condition(self) -> str:
+        return self.rule["condition"]
+
+
+class HealthNotesMatcher:
+    """
+    Matches free-text health notes against every rule term in one pass.
+
+    All terms and negation cues are compiled into a single Aho-Corasick
+    automaton over normalized text, so matching costs time linear in the
+    length of the notes (plus the matches found), however many rules there
+    are. A hit counts only on word boundaries (or as a word prefix for terms
+    ending in "*"), and is dropped when a negation cue precedes it within
+    NEGATION_WINDOW words (NEGATION_CHAR_WINDOW characters in CJK text) of
+    the same clause. A cue that is part of a matched term, like "不" in
+    "消化不良", is not a negation.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[dict],
+        goto,
+        fail: Sequence[int],
+        links: Sequence[int],
+        output_offsets: Sequence[int],
+        outputs: Sequence[int],
+        lengths: Sequence[int],
+        words: Sequence[int],
+        targets: Sequence[int],
+        flags: Sequence[int],
+    ):
+        """
+        `goto` maps state * CODE_POINTS + code point to the next state (a dict,
+        or anything with `.get`). Per state: its failure state, its dictionary
+        suffix link (the nearest failure ancestor that ends a pattern, 0 for
+        none) and the range of `outputs` holding the patterns that end exactly
+        there. Per pattern: length, spaces, rule index (or NEGATION) and flags.
+        """
+        self.rules = rules
+        self._goto = goto
+        self._fail = fail
+        self._links = links
+        self._output_offsets = output_offsets
+        self._outputs = outputs
+        self._length = lengths
+        self._words = words
+        self._target = targets
+        self._flags = flags
+
+    @classmethod
+    def from_rules(cls, rules: Sequence[dict], negation_cues: Iterable[str] = NEGATION_CUES) -> "HealthNotesMatcher":
+        rules = list(rules)
+        patterns: List[Tuple[str, int, bool]] = []  # (normalized term, rule index or NEGATION, prefix)
+        for index, rule in enumerate(rules):
+            for term in rule.get("terms", ()):
+                prefix = term.endswith("*")
+                term = normalize_notes(term.rstrip("*")).replace(CLAUSE, "").strip()
+                if term:
+                    patterns.append((term, index, prefix))
+        for cue in negation_cues:
+            cue = normalize_notes(cue)
+            if cue:
+                patterns.append((cue, NEGATION, False))
+
+        # Transitions live in one dict keyed by state * CODE_POINTS + code point,
+        # which is far smaller than a dict per state at 10k+ rules.
+        goto: Dict[int, int] = {}
+        children: List[List[int]] = [[]]
+        own: Dict[int, List[int]] = {}
+        for pattern, (term, _, _) in enumerate(patterns):
+            state = 0
+            for char in term:
+                key = state * CODE_POINTS + ord(char)
+                following = goto.get(key)
+                if following is None:
+                    following = len(children)
+                    goto[key] = following
+                    children.append([])
+                    children[state].append(ord(char))
+                state = following
+            own.setdefault(state, []).append(pattern)
+
+        # Breadth-first, so a state's failure target is final before its children need it.
+        # Each state keeps only its own patterns; the ones it inherits are reached by
+        # following dictionary suffix links instead of being copied into every state.
+        fail = array("I", bytes(4 * len(children)))
+        links = array("I", bytes(4 * len(children)))
+        queue = deque(goto[code] for code in children[0])
+        while queue:
+            state = queue.popleft()
+            for code in children[state]:
+                following = goto[state * CODE_POINTS + code]
+                queue.append(following)
+                fallback = fail[state]
+                while fallback and fallback * CODE_POINTS + code not in goto:
+                    fallback = fail[fallback]
+                target = goto.get(fallback * CODE_POINTS + code, 0)
+                fail[following] = target if target != following else 0
+                links[following] = fail[following] if fail[following] in own else links[fail[following]]
+
+        output_offsets = array("I", [0])
+        outputs = array("I")
+        for state in range(len(children)):
+            outputs.extend(own.get(state, ()))
+            output_offsets.append(len(outputs))
+
+        flags = array("B", [
+            (PREFIX if prefix else 0) | (OPEN_START if _unspaced(term[0]) else 0) | (OPEN_END if _unspaced(term[-1]) else 0)
+            for term, _, prefix in patterns
+        ])
+        return cls(
+            rules, goto, fail, links, output_offsets, outputs,
+            array("I", [len(term) for term, _, _ in patterns]),
+            array("I", [term.count(" ") for term, _, _ in patterns]),
+            array("i", [target for _, target, _ in patterns]),
+            flags,
+        )
+
+    def tables(self) -> Dict[str, Sequence[int]]:
+        """The automaton as flat tables, transitions sorted by key, for compiling into a catalog file."""
+        transitions = sorted(self._goto.items())
+        return {
+            "goto_keys": array("Q", [key for key, _ in transitions]),
+            "goto_states": array("I", [state for _, state in transitions]),
+            "fail": self._fail,
+            "links": self._links,
+            "output_offsets": self._output_offsets,
+            "outputs": self._outputs,
+            "lengths": self._length,
+            "words": self._words,
+            "targets": self._target,
+            "flags": self._flags,
+        }
+
+    def match(self, notes: str) -> List[ConditionMatch]:
+        """Conditions mentioned (and not negated) in `notes`, highest weight first, then by first mention."""
+        text = normalize_notes(notes)
+        size = len(text)
+        goto, fail, links = self._goto, self._fail, self._links
+        output_offsets, outputs = self._output_offsets, self._outputs
+        lengths, words, targets, flags = self._length, self._words, self._target, self._flags
+        found: Dict[int, ConditionMatch] = {}
+        state = 0
+        word = 0
+        no_cue = (-1, 0, 0, False)
+        # Active negation cue as (end offset or -1, start offset, word count at its end, unspaced), and
+        # the one before it, restored when the active cue turns out to be part of a term.
+        cue = previous_cue = no_cue
+
+        for position, char in enumerate(text):
+            if char == " ":
+                word += 1
+            elif char == CLAUSE:
+                cue = previous_cue = no_cue
+            code = ord(char)
+            while True:
+                following = goto.get(state * CODE_POINTS + code)
+                if following is not None:
+                    state = following
+                    break
+                if not state:
+                    break
+                state = fail[state]
+
+            hit = state if output_offsets[state] != output_offsets[state + 1] else links[state]
+            if not hit:
+                continue
+            end = position + 1
+            # Only prefix terms and terms ending in CJK may stop in the middle of a word.
+            open_after = end == size or text[end] == " " or _unspaced(text[end])
+            covering = end  # earliest start of a term hit ending here
+            # Longest patterns first; all patterns of one state are the same term.
+            while hit:
+                first, last = output_offsets[hit], output_offsets[hit + 1]
+                hit = links[hit]
+                start = end - lengths[outputs[first]]
+                if start > 0 and not flags[outputs[first]] & OPEN_START:
+                    before = text[start - 1]
+                    if before != " " and not _unspaced(before):
+                        continue
+                for index in range(first, last):
+                    pattern = outputs[index]
+                    if not open_after and not flags[pattern] & (PREFIX | OPEN_END):
+                        continue
+                    target = targets[pattern]
+                    if target == NEGATION:
+                        if covering > start:
+                            previous_cue, cue = cue, (position, start, word, bool(flags[pattern] & OPEN_END))
+                        continue
+                    covering = min(covering, start)
+                    cue_end, cue_start, cue_word, cue_unspaced = cue
+                    if cue_end >= 0 and start <= cue_start:
+                        cue, previous_cue = previous_cue, no_cue
+                        cue_end, cue_start, cue_word, cue_unspaced = cue
+                    if 0 <= cue_end < start and word - words[pattern] - cue_word <= NEGATION_WINDOW:
+                        unspaced = cue_unspaced or flags[pattern] & OPEN_START
+                        if not unspaced or start - cue_end - 1 <= NEGATION_CHAR_WINDOW:
+                            continue
+                    condition = found.get(target)
+                    if condition is None:
+                        condition = found[target] = ConditionMatch(self.rules[target], start)
+                    condition.hits += 1
+
+        return sorted(found.values(), key=lambda c: (-c.rule.get("weight", 1.0), c.first))
+
+    def recommendations(
+        self, notes: str, ingredients: Sequence[str] = (), limit: Optional[int] = None
+    ) -> Tuple[List[str], List[ConditionMatch]]:
+        """
+        Advice for the conditions found in `notes`, strongest condition first.
+        A condition whose `avoidFoods` include any of the detected
+        `ingredients` leads with a warning about them. Falls back to a
+        neutral suggestion when nothing matches.
+        """
+        conditions = self.match(notes)
+        recommendations = []
+        present = dict.fromkeys(ingredients)
+        for condition in conditions:
+            avoid = [food.replace("_", " ").title() for food in condition.rule.get("avoidFoods", ()) if food in present]
+            if avoid:
+                recommendations.append(f"Go easy on {' and '.join(avoid)} with {condition.condition.lower()}")
+            if condition.rule.get("recommendation"):
+                recommendations.append(condition.rule["recommendation"])
+        recommendations = list(dict.fromkeys(recommendations)) or [FALLBACK_RECOMMENDATION]
+        return recommendations[:limit], conditions
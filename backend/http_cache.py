@@ -0,0 +1,89 @@
+import gzip
+import hashlib
+import os
+import threading
+from typing import Callable, Dict, Hashable, Optional
+
+from fastapi import Request, Response
+
+# ---------- Pre-rendered, cacheable responses ----------
+
+# How long clients and CDNs may reuse catalog responses before revalidating.
+CATALOG_MAX_AGE = int(os.environ.get("CATALOG_MAX_AGE", 300))
+
+
+class RenderedResponse:
+    """
+    Response body encoded once, with a strong ETag over its bytes. `encoding`
+    names the Content-Encoding the body is already compressed with.
+    """
+
+    __slots__ = ("body", "etag", "media_type", "encoding")
+
+    def __init__(self, body: bytes, media_type: str = "application/json", encoding: Optional[str] = None):
+        self.body = body
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        self.media_type = media_type
+        self.encoding = encoding
+
+
+class RenderCache:
+    """
+    Rendered responses for one catalog version, filled on first request.
+
+    It hangs off the catalog snapshot, so a reload starts a fresh cache and
+    old entries go away with the old snapshot.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Hashable, RenderedResponse] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, render: Callable[[], bytes]) -> RenderedResponse:
+        rendered = self._entries.get(key)
+        if rendered is None:
+            rendered = RenderedResponse(render())
+            with self._lock:
+                rendered = self._entries.setdefault(key, rendered)
+        return rendered
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/"x" matches "x".
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def accepts_encoding(request: Request, encoding: str) -> bool:
+    for value in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = value.strip().partition(";")
+        if name.strip().lower() in (encoding, "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def cached_response(request: Request, rendered: RenderedResponse, max_age: int = CATALOG_MAX_AGE) -> Response:
+    """200 with the pre-rendered body, or 304 when the client already has it."""
+    body = rendered.body
+    etag = rendered.etag
+    headers = {"Cache-Control": f"public, max-age={max_age}"}
+    if rendered.encoding is not None:
+        headers["Vary"] = "Accept-Encoding"
+        if accepts_encoding(request, rendered.encoding):
+            headers["Content-Encoding"] = rendered.encoding
+        else:
+            # Rare: mobile and browser HTTP stacks all accept gzip. The decoded body is its own representation.
+            body = gzip.decompress(body)
+            etag = etag[:-1] + '-identity"'
+    headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=rendered.media_type, headers=headers)
@@ -0,0 +1,266 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from models import FoodIdentifyResponse
+
+# ---------- Identification result cache ----------
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL_SECONDS = 6 * 60 * 60  # 6 hours
+
+# Disk tier bounds; past either one the oldest entries are evicted.
+DEFAULT_DISK_MAX_ENTRIES = 100_000
+DEFAULT_DISK_MAX_BYTES = 512 * 1024 * 1024
+# Each process rescans the directory after this many writes.
+DISK_PRUNE_INTERVAL = 256
+
+
+class LRUTTLCache:
+    """
+    Bounded in-memory cache: least-recently-used entries are evicted once
+    `max_entries` is reached, and entries older than `ttl` seconds are dropped
+    when they are next looked up.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CacheTier(ABC):
+    """
+    Optional second cache tier holding serialized responses, e.g. a store
+    shared by every worker process. Implementations may block (disk,
+    network); IdentifyResultCache calls them off the event loop.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes) -> None:
+        ...
+
+
+class DiskCacheTier(CacheTier):
+    """
+    One file per key under `directory`. Writes go through a temp file and an
+    atomic rename, so workers sharing the directory never read partial entries.
+    Expiry uses the file's mtime. The directory is held under `max_entries`
+    files and `max_bytes`: every DISK_PRUNE_INTERVAL writes a process rescans
+    it, drops expired entries and evicts the oldest until it is back under
+    90% of both limits.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ttl: float = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_DISK_MAX_ENTRIES,
+        max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._writes = 0
+        self._prune_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.prune()
+
+    def _path(self, key: str) -> str:
+        # Keys are "<catalog version>:<sha256 hex>"; keep file names portable.
+        return os.path.join(self.directory, key.replace(":", "_") + ".json")
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, key: str, value: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._writes += 1
+        if self._writes % DISK_PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def prune(self) -> None:
+        """Remove expired entries, then the oldest ones while over either limit."""
+        if not self._prune_lock.acquire(blocking=False):
+            return  # another thread is already at it
+        try:
+            cutoff = time.time() - self.ttl
+            entries = []
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    if stat.st_mtime < cutoff:
+                        self._remove(entry.path)
+                    else:
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            count, size = len(entries), sum(item[1] for item in entries)
+            if count <= self.max_entries and size <= self.max_bytes:
+                return
+            entries.sort()
+            for _, file_size, path in entries:
+                if count <= self.max_entries * 0.9 and size <= self.max_bytes * 0.9:
+                    break
+                self._remove(path)
+                self.evictions += 1
+                count -= 1
+                size -= file_size
+        finally:
+            self._prune_lock.release()
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass  # already gone, e.g. pruned by another worker
+
+
+class IdentifyResultCache:
+    """
+    Finished FoodIdentifyResponse objects keyed by upload content digest.
+
+    Lookups hit the in-process LRU first and then the optional second tier;
+    second-tier hits are promoted into memory. get/set are coroutines
+    because second-tier calls run on the default executor, off the event
+    loop; the in-memory tier is consulted inline.
+    """
+
+    def __init__(self, memory: Optional[LRUTTLCache] = None, second_tier: Optional[CacheTier] = None):
+        self.memory = memory if memory is not None else LRUTTLCache()
+        self.second_tier = second_tier
+        self.hits = 0
+        self.second_tier_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(catalog_version: str, digest: str) -> str:
+        # Results depend on the catalog, so a reload naturally invalidates them.
+        return f"{catalog_version}:{digest}"
+
+    async def get(self, key: str) -> Optional[FoodIdentifyResponse]:
+        response = self.memory.get(key)
+        if response is not None:
+            self.hits += 1
+            return response
+
+        if self.second_tier is not None:
+            raw = await asyncio.get_running_loop().run_in_executor(None, self.second_tier.get, key)
+            if raw is not None:
+                try:
+                    response = FoodIdentifyResponse.model_validate_json(raw)
+                except ValueError:
+                    response = None
+                if response is not None:
+                    self.memory.set(key, response)
+                    self.second_tier_hits += 1
+                    return response
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, response: FoodIdentifyResponse) -> None:
+        self.memory.set(key, response)
+        if self.second_tier is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.second_tier.set, key, response.model_dump_json().encode()
+            )
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self.memory),
+            "hits": self.hits,
+            "secondTierHits": self.second_tier_hits,
+            "misses": self.misses,
+            "evictions": self.memory.evictions,
+            "expirations": self.memory.expirations,
+            "secondTierEvictions": getattr(self.second_tier, "evictions", 0),
+        }
+
+
+def cache_from_env() -> IdentifyResultCache:
+    """
+    IDENTIFY_CACHE_SIZE / IDENTIFY_CACHE_TTL size the in-memory tier;
+    IDENTIFY_CACHE_DIR enables a disk tier shared by all workers, bounded by
+    IDENTIFY_CACHE_DIR_MAX_ENTRIES and IDENTIFY_CACHE_DIR_MAX_MB.
+    """
+    ttl = float(os.environ.get("IDENTIFY_CACHE_TTL", DEFAULT_TTL_SECONDS))
+    memory = LRUTTLCache(
+        max_entries=int(os.environ.get("IDENTIFY_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+        ttl=ttl,
+    )
+    directory = os.environ.get("IDENTIFY_CACHE_DIR")
+    second_tier = None
+    if directory:
+        second_tier = DiskCacheTier(
+            directory,
+            ttl=ttl,
+            max_entries=int(os.environ.get("IDENTIFY_CACHE_DIR_MAX_ENTRIES", DEFAULT_DISK_MAX_ENTRIES)),
+            max_bytes=int(float(os.environ.get("IDENTIFY_CACHE_DIR_MAX_MB", DEFAULT_DISK_MAX_BYTES / 2**20)) * 2**20),
+        )
+    return IdentifyResultCache(memory, second_tier)
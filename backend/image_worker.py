@@ -0,0 +1,69 @@
+"""
+Code that runs inside the image process pool (see imaging.py).
+
+Pool workers are spawned with this module as their __main__, so they import
+only it and its imports (Pillow, phash), never the API app in main.py.
+"""
+import io
+import signal
+from typing import Union
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from phash import dhash
+
+# ---------- Image preprocessing ----------
+
+# Input size a recognition model would expect.
+MODEL_INPUT_SIZE = (224, 224)
+
+# Guard against decompression bombs in user uploads.
+Image.MAX_IMAGE_PIXELS = 40_000_000
+
+
+class ImageDecodeError(ValueError):
+    pass
+
+
+def preprocess_image(source: Union[str, bytes]) -> dict:
+    """
+    Decode the image at path `source` (or in `source` itself when given
+    bytes), apply its EXIF orientation and scale it to the model input size.
+    Returns the perceptual hash alongside the image metadata so the caller
+    never has to touch the bytes on the event loop.
+    """
+    try:
+        with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as img:
+            image_format = img.format
+            img = ImageOps.exif_transpose(img)
+            width, height = img.size
+            perceptual_hash = dhash(img)
+            model_input = ImageOps.fit(img.convert("RGB"), MODEL_INPUT_SIZE)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageDecodeError(f"Could not decode image: {e}")
+
+    return {
+        "dhash": f"{perceptual_hash:016x}",
+        "format": image_format,
+        "width": width,
+        "height": height,
+        "inputSize": list(model_input.size),
+    }
+
+
+def image_dhash(source: Union[str, bytes]) -> str:
+    """
+    Perceptual hash of the image in the file at path `source` (or in
+    `source` itself when given bytes). A path is decoded straight from disk,
+    so the upload never has to be copied into or pickled from the server.
+    """
+    try:
+        with Image.open(source if isinstance(source, str) else io.BytesIO(source)) as img:
+            return f"{dhash(ImageOps.exif_transpose(img)):016x}"
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageDecodeError(f"Could not decode image: {e}")
+
+
+def initialize() -> None:
+    """Pool worker initializer: leave Ctrl+C to the server, which shuts the pool down."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
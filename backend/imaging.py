@@ -0,0 +1,97 @@
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.context import SpawnContext, SpawnProcess
+from typing import Optional
+
+import image_worker
+from image_worker import MODEL_INPUT_SIZE, ImageDecodeError, image_dhash, preprocess_image  # noqa: F401
+
+# ---------- Process pool ----------
+
+_pool: Optional[ProcessPoolExecutor] = None
+_start_lock = threading.Lock()
+
+
+class ImagePoolUnavailable(RuntimeError):
+    """The process pool could not start a worker, or lost one mid-task."""
+
+
+class _WorkerProcess(SpawnProcess):
+    """
+    A spawned child re-imports the parent's __main__ before doing anything
+    else; under `python main.py` that would rebuild the whole app in every
+    worker. The worker module stands in as __main__ while the child's start
+    data is captured, so that is all the child imports.
+    """
+
+    def start(self) -> None:
+        with _start_lock:
+            main = sys.modules["__main__"]
+            sys.modules["__main__"] = image_worker
+            try:
+                super().start()
+            finally:
+                sys.modules["__main__"] = main
+
+
+class _WorkerContext(SpawnContext):
+    Process = _WorkerProcess
+
+
+def image_workers() -> int:
+    return int(os.environ.get("IMAGE_WORKERS", os.cpu_count() or 1))
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Lazily start the shared pool. Workers are spawned rather than forked so
+    they never inherit the server's event loop or thread state, and run
+    image_worker.py rather than the server's entry point.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=image_workers(),
+            mp_context=_WorkerContext(),
+            initializer=image_worker.initialize,
+        )
+    return _pool
+
+
+def shutdown_process_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    global _pool
+    if _pool is pool:
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def run_in_process_pool(fn, *args):
+    """
+    Run `fn(*args)` in the image pool. Raises ImagePoolUnavailable when no
+    worker can be started, or one died; the broken pool is dropped so the
+    next call starts a fresh one.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    try:
+        # Workers are started on submission, so this is where spawning fails.
+        future = loop.run_in_executor(pool, fn, *args)
+    except (OSError, BrokenProcessPool) as e:
+        _discard_pool(pool)
+        raise ImagePoolUnavailable(f"Could not start an image worker: {e}") from e
+    try:
+        return await future
+    except BrokenProcessPool as e:
+        _discard_pool(pool)
+        raise ImagePoolUnavailable("An image worker exited unexpectedly") from e
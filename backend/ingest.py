@@ -0,0 +1,642 @@
+import binascii
+import hashlib
+import json
+import os
+import re
+import tempfile
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional, Tuple, Union
+
+import multipart
+from fastapi import HTTPException
+from multipart.multipart import parse_options_header
+
+# ---------- Bounded-memory upload ingestion ----------
+
+# Uploads up to this size stay in memory; larger ones spill to a named temp file.
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+# Room for multipart boundaries and part headers on top of the file itself.
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class PayloadTooLarge(HTTPException):
+    def __init__(self, max_size: int):
+        super().__init__(status_code=413, detail=f"File too large (max {max_size // (1024 * 1024)}MB)")
+
+
+class IngestedUpload:
+    """
+    A validated upload: its SHA-256 digest, size and a file object positioned
+    at the start of the content. The file is the spooled buffer the upload was
+    written to as it arrived, which stays in memory for small files and spills
+    to a temp file for large ones, so no single `bytes` copy of the whole
+    upload is ever made.
+    """
+
+    def __init__(
+        self,
+        digest: str,
+        size: int,
+        file: BinaryIO,
+        content_type: Optional[str] = None,
+        filename: Optional[str] = None,
+    ):
+        self.digest = digest
+        self.size = size
+        self.file = file
+        self.content_type = content_type
+        self.filename = filename
+
+    def read(self) -> bytes:
+        """Materialize the content; only for consumers that need it all at once."""
+        self.file.seek(0)
+        return self.file.read()
+
+    def handoff(self) -> Union[str, bytes]:
+        """
+        The content in a form another process can open. Uploads still held in
+        memory (up to SPOOL_MAX_MEMORY) come back as bytes; larger ones come
+        back as the path of the named file they were spooled to, which stays
+        valid until the upload is closed, so nothing is copied. Blocking file
+        I/O, so call it off the event loop.
+        """
+        path = getattr(self.file, "path", None)
+        if path is None:
+            return self.read()
+        self.file.flush()
+        return path
+
+
+class UploadSpool(tempfile.SpooledTemporaryFile):
+    """
+    A SpooledTemporaryFile that spills to a named temp file instead of an
+    anonymous one, so an upload too large for memory can be handed to the
+    image pool by path. The file is removed when the spool is closed.
+    """
+
+    def __init__(self, max_size: int = SPOOL_MAX_MEMORY):
+        super().__init__(max_size=max_size)
+        self.path: Optional[str] = None
+
+    def rollover(self) -> None:
+        if self._rolled:
+            return
+        memory = self._file
+        # delete=False: Windows would refuse the pool worker's open otherwise.
+        named = tempfile.NamedTemporaryFile(prefix="upload-", delete=False)
+        named.write(memory.getvalue())
+        named.seek(memory.tell())
+        self._file = named
+        self.path = named.name
+        self._rolled = True
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            if self.path is not None:
+                try:
+                    os.unlink(self.path)
+                except OSError:
+                    pass
+                self.path = None
+
+
+class IngestSink:
+    """Running size limit and SHA-256 over an upload fed in chunks, which are written to `spool`."""
+
+    def __init__(self, max_size: int, spool: BinaryIO):
+        self.max_size = max_size
+        self.spool = spool
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def update(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise PayloadTooLarge(self.max_size)
+        self.hasher.update(chunk)
+        self.spool.write(chunk)
+
+    def result(self, content_type: Optional[str] = None, filename: Optional[str] = None) -> IngestedUpload:
+        if self.size == 0:
+            raise HTTPException(status_code=400, detail="Empty file uploaded")
+        self.spool.seek(0)
+        return IngestedUpload(self.hasher.hexdigest(), self.size, self.spool, content_type, filename)
+
+
+# ---------- Streaming base64 inside JSON ----------
+
+# Other JSON members (e.g. healthNotes) are small; cap how much of each is buffered.
+MAX_JSON_FIELD_SIZE = 64 * 1024
+
+_WHITESPACE = b" \t\r\n"
+_STRING_STOP = re.compile(rb'["\\]')
+# Escapes that can legitimately appear inside a JSON-encoded base64 string.
+_BASE64_ESCAPES = {ord("/"): b"/", ord("n"): b"", ord("r"): b"", ord("t"): b""}
+# A run of whole 4-character groups, padding allowed only at its very end.
+_BASE64_GROUPS = re.compile(rb"[A-Za-z0-9+/]*={0,2}")
+_DATA_URL_PREFIX_LIMIT = 256
+
+
+class Base64StreamDecoder:
+    """
+    Incremental base64 decoder: feed text in arbitrary pieces and get back
+    the bytes decoded so far, carrying incomplete 4-character groups over.
+    Whitespace is ignored, an optional "data:...;base64," prefix is stripped,
+    and missing trailing padding is tolerated.
+    """
+
+    def __init__(self):
+        self.pending = b""
+        self.prefix: Optional[bytearray] = bytearray()
+        self.padded = False
+
+    def feed(self, text: bytes) -> bytes:
+        text = text.translate(None, _WHITESPACE)
+        if self.prefix is not None:
+            self.prefix += text
+            if len(self.prefix) < 5:
+                return b""
+            if self.prefix.startswith(b"data:"):
+                comma = self.prefix.find(b",")
+                if comma < 0:
+                    if len(self.prefix) > _DATA_URL_PREFIX_LIMIT:
+                        raise ValueError("Malformed data URL")
+                    return b""
+                text = bytes(self.prefix[comma + 1:])
+            else:
+                text = bytes(self.prefix)
+            self.prefix = None
+
+        data = self.pending + text
+        cut = len(data) - len(data) % 4
+        self.pending = data[cut:]
+        return self._decode(data[:cut])
+
+    def finish(self) -> bytes:
+        tail = b""
+        if self.prefix is not None:
+            # Fewer than five characters in total; no data URL prefix possible.
+            tail, self.prefix = bytes(self.prefix), None
+        data = self.pending + tail
+        self.pending = b""
+        if len(data) % 4 == 1:
+            raise ValueError("Truncated base64 data")
+        if data:
+            data += b"=" * (-len(data) % 4)
+        return self._decode(data)
+
+    def _decode(self, data: bytes) -> bytes:
+        if not data:
+            return b""
+        # a2b_base64 silently skips stray characters and stops at padding, so
+        # validate first (its strict_mode does this, but only from Python 3.11).
+        if self.padded:
+            raise ValueError("Invalid base64 data: Excess data after padding")
+        if not _BASE64_GROUPS.fullmatch(data):
+            raise ValueError("Invalid base64 data: Invalid character or misplaced padding")
+        self.padded = data.endswith(b"=")
+        try:
+            return binascii.a2b_base64(data)
+        except binascii.Error as e:
+            raise ValueError(f"Invalid base64 data: {e}") from None
+
+
+# _JsonFieldScanner states
+_START, _KEY_OR_END, _KEY, _IN_KEY, _COLON, _VALUE, _IN_FIELD, _IN_OTHER, _AFTER_VALUE, _DONE = range(10)
+
+
+class _JsonFieldScanner:
+    """
+    Incremental scanner for a flat JSON object body. The string value of
+    `field` is passed to `on_data` piece by piece as it arrives, without ever
+    being held whole; every other member is buffered (bounded) and decoded
+    with json.loads once complete. Raises ValueError on malformed input.
+    """
+
+    def __init__(self, field: str, on_data):
+        self.field = field
+        self.on_data = on_data
+        self.state = _START
+        self.members: Dict[str, object] = {}
+        self.found = False
+        self.key = ""
+        self.buffer = bytearray()
+        self.escape: Optional[bytearray] = None
+        self.in_string = False
+        self.depth = 0
+
+    def feed(self, chunk: bytes) -> None:
+        i, n = 0, len(chunk)
+        while i < n:
+            state = self.state
+            if state == _IN_FIELD:
+                if self.escape is not None:
+                    self.escape.append(chunk[i])
+                    i += 1
+                    self._field_escape()
+                    continue
+                match = _STRING_STOP.search(chunk, i)
+                end = match.start() if match else n
+                if end > i:
+                    self.on_data(chunk[i:end])
+                if match is None:
+                    return
+                i = end + 1
+                if chunk[end] == 0x22:  # closing quote
+                    self.state = _AFTER_VALUE
+                else:
+                    self.escape = bytearray()
+                continue
+
+            c = chunk[i]
+            i += 1
+            if state == _IN_KEY:
+                if self.in_string:  # previous byte was a backslash
+                    self.in_string = False
+                    self.buffer.append(c)
+                elif c == 0x5C:
+                    self.in_string = True
+                    self.buffer.append(c)
+                elif c == 0x22:
+                    self.key = json.loads(b'"' + bytes(self.buffer) + b'"')
+                    self.buffer.clear()
+                    self.state = _COLON
+                else:
+                    self.buffer.append(c)
+                    self._check_size()
+            elif state == _IN_OTHER:
+                if self._other_value(c):
+                    continue
+            elif c in _WHITESPACE:
+                continue
+            elif state == _START:
+                self._expect(c, b"{")
+                self.state = _KEY_OR_END
+            elif state == _KEY_OR_END:
+                if c == 0x7D:  # }
+                    self.state = _DONE
+                else:
+                    self._expect(c, b'"')
+                    self.state = _IN_KEY
+            elif state == _KEY:
+                self._expect(c, b'"')
+                self.state = _IN_KEY
+            elif state == _COLON:
+                self._expect(c, b":")
+                self.state = _VALUE
+            elif state == _VALUE:
+                if self.key == self.field and c == 0x22:
+                    if self.found:
+                        raise ValueError(f"Duplicate {self.field}")
+                    self.found = True
+                    self.state = _IN_FIELD
+                else:
+                    self.state = _IN_OTHER
+                    self.in_string = False
+                    self.depth = 0
+                    self._other_value(c)
+            elif state == _AFTER_VALUE:
+                if c == 0x2C:  # ,
+                    self.state = _KEY
+                else:
+                    self._expect(c, b"}")
+                    self.state = _DONE
+            else:
+                raise ValueError("Unexpected data after the JSON object")
+
+    def close(self) -> Dict[str, object]:
+        if self.state != _DONE:
+            raise ValueError("Truncated JSON body")
+        return self.members
+
+    @staticmethod
+    def _expect(c: int, expected: bytes) -> None:
+        if c != expected[0]:
+            raise ValueError(f"Expected {expected.decode()!r} in JSON body")
+
+    def _check_size(self) -> None:
+        if len(self.buffer) > MAX_JSON_FIELD_SIZE:
+            raise ValueError("JSON member too large")
+
+    def _other_value(self, c: int) -> bool:
+        """Consume one byte of a buffered value; True once the value (and its terminator) is done."""
+        if self.in_string:
+            if self.escape is not None:
+                self.escape = None
+            elif c == 0x5C:
+                self.escape = bytearray()
+            elif c == 0x22:
+                self.in_string = False
+        elif c == 0x22:
+            self.in_string = True
+        elif c in b"[{":
+            self.depth += 1
+        elif c in b"]}" and self.depth > 0:
+            self.depth -= 1
+        elif c in b",}" and self.depth == 0:
+            try:
+                self.members[self.key] = json.loads(bytes(self.buffer))
+            except ValueError:
+                raise ValueError(f"Invalid JSON value for {self.key!r}") from None
+            self.buffer.clear()
+            self.state = _KEY if c == 0x2C else _DONE
+            return True
+        self.buffer.append(c)
+        self._check_size()
+        return False
+
+    def _field_escape(self) -> None:
+        escape = self.escape
+        if escape[0] == ord("u"):
+            if len(escape) < 5:
+                return
+            char = chr(int(escape[1:5], 16)).encode("ascii", "replace")
+            self.escape = None
+            self.on_data(char)
+            return
+        self.escape = None
+        if escape[0] not in _BASE64_ESCAPES:
+            raise ValueError(f"Unexpected escape in {self.field}")
+        self.on_data(_BASE64_ESCAPES[escape[0]])
+
+
+async def ingest_json_base64(
+    chunks: AsyncIterator[bytes], field: str, max_size: int
+) -> Tuple[IngestedUpload, Dict[str, object]]:
+    """
+    Ingest the base64 string `field` of a streamed JSON object body.
+
+    The text is decoded as it arrives into a spooled buffer with the same
+    size limit and hashing as multipart uploads (see IngestSink), so neither
+    the JSON string nor a second full copy of the image is ever held in
+    memory. Returns the upload and the object's other members. Malformed
+    bodies raise HTTPException 400; a missing `field` raises 422.
+    """
+    spool = UploadSpool()
+    sink = IngestSink(max_size, spool)
+    decoder = Base64StreamDecoder()
+    scanner = _JsonFieldScanner(field, lambda text: sink.update(decoder.feed(text)))
+    try:
+        async for chunk in chunks:
+            scanner.feed(chunk)
+        members = scanner.close()
+        if not scanner.found:
+            raise HTTPException(status_code=422, detail=f"{field} is required")
+        sink.update(decoder.finish())
+        return sink.result(), members
+    except ValueError as e:
+        spool.close()
+        raise HTTPException(status_code=400, detail=f"Invalid request body: {e}")
+    except BaseException:
+        spool.close()
+        raise
+
+
+# ---------- Streaming multipart ----------
+
+# Form fields next to the files (e.g. healthNotes) are buffered up to this size.
+MAX_FORM_FIELD_SIZE = 64 * 1024
+
+
+class FilePart:
+    """One file of a multipart body: the ingested upload, or the HTTPException that rejected it."""
+
+    def __init__(self, name: str, filename: Optional[str], content_type: Optional[str]):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.upload: Optional[IngestedUpload] = None
+        self.error: Optional[HTTPException] = None
+
+    def close(self) -> None:
+        if self.upload is not None:
+            self.upload.file.close()
+
+
+class MultipartForm:
+    """The files and fields of a multipart body, in the order they arrived."""
+
+    def __init__(self):
+        self.files: List[FilePart] = []
+        self.fields: Dict[str, str] = {}
+
+    def file(self, name: str) -> Optional[FilePart]:
+        return next((part for part in self.files if part.name == name), None)
+
+    def error(self) -> Optional[HTTPException]:
+        return next((part.error for part in self.files if part.error is not None), None)
+
+    def close(self) -> None:
+        for part in self.files:
+            part.close()
+
+
+class _MultipartScanner:
+    """
+    python-multipart callbacks that write each file part through an IngestSink
+    (size limit, SHA-256, spool) as its bytes are parsed out of the body.
+    """
+
+    def __init__(self, boundary: bytes, charset: str, max_size: int, max_files: int, max_fields: int):
+        self.charset = charset
+        self.max_size = max_size
+        self.max_files = max_files
+        self.max_fields = max_fields
+        self.form = MultipartForm()
+        self.ended = False
+        self._header_name = bytearray()
+        self._header_value = bytearray()
+        self._headers: Dict[bytes, bytes] = {}
+        self._part: Optional[FilePart] = None
+        self._sink: Optional[IngestSink] = None
+        self._field: Optional[Tuple[str, bytearray]] = None
+        self.parser = multipart.MultipartParser(boundary, {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_end": self.on_end,
+        })
+
+    def _decode(self, value: bytes) -> str:
+        try:
+            return value.decode(self.charset)
+        except (UnicodeDecodeError, LookupError):
+            return value.decode("latin-1")
+
+    def on_part_begin(self) -> None:
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
+
+    def on_header_end(self) -> None:
+        self._headers[bytes(self._header_name).lower()] = bytes(self._header_value)
+        self._header_name.clear()
+        self._header_value.clear()
+
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise ValueError('Content-Disposition needs a "name"')
+        name = self._decode(options[b"name"])
+        if b"filename" in options:
+            if len(self.form.files) >= self.max_files:
+                raise HTTPException(status_code=413, detail=f"Too many files (max {self.max_files})")
+            content_type = self._headers.get(b"content-type")
+            self._part = FilePart(
+                name, self._decode(options[b"filename"]), content_type.decode("latin-1") if content_type else None
+            )
+            self._sink = IngestSink(self.max_size, UploadSpool())
+            self.form.files.append(self._part)
+        else:
+            if len(self.form.fields) >= self.max_fields:
+                raise ValueError(f"Too many fields (max {self.max_fields})")
+            self._field = (name, bytearray())
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._field is not None:
+            self._field[1].extend(data[start:end])
+            if len(self._field[1]) > MAX_FORM_FIELD_SIZE:
+                raise ValueError("Form field too large")
+        elif self._sink is not None:
+            try:
+                self._sink.update(data[start:end])
+            except PayloadTooLarge as e:
+                # Drop the rest of this file; the caller decides whether that fails the request.
+                self._part.error = e
+                self._sink.spool.close()
+                self._sink = None
+
+    def on_part_end(self) -> None:
+        if self._field is not None:
+            name, value = self._field
+            self.form.fields[name] = self._decode(bytes(value))
+            self._field = None
+        elif self._sink is not None:
+            try:
+                self._part.upload = self._sink.result(
+                    content_type=self._part.content_type, filename=self._part.filename
+                )
+            except HTTPException as e:
+                self._part.error = e
+                self._sink.spool.close()
+            self._sink = None
+
+    def on_end(self) -> None:
+        self.ended = True
+
+    def close(self) -> None:
+        if self._sink is not None:
+            self._sink.spool.close()
+        self.form.close()
+
+
+async def ingest_multipart(
+    chunks: AsyncIterator[bytes],
+    content_type: str,
+    max_size: int,
+    max_files: int = 1,
+    max_fields: int = 8,
+    fail_fast: bool = True,
+) -> MultipartForm:
+    """
+    Parse a streamed multipart/form-data body, hashing and spooling each file
+    as its bytes arrive (see IngestSink), so an upload is read exactly once.
+
+    Each file is limited to `max_size`. With `fail_fast` the first file that
+    is too large or empty fails the whole request; otherwise the error is
+    recorded on its FilePart and parsing goes on. Malformed bodies raise
+    HTTPException 400. Close the returned form when done with its uploads.
+    """
+    _, params = parse_options_header(content_type)
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(status_code=400, detail="Invalid request body: missing multipart boundary")
+    charset = params.get(b"charset", b"utf-8").decode("latin-1")
+
+    scanner = _MultipartScanner(boundary, charset, max_size, max_files, max_fields)
+    try:
+        async for chunk in chunks:
+            scanner.parser.write(chunk)
+            if fail_fast and scanner.form.error() is not None:
+                raise scanner.form.error()
+        if not scanner.ended:
+            raise ValueError("Truncated multipart body")
+        if fail_fast and scanner.form.error() is not None:
+            raise scanner.form.error()
+        return scanner.form
+    except ValueError as e:
+        scanner.close()
+        raise HTTPException(status_code=400, detail=f"Invalid request body: {e}")
+    except BaseException:
+        scanner.close()
+        raise
+
+
+class UploadLimitMiddleware:
+    """
+    Enforce per-route request body limits before the body is parsed.
+
+    `limits` maps a path to its maximum upload size; the body may exceed it by
+    MULTIPART_OVERHEAD for form framing. A declared Content-Length over that
+    is rejected with 413 without reading anything. Otherwise the body is
+    counted as it streams in and the request is aborted the moment it crosses
+    the limit, which also covers chunked uploads that declare no length.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        max_size = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if max_size is None:
+            await self.app(scope, receive, send)
+            return
+        limit = max_size + MULTIPART_OVERHEAD
+
+        for name, value in scope.get("headers", ()):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    break
+                if declared > limit:
+                    await self._reject(send, max_size)
+                    return
+                break
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise PayloadTooLarge(max_size)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send, max_size: int) -> None:
+        body = json.dumps({"detail": PayloadTooLarge(max_size).detail}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
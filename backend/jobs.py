@@ -0,0 +1,349 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import AsyncIterator, Callable, Dict, Optional, Set, Tuple
+
+from models import JobState
+
+# ---------- Persistent background jobs ----------
+
+# SQLite file holding job state. Every serve.py worker opens the same file, so
+# a job can be polled or streamed from whichever worker a request lands on.
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", os.path.join(tempfile.gettempdir(), "food-energy-jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+# Jobs waiting for a worker, per process; submissions beyond this are refused.
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", 64))
+# How long finished jobs (and their results) are kept.
+JOB_RESULT_TTL = float(os.environ.get("JOB_RESULT_TTL", 60 * 60))
+
+# Watchers re-read the store at least this often, which also picks up
+# progress made by other processes.
+WATCH_POLL_INTERVAL = 1.0
+SWEEP_INTERVAL = 60.0
+
+FINISHED = (JobState.DONE.value, JobState.FAILED.value)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    dedup_key TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    params TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_dedup ON jobs (dedup_key);
+CREATE INDEX IF NOT EXISTS jobs_expires ON jobs (expires_at);
+"""
+
+_COLUMNS = (
+    "id", "kind", "dedup_key", "owner", "status", "stage", "progress",
+    "params", "result", "error", "created_at", "updated_at", "expires_at",
+)
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+if sys.platform == "win32":
+    import ctypes
+    from ctypes import wintypes
+
+    # os.kill(pid, 0) on Windows terminates the process, so ask the kernel instead.
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _kernel32.OpenProcess.argtypes = (wintypes.DWORD, wintypes.BOOL, wintypes.DWORD)
+    _kernel32.OpenProcess.restype = wintypes.HANDLE
+    _kernel32.GetExitCodeProcess.argtypes = (wintypes.HANDLE, ctypes.POINTER(wintypes.DWORD))
+    _kernel32.CloseHandle.argtypes = (wintypes.HANDLE,)
+    _PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    _ERROR_ACCESS_DENIED = 5
+    _STILL_ACTIVE = 259
+
+    def _pid_alive(pid: int) -> bool:
+        handle = _kernel32.OpenProcess(_PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            # Access denied means the process exists but belongs to someone else.
+            return ctypes.get_last_error() == _ERROR_ACCESS_DENIED
+        try:
+            code = wintypes.DWORD()
+            if not _kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+                return True
+            return code.value == _STILL_ACTIVE
+        finally:
+            _kernel32.CloseHandle(handle)
+else:
+    def _pid_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+
+class JobStore:
+    """
+    Job records in SQLite (WAL mode, so readers in other processes don't
+    block the writer). Finished jobs get an expiry; expired jobs are invisible
+    to lookups and deleted by purge_expired().
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH, ttl: float = JOB_RESULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def _record(row) -> Optional[dict]:
+        if row is None:
+            return None
+        record = dict(zip(_COLUMNS, row))
+        record["params"] = json.loads(record["params"])
+        if record["result"] is not None:
+            record["result"] = json.loads(record["result"])
+        return record
+
+    def get(self, job_id: str, now: Optional[float] = None) -> Optional[dict]:
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (job_id, now),
+            ).fetchone()
+        return self._record(row)
+
+    def create(self, kind: str, dedup_key: str, params: dict) -> Tuple[dict, bool]:
+        """
+        Insert a queued job, or return the live job already registered under
+        `dedup_key` (anything not failed or expired). Returns (job, created).
+        """
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so the check and insert are atomic across processes.
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE dedup_key = ? AND status != ? "
+                    "AND (expires_at IS NULL OR expires_at > ?) ORDER BY created_at DESC LIMIT 1",
+                    (dedup_key, JobState.FAILED.value, now),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("COMMIT")
+                    return self._record(row), False
+                job_id = uuid.uuid4().hex
+                self._db.execute(
+                    "INSERT INTO jobs (id, kind, dedup_key, owner, status, progress, params, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)",
+                    (job_id, kind, dedup_key, _owner(), JobState.QUEUED.value, json.dumps(params), now, now),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return self.get(job_id, now), True
+
+    def update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        if fields.get("status") in FINISHED:
+            fields["expires_at"] = fields["updated_at"] + self.ttl
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        with self._lock:
+            cursor = self._db.execute("DELETE FROM jobs WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        return cursor.rowcount
+
+    def fail_orphaned(self) -> int:
+        """Fail unfinished jobs owned by processes on this host that no longer exist."""
+        host = socket.gethostname()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, owner FROM jobs WHERE status IN (?, ?)", (JobState.QUEUED.value, JobState.RUNNING.value)
+            ).fetchall()
+        failed = 0
+        for job_id, owner in rows:
+            owner_host, _, pid = owner.rpartition(":")
+            if owner_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+                self.update(job_id, status=JobState.FAILED.value, error="Interrupted by a server restart")
+                failed += 1
+        return failed
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class JobRunner:
+    """
+    Runs submitted jobs on a bounded pool and tells watchers about progress.
+
+    Job functions are plain synchronous callables run on `workers` threads;
+    they receive a `progress(stage, fraction)` callback and return a
+    JSON-serializable result. At most `queue_limit` jobs wait per process;
+    beyond that submit() raises QueueFull. The asyncio side starts lazily on
+    the first submission. Store reads and writes made from the event loop
+    run on the default executor, so SQLite never blocks the loop.
+    """
+
+    def __init__(self, store: JobStore, workers: int = JOB_WORKERS, queue_limit: int = JOB_QUEUE_LIMIT):
+        self.store = store
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.queue: Optional[asyncio.Queue] = None
+        self.reserved = 0  # queue slots held by submissions still creating their record
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.tasks = []
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.waiters: Dict[str, Set[asyncio.Event]] = {}
+
+    def _start(self) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(self.queue_limit)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self.tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        self.tasks.append(asyncio.ensure_future(self._sweeper()))
+
+    async def _store(self, fn: Callable, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, partial(fn, *args, **kwargs))
+
+    async def submit(
+        self, kind: str, dedup_key: str, params: dict, fn: Callable, cleanup: Optional[Callable] = None
+    ) -> Tuple[dict, bool]:
+        """
+        Queue `fn` as a job unless an identical one (same `dedup_key`) is
+        live. `cleanup` runs once the job is finished, or straight away when
+        `fn` isn't queued (including when the job can't be recorded).
+        Returns (job record, created).
+        """
+        if self.queue is None:
+            self._start()
+        if self.queue.qsize() + self.reserved >= self.queue_limit:
+            if cleanup is not None:
+                cleanup()
+            raise QueueFull()
+        self.reserved += 1
+        try:
+            job, created = await self._store(self.store.create, kind, dedup_key, params)
+        except BaseException:
+            if cleanup is not None:
+                cleanup()
+            raise
+        finally:
+            self.reserved -= 1
+        if created:
+            self.queue.put_nowait((job["id"], fn, cleanup))
+        elif cleanup is not None:
+            cleanup()
+        return job, created
+
+    async def _worker(self) -> None:
+        while True:
+            job_id, fn, cleanup = await self.queue.get()
+            try:
+                await self._run(job_id, fn)
+            finally:
+                if cleanup is not None:
+                    cleanup()
+                self.queue.task_done()
+
+    async def _run(self, job_id: str, fn: Callable) -> None:
+        loop = self.loop
+
+        def progress(stage: str, fraction: float) -> None:
+            self.store.update(job_id, stage=stage, progress=fraction)
+            loop.call_soon_threadsafe(self._notify, job_id)
+
+        await self._store(self.store.update, job_id, status=JobState.RUNNING.value)
+        self._notify(job_id)
+        try:
+            result = await loop.run_in_executor(self.executor, fn, progress)
+        except Exception as e:
+            await self._store(self.store.update, job_id, status=JobState.FAILED.value, error=str(e) or type(e).__name__)
+        else:
+            await self._store(self.store.update, job_id, status=JobState.DONE.value, progress=1.0, result=result)
+        self._notify(job_id)
+
+    async def _sweeper(self) -> None:
+        # Workers on this host may die at any time, not only before this one started.
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            await self.loop.run_in_executor(self.executor, self.store.fail_orphaned)
+            await self.loop.run_in_executor(self.executor, self.store.purge_expired)
+
+    def _notify(self, job_id: str) -> None:
+        for event in self.waiters.get(job_id, ()):
+            event.set()
+
+    async def watch(self, job_id: str, heartbeat: float = 15.0) -> AsyncIterator[Optional[dict]]:
+        """
+        Yield the job record each time it changes, ending after it finishes
+        or disappears. Yields None every `heartbeat` seconds without a change
+        so callers can keep idle connections alive.
+        """
+        event = asyncio.Event()
+        self.waiters.setdefault(job_id, set()).add(event)
+        try:
+            last = None
+            idle = 0.0
+            while True:
+                job = await self._store(self.store.get, job_id)
+                if job is None:
+                    return
+                state = (job["status"], job["stage"], job["progress"])
+                if state != last:
+                    last = state
+                    idle = 0.0
+                    yield job
+                    if job["status"] in FINISHED:
+                        return
+                elif idle >= heartbeat:
+                    idle = 0.0
+                    yield None
+                event.clear()
+                try:
+                    await asyncio.wait_for(event.wait(), WATCH_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    idle += WATCH_POLL_INTERVAL
+        finally:
+            waiters = self.waiters.get(job_id)
+            if waiters is not None:
+                waiters.discard(event)
+                if not waiters:
+                    del self.waiters[job_id]
+
+    def shutdown(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
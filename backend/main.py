@@ -1,12 +1,72 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile
+from fastapi import FastAPI, HTTPException, Header, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from typing import Callable, List, Optional
+from datetime import datetime, timezone
+import asyncio
 import hashlib
+import hmac
+import json
+import logging
+import os
 
 from models import *
-from mock_data import MOCK_FOODS, SEASONAL_RECOMMENDATIONS, FOOD_COMBINATIONS, MOCK_RECIPES
+from catalog import CatalogRepository, CatalogSnapshot
+from search import InvalidCursor
+from names import normalize_name
+from identify_cache import cache_from_env
+from ingest import FilePart, IngestedUpload, MultipartForm, UploadLimitMiddleware, ingest_json_base64, ingest_multipart
+from phash import PerceptualHashIndex, is_informative
+from http_cache import RenderedResponse, accepts_encoding, cached_response, etag_matches
+from admission import AdmissionMiddleware, route_policies
+from metrics import MetricsMiddleware, registry as metrics_registry, stage
+from jobs import JobRunner, JobStore, QueueFull
+from sync import SyncLog, SyncNotReady
+from imaging import (
+    ImageDecodeError, ImagePoolUnavailable, image_dhash, image_workers, preprocess_image, run_in_process_pool,
+    shutdown_process_pool,
+)
 
 app = FastAPI(title="Food Energy API", version="1.0.0")
+logger = logging.getLogger("food-energy")
+
+# Indexed catalog; handlers read `catalog.snapshot` once per request.
+catalog = CatalogRepository()
+
+MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 MB
+MAX_BATCH_FILES = 64
+MAX_BATCH_UPLOAD_SIZE = 64 * 1024 * 1024  # 64 MB across all files
+
+# Reject oversize uploads from Content-Length, or as soon as the streamed body crosses the limit.
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={
+        "/api/food/identify": MAX_FILE_SIZE,
+        "/api/food/identify/batch": MAX_BATCH_UPLOAD_SIZE,
+        # JSON bodies carry the photo base64-encoded, 4/3 of its size.
+        "/api/combinations/analyze": MAX_FILE_SIZE * 4 // 3,
+    },
+)
+
+# Shed image work with 429/503 + Retry-After instead of queueing it; catalog
+# reads are not in any lane, so they stay fast while uploads are saturated.
+# Defaults (env overrides, see admission.py): the image lane admits 16 jobs
+# (IMAGE_LANE_MAX_JOBS) and 128MB of declared bodies (IMAGE_LANE_MAX_BYTES)
+# at once; each client gets 5 image requests/s (IMAGE_CLIENT_RATE) with
+# bursts of 20 (IMAGE_CLIENT_BURST) per route. Clients are keyed by socket
+# address, or by the first X-Forwarded-For hop with TRUST_FORWARDED_FOR=1.
+# Each route below can be tuned on its own by name, e.g.
+# ADMISSION_IDENTIFY_BATCH_RATE=1 or ADMISSION_ANALYZE_LANE=analysis with
+# ADMISSION_ANALYSIS_MAX_JOBS=4 to give analysis a lane of its own.
+app.add_middleware(
+    AdmissionMiddleware,
+    policies=route_policies([
+        ("identify", "/api/food/identify", MAX_FILE_SIZE),
+        ("identify_batch", "/api/food/identify/batch", MAX_BATCH_UPLOAD_SIZE),
+        ("analyze", "/api/combinations/analyze", MAX_FILE_SIZE),
+    ]),
+)
 
 # CORS for Expo / frontend (for hackathon allow all)
 app.add_middleware(
@@ -17,188 +77,758 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so requests rejected by the middleware above are counted too.
+app.add_middleware(MetricsMiddleware)
+
 # ---------- Helpers ----------
 
-MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 MB
+MAX_SEARCH_LIMIT = 100
+MAX_NEARBY_MARKETS = 50
 
 
-def deterministic_identify_food_from_bytes(image_bytes: bytes) -> str:
+def deterministic_identify_food_from_digest(digest: str, snapshot: Optional[CatalogSnapshot] = None) -> str:
     """
-    Deterministic mock: hash image bytes and pick an index from MOCK_FOODS.
+    Deterministic mock: pick an index from the catalog's foods using the
+    SHA-256 hex digest of the image bytes.
+    """
+    food_keys = (snapshot or catalog.snapshot).food_keys
+    idx = int(digest[:8], 16) % len(food_keys)
+    return food_keys[idx]
+
+
+def deterministic_identify_food_from_bytes(image_bytes: bytes, snapshot: Optional[CatalogSnapshot] = None) -> str:
+    """
+    Deterministic mock: hash image bytes and pick an index from the catalog's foods.
     Same image => same detected food. Good for demo.
     """
     if not image_bytes:
-        return list(MOCK_FOODS.keys())[0]
-    h = hashlib.sha256(image_bytes).hexdigest()
-    idx = int(h[:8], 16) % len(MOCK_FOODS)
-    return list(MOCK_FOODS.keys())[idx]
+        return (snapshot or catalog.snapshot).food_keys[0]
+    return deterministic_identify_food_from_digest(hashlib.sha256(image_bytes).hexdigest(), snapshot)
+
+
+def identify_with_near_duplicates(digest: str, perceptual_hash: Optional[str], snapshot: CatalogSnapshot) -> str:
+    """
+    Reuse the classification of a previously seen near-identical photo when
+    there is one; otherwise classify and remember the perceptual hash.
+    """
+    value = int(perceptual_hash, 16) if perceptual_hash is not None else None
+    if value is None or not is_informative(value):
+        return deterministic_identify_food_from_digest(digest, snapshot)
+
+    match = near_duplicates.nearest(value)
+    if match is not None and match[0] in snapshot.foods:
+        return match[0]
+
+    identified_food = deterministic_identify_food_from_digest(digest, snapshot)
+    near_duplicates.add(value, identified_food)
+    return identified_food
+
+
+def build_identify_response(identified_food: str, snapshot: CatalogSnapshot) -> FoodIdentifyResponse:
+    if identified_food in snapshot.foods:
+        food_data = snapshot.foods[identified_food]
+        relevant_recipes = snapshot.recipes_for(identified_food)
+
+        return FoodIdentifyResponse(
+            foodName=food_data["name"],
+            energeticType=food_data["energeticType"],
+            description=f"{food_data['name']} is a {food_data['energeticType'].value} food",
+            benefits=food_data["benefits"],
+            recipes=relevant_recipes[:3],
+        )
+
+    # Default fallback
+    return FoodIdentifyResponse(
+        foodName="Unknown Food",
+        energeticType=EnergeticType.NEUTRAL,
+        description="Food not in database",
+        benefits="Please try another image",
+        recipes=[],
+    )
+
+
+# Finished identification results keyed by upload digest (see identify_cache.py).
+identify_cache = cache_from_env()
+
+# Perceptual hashes of photos seen so far -> identified food key (see phash.py).
+near_duplicates = PerceptualHashIndex()
 
 
 # ---------- Endpoints ----------
 
+def render_seasonal_foods(season: Season, snapshot: CatalogSnapshot) -> bytes:
+    foods = []
+    for name in snapshot.seasonal_recommendations.get(season, []):
+        key = snapshot.food_key_for_name(name)
+        if key is not None:
+            foods.append(Food(**snapshot.foods[key]))
+        else:
+            foods.append(
+                Food(
+                    id=f"temp_{name}",
+                    name=name.title(),
+                    energeticType=EnergeticType.NEUTRAL,
+                    benefits=f"Seasonal food for {season.value}",
+                    commonUses=[],
+                )
+            )
+    return SeasonalFoods(season=season, foods=foods).model_dump_json().encode()
+
+
 @app.get("/api/seasons/{season_id}/foods", response_model=SeasonalFoods)
-async def get_seasonal_foods(season_id: str):
+async def get_seasonal_foods(season_id: str, request: Request):
     try:
         season = Season(season_id.lower())
-        food_names = SEASONAL_RECOMMENDATIONS.get(season, [])
-
-        foods = []
-        for name in food_names:
-            if name in MOCK_FOODS:
-                foods.append(Food(**MOCK_FOODS[name]))
-            else:
-                foods.append(
-                    Food(
-                        id=f"temp_{name}",
-                        name=name.title(),
-                        energeticType=EnergeticType.NEUTRAL,
-                        benefits=f"Seasonal food for {season.value}",
-                        commonUses=[],
-                    )
-                )
-
-        return SeasonalFoods(season=season, foods=foods)
     except ValueError:
         raise HTTPException(status_code=404, detail=f"Season {season_id} not found")
 
+    snapshot = catalog.snapshot
+    rendered = snapshot.rendered.get(("season", season), lambda: render_seasonal_foods(season, snapshot))
+    return cached_response(request, rendered)
+
+
+def recommendation_user(request: RecommendationRequest) -> dict:
+    conditions = list(request.conditions)
+    if request.constitution:
+        constitution = request.constitution.strip()
+        if not constitution.lower().endswith("constitution"):
+            constitution = f"{constitution} constitution"
+        conditions.append(constitution)
+    return {"season": request.season, "conditions": conditions, "recentFoods": request.recentFoods}
+
+
+def recommendation_response(season: Season, ranked: List[tuple], snapshot: CatalogSnapshot) -> RecommendationResponse:
+    # Model rows follow the catalog's food order; only the top-k foods are decoded.
+    return RecommendationResponse(
+        season=season,
+        foods=[
+            ScoredFood(food=Food(**snapshot.foods[snapshot.food_keys[row]]), score=round(score, 4))
+            for row, score in ranked
+        ],
+    )
+
+
+@app.post("/api/recommendations", response_model=RecommendationResponse)
+async def recommend_foods(request: RecommendationRequest):
+    """
+    Rank the whole catalog for one user by season, constitution, health
+    conditions and recently eaten foods.
+    """
+    snapshot = catalog.snapshot
+    ranked = snapshot.recommender.recommend_batch([recommendation_user(request)], request.k)[0]
+    return recommendation_response(request.season, ranked, snapshot)
+
+
+@app.post("/api/recommendations/batch", response_model=BatchRecommendationResponse)
+async def recommend_foods_batch(request: BatchRecommendationRequest):
+    """Score many users in one matrix product; results follow the order of `users`."""
+    snapshot = catalog.snapshot
+    users = [recommendation_user(u) for u in request.users]
+    k = max((u.k for u in request.users), default=0)
+    ranked = snapshot.recommender.recommend_batch(users, k)
+    return BatchRecommendationResponse(
+        results=[
+            recommendation_response(u.season, r[:u.k], snapshot) for u, r in zip(request.users, ranked)
+        ]
+    )
+
 
 # ---------- File-upload / Identification endpoint ----------
-@app.post("/api/food/identify", response_model=FoodIdentifyResponse)
-async def identify_food(file: UploadFile = File(...)):
+async def upload_dhash(upload: IngestedUpload) -> Optional[str]:
+    """
+    Perceptual hash of an ingested upload, computed in the image pool. Large
+    uploads reach the worker as the path of their spool file rather than
+    pickled bytes (see IngestedUpload.handoff). None when the image doesn't
+    decode.
+    """
+    source = await run_in_threadpool(upload.handoff)
+    try:
+        return await run_in_process_pool(image_dhash, source)
+    except ImageDecodeError:
+        return None
+
+
+IDENTIFY_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "required": ["file"],
+                "properties": {"file": {"type": "string", "format": "binary"}},
+            }
+        },
+    },
+}
+
+
+async def ingest_form(request: Request, max_size: int, **options) -> MultipartForm:
+    """The request's multipart body, each file hashed and spooled as it streams in (see ingest_multipart)."""
+    content_type = request.headers.get("content-type", "")
+    if not content_type.startswith("multipart/form-data"):
+        raise HTTPException(status_code=415, detail="Send multipart/form-data")
+    return await ingest_multipart(request.stream(), content_type, max_size, **options)
+
+
+@app.post(
+    "/api/food/identify",
+    response_model=FoodIdentifyResponse,
+    openapi_extra={"requestBody": IDENTIFY_REQUEST_BODY},
+)
+async def identify_food(request: Request):
     """
     Accept an image file upload from frontend, run a deterministic mock-identification,
     and return the energetic info.
     """
+    form = None
     try:
+        # Streamed parse + incremental hash; the upload stays in its spooled buffer.
+        with stage("read"):
+            form = await ingest_form(request, MAX_FILE_SIZE)
+        part = form.file("file")
+        if part is None:
+            raise HTTPException(status_code=422, detail="file is required")
+
         # Basic validation
-        if not file.content_type or not file.content_type.startswith("image/"):
+        if not part.content_type or not part.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="Uploaded file is not an image")
+        upload = part.upload
 
-        contents = await file.read()
+        snapshot = catalog.snapshot
+        cache_key = identify_cache.key(snapshot.version, upload.digest)
+        with stage("cache"):
+            response = await identify_cache.get(cache_key)
 
-        if len(contents) == 0:
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
+        if response is None:
+            # Perceptual hash so re-encoded copies of a known photo reuse its result.
+            with stage("hash"):
+                perceptual_hash = await upload_dhash(upload)
 
-        if len(contents) > MAX_FILE_SIZE:
-            raise HTTPException(status_code=413, detail="File too large (max 5MB)")
+            # Identify food (deterministic mock)
+            with stage("lookup"):
+                identified_food = identify_with_near_duplicates(upload.digest, perceptual_hash, snapshot)
+            with stage("recipes"):
+                response = build_identify_response(identified_food, snapshot)
+            await identify_cache.set(cache_key, response)
 
-        # Identify food (deterministic mock)
-        identified_food = deterministic_identify_food_from_bytes(contents)
+        with stage("serialize"):
+            body = response.model_dump_json()
+        return Response(content=body, media_type="application/json")
 
-        if identified_food in MOCK_FOODS:
-            food_data = MOCK_FOODS[identified_food]
-            relevant_recipes = [r for r in MOCK_RECIPES if identified_food in r["ingredients"]]
-
-            return FoodIdentifyResponse(
-                foodName=food_data["name"],
-                energeticType=food_data["energeticType"],
-                description=f"{food_data['name']} is a {food_data['energeticType'].value} food",
-                benefits=food_data["benefits"],
-                recipes=relevant_recipes[:3],
-            )
-
-        # Default fallback
-        return FoodIdentifyResponse(
-            foodName="Unknown Food",
-            energeticType=EnergeticType.NEUTRAL,
-            description="Food not in database",
-            benefits="Please try another image",
-            recipes=[],
-        )
-    
     except HTTPException:
         raise
+    except ImagePoolUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
     finally:
-        await file.close()
-
-
-@app.post("/api/combinations/analyze", response_model=CombinationAnalysisResponse)
-async def analyze_combinations(request: CombinationAnalysisRequest):
-    detected_ingredients = list(MOCK_FOODS.keys())[:3]  # pick first 3 deterministically
-
-    good_combos = []
-    bad_combos = []
+        if form is not None:
+            form.close()
+
+
+BATCH_IDENTIFY_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "required": ["files"],
+                "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+            }
+        },
+    },
+}
+
+
+@app.post("/api/food/identify/batch", openapi_extra={"requestBody": BATCH_IDENTIFY_REQUEST_BODY})
+async def identify_food_batch(request: Request):
+    """
+    Identify many images in one request. Decoding and preprocessing run in the
+    image process pool; results stream back as NDJSON, one line per file, in
+    the order they finish. Each line carries the file's `index` in the upload.
+    """
+    # Same streamed ingestion as /api/food/identify; a file that is too large
+    # or empty fails only its own line.
+    form = await ingest_form(request, MAX_FILE_SIZE, max_files=MAX_BATCH_FILES, fail_fast=False)
+    parts = [part for part in form.files if part.name == "files"]
+    if not parts:
+        form.close()
+        raise HTTPException(status_code=422, detail="files is required")
+
+    snapshot = catalog.snapshot
+    # Only as many images as there are pool workers are being decoded at once.
+    slots = asyncio.Semaphore(image_workers())
+
+    async def identify_one(index: int, part: FilePart) -> dict:
+        item = {"index": index, "filename": part.filename}
+        if not part.content_type or not part.content_type.startswith("image/"):
+            return {**item, "error": {"status": 400, "detail": "Uploaded file is not an image"}}
+        if part.error is not None:
+            return {**item, "error": {"status": part.error.status_code, "detail": part.error.detail}}
+
+        upload = part.upload
+        async with slots:
+            try:
+                source = await run_in_threadpool(upload.handoff)
+                image = {"digest": upload.digest, **await run_in_process_pool(preprocess_image, source)}
+            except ImageDecodeError as e:
+                return {**item, "error": {"status": 400, "detail": str(e)}}
+            except ImagePoolUnavailable as e:
+                return {**item, "error": {"status": 503, "detail": str(e)}}
+            except Exception as e:
+                return {**item, "error": {"status": 500, "detail": f"Error processing image: {str(e)}"}}
+            finally:
+                part.close()
+
+        cache_key = identify_cache.key(snapshot.version, upload.digest)
+        response = await identify_cache.get(cache_key)
+        if response is None:
+            identified_food = identify_with_near_duplicates(upload.digest, image["dhash"], snapshot)
+            response = build_identify_response(identified_food, snapshot)
+            await identify_cache.set(cache_key, response)
+
+        return {**item, "image": image, "result": response.model_dump(mode="json")}
+
+    async def stream_results():
+        tasks = [asyncio.ensure_future(identify_one(i, part)) for i, part in enumerate(parts)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                yield json.dumps(line) + "\n"
+        finally:
+            # Client went away or a line failed: don't leave work queued, or spool files behind.
+            for task in tasks:
+                task.cancel()
+            form.close()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    shutdown_process_pool()
+    job_runner.shutdown()
+    sync_log.close()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Request metrics in Prometheus text format."""
+    return Response(content=metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/food/identify/cache")
+async def get_identify_cache_stats():
+    return {**identify_cache.stats(), "nearDuplicates": near_duplicates.stats()}
+
+
+# Both body encodings of /api/combinations/analyze, for the OpenAPI docs.
+ANALYZE_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "application/json": {"schema": CombinationAnalysisRequest.model_json_schema()},
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "required": ["file", "healthNotes"],
+                "properties": {"file": {"type": "string", "format": "binary"}, "healthNotes": {"type": "string"}},
+            }
+        },
+    },
+}
+
+
+def run_combination_analysis(
+    image: IngestedUpload, health_notes: str, snapshot: CatalogSnapshot, progress: Optional[Callable] = None
+) -> CombinationAnalysisResponse:
+    """
+    The analysis behind /api/combinations/analyze, shared by the inline and
+    job modes. `progress(stage, fraction)` is called as each stage starts.
+    """
+    def report_progress(name: str, fraction: float) -> None:
+        if progress is not None:
+            progress(name, fraction)
 
-    for combo in FOOD_COMBINATIONS.get("good", []):
-        if combo["food1"] in detected_ingredients and combo["food2"] in detected_ingredients:
-            good_combos.append(combo)
+    report_progress("detect", 0.1)
+    with stage("detect"):
+        # Ingredient detection stub: `image` is unused until a real detector replaces this.
+        detected_ingredients = list(snapshot.food_keys[:3])  # pick first 3 deterministically
 
-    for combo in FOOD_COMBINATIONS.get("bad", []):
-        if combo["food1"] in detected_ingredients and combo["food2"] in detected_ingredients:
-            bad_combos.append(combo)
+    # Ranked good/bad combos from the compiled rule engine (see compatibility.py).
+    report_progress("rules", 0.5)
+    with stage("rules"):
+        report = snapshot.compatibility.analyze(detected_ingredients)
 
-    recommendations = []
-    if "cold" in request.healthNotes.lower():
-        recommendations.append("Add warming foods like ginger or cinnamon")
-    if "digest" in request.healthNotes.lower():
-        recommendations.append("Consider adding digestive aids like ginger or fennel")
-    if not recommendations:
-        recommendations.append("Balance your meal with neutral foods like rice")
+    report_progress("recommendations", 0.8)
+    with stage("recommendations"):
+        # One pass over the notes against every rule (see health_notes.py).
+        recommendations, conditions = snapshot.health_notes.recommendations(health_notes, detected_ingredients)
 
     return CombinationAnalysisResponse(
         ingredients=[i.title() for i in detected_ingredients],
-        goodCombinations=good_combos,
-        badCombinations=bad_combos,
+        goodCombinations=report.good,
+        badCombinations=report.bad,
         recommendations=recommendations,
+        bestCombination=report.best,
+        worstCombination=report.worst,
+        compatibilityScore=report.score,
+        matchedConditions=[c.condition for c in conditions],
+    )
+
+
+def wants_async(request: Request) -> bool:
+    if request.query_params.get("mode") == "async":
+        return True
+    prefer = request.headers.get("prefer", "")
+    return any(token.strip().lower() == "respond-async" for token in prefer.split(","))
+
+
+# Jobs for /api/combinations/analyze in async mode (see jobs.py).
+job_store = JobStore()
+job_runner = JobRunner(job_store)
+
+
+@app.on_event("startup")
+async def fail_orphaned_jobs():
+    # Jobs left queued or running by a dead process would otherwise never finish for their watchers.
+    await run_in_threadpool(job_store.fail_orphaned)
+
+
+@app.post(
+    "/api/combinations/analyze",
+    response_model=CombinationAnalysisResponse,
+    responses={202: {"model": JobAccepted, "description": "Queued as a job (async mode)"}},
+    openapi_extra={"requestBody": ANALYZE_REQUEST_BODY},
+)
+async def analyze_combinations(request: Request):
+    """
+    Takes the photo either as a multipart upload (`file` plus a `healthNotes`
+    form field) or as JSON with `imageBase64`, which is decoded as the body
+    streams in. Both go through the same bounded-memory ingestion as
+    identification uploads.
+
+    With `?mode=async` or `Prefer: respond-async` the analysis is queued
+    instead and the response is 202 with a job id; poll /api/jobs/{id} or
+    stream /api/jobs/{id}/events. Identical submissions share one job.
+    """
+    content_type = request.headers.get("content-type", "")
+    form = None
+    upload = None
+    handed_off = False
+    try:
+        with stage("read"):
+            if content_type.startswith("multipart/form-data"):
+                form = await ingest_form(request, MAX_FILE_SIZE)
+                part = form.file("file")
+                if part is None:
+                    raise HTTPException(status_code=422, detail="file is required")
+                upload = part.upload
+                health_notes = form.fields.get("healthNotes")
+            elif not content_type or content_type.startswith("application/json"):
+                upload, members = await ingest_json_base64(request.stream(), "imageBase64", MAX_FILE_SIZE)
+                health_notes = members.get("healthNotes")
+            else:
+                raise HTTPException(status_code=415, detail="Send multipart/form-data or application/json")
+        if not isinstance(health_notes, str):
+            raise HTTPException(status_code=422, detail="healthNotes is required")
+
+        snapshot = catalog.snapshot
+        if not wants_async(request):
+            return run_combination_analysis(upload, health_notes, snapshot)
+
+        dedup_key = hashlib.sha256(f"{snapshot.version}:{upload.digest}:{health_notes}".encode()).hexdigest()
+        image = upload
+        handed_off = True
+        try:
+            job, _ = await job_runner.submit(
+                "combination-analysis",
+                dedup_key,
+                {"digest": upload.digest, "healthNotes": health_notes},
+                lambda progress: run_combination_analysis(image, health_notes, snapshot, progress).model_dump(
+                    mode="json"
+                ),
+                cleanup=image.file.close,
+            )
+        except QueueFull:
+            raise HTTPException(
+                status_code=503, detail="Too many queued jobs, try again shortly", headers={"Retry-After": "5"}
+            )
+        accepted = JobAccepted(
+            jobId=job["id"],
+            status=job["status"],
+            statusUrl=f"/api/jobs/{job['id']}",
+            eventsUrl=f"/api/jobs/{job['id']}/events",
+        )
+        return JSONResponse(
+            status_code=202, content=accepted.model_dump(mode="json"), headers={"Location": accepted.statusUrl}
+        )
+    finally:
+        if handed_off:
+            pass  # the job closes the upload
+        elif form is not None:
+            form.close()
+        elif upload is not None:
+            upload.file.close()
+
+
+def job_view(job: dict) -> AnalysisJob:
+    return AnalysisJob(
+        id=job["id"],
+        status=job["status"],
+        stage=job["stage"],
+        progress=job["progress"],
+        result=job["result"],
+        error=job["error"],
+        createdAt=job["created_at"],
+        updatedAt=job["updated_at"],
+        expiresAt=job["expires_at"],
+    )
+
+
+@app.get("/api/jobs/{job_id}", response_model=AnalysisJob)
+async def get_job(job_id: str):
+    job = await run_in_threadpool(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job_view(job)
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Server-Sent Events for a job: a `progress` event per stage, then one
+    `done` or `failed` event carrying the final job (with its result), after
+    which the stream ends. Comment lines keep idle connections open.
+    """
+    if await run_in_threadpool(job_store.get, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+
+    async def events():
+        async for job in job_runner.watch(job_id):
+            if job is None:
+                yield ": keep-alive\n\n"
+                continue
+            name = job["status"] if job["status"] in (JobState.DONE.value, JobState.FAILED.value) else "progress"
+            yield f"event: {name}\ndata: {job_view(job).model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
 
 @app.get("/api/foods/search")
-async def search_foods(name: str):
-    results = []
-    search_term = name.lower()
-    for food_name, food_data in MOCK_FOODS.items():
-        if search_term in food_name.lower():
-            results.append(Food(**food_data))
-    return {"foods": results}
+async def search_foods(
+    name: str,
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_LIMIT),
+    cursor: Optional[str] = None,
+):
+    """
+    Ranked, typo-tolerant search over food names, benefits and common uses.
+    Pass `nextCursor` back as `cursor` to fetch the following page.
+    """
+    try:
+        foods, next_cursor = catalog.snapshot.search_index.search(name, limit=limit, cursor=cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"foods": foods, "nextCursor": next_cursor}
 
 
 @app.get("/api/foods/{food_id}", response_model=Food)
-async def get_food_details(food_id: str):
-    for food_data in MOCK_FOODS.values():
-        if food_data["id"] == food_id:
-            return Food(**food_data)
-    raise HTTPException(status_code=404, detail="Food not found")
+async def get_food_details(food_id: str, request: Request):
+    snapshot = catalog.snapshot
+    food_data = snapshot.food_by_id(food_id)
+    if food_data is None:
+        raise HTTPException(status_code=404, detail="Food not found")
+    rendered = snapshot.rendered.get(("food", food_id), lambda: Food(**food_data).model_dump_json().encode())
+    return cached_response(request, rendered)
 
 
 @app.get("/api/recipes/by-food/{food_id}")
 async def get_recipes_by_food(food_id: str):
-    food_name = None
-    for name, data in MOCK_FOODS.items():
-        if data["id"] == food_id:
-            food_name = name
-            break
+    snapshot = catalog.snapshot
+    food_name = snapshot.food_key_by_id.get(food_id)
 
     if not food_name:
         raise HTTPException(status_code=404, detail="Food not found")
 
-    recipes = [r for r in MOCK_RECIPES if food_name in r["ingredients"]]
-    return {"recipes": recipes}
+    return {"recipes": snapshot.recipes_for(food_name)}
+
+
+@app.post("/api/recipes/match", response_model=RecipeMatchResponse)
+async def match_recipes(request: RecipeMatchRequest):
+    """
+    The `k` recipes best covered by the given pantry ingredients, with what
+    each still needs. Ranked by coverage, then fewest missing ingredients,
+    then fit with `season`.
+    """
+    snapshot = catalog.snapshot
+    pantry = [snapshot.food_key_for_name(name) or normalize_name(name) for name in request.ingredients]
+    matches = snapshot.recipe_matcher.match(pantry, request.k, request.season, request.maxMissing)
+    return RecipeMatchResponse(
+        recipes=[
+            RecipeMatch(
+                recipe=m.recipe,
+                matchedIngredients=m.matched,
+                missingIngredients=m.missing,
+                coverage=round(m.coverage, 4),
+            )
+            for m in matches
+        ]
+    )
 
 
 @app.get("/api/health-conditions")
-async def get_health_conditions():
-    return {
-        "conditions": [
-            "Cold constitution",
-            "Heat constitution",
-            "Digestive issues",
-            "Poor circulation",
-            "Insomnia",
-            "Fatigue",
-            "Allergies",
-            "High blood pressure",
+async def get_health_conditions(request: Request):
+    snapshot = catalog.snapshot
+    rendered = snapshot.rendered.get(
+        "health-conditions",
+        lambda: json.dumps({"conditions": snapshot.health_conditions}, separators=(",", ":")).encode(),
+    )
+    return cached_response(request, rendered)
+
+
+@app.get("/api/markets/nearby", response_model=NearbyMarketsResponse)
+async def get_nearby_markets(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    ingredients: List[str] = Query([]),
+    k: int = Query(5, ge=1, le=MAX_NEARBY_MARKETS),
+    radiusMiles: Optional[float] = Query(None, gt=0),
+    openNow: bool = True,
+):
+    """
+    The `k` nearest markets that stock every requested ingredient
+    (repeat `ingredients` for several), with great-circle distances in miles.
+    By default only markets open right now, in each market's own time zone,
+    are returned; markets without known hours or time zone are kept.
+    """
+    at = datetime.now(timezone.utc) if openNow else None
+    nearest = catalog.snapshot.market_index.nearest(
+        lat, lon, ingredients, k=k, max_miles=radiusMiles, at=at
+    )
+    return NearbyMarketsResponse(
+        markets=[
+            NearbyMarket(**market, distance=round(distance, 2), openNow=open_now)
+            for distance, market, open_now in nearest
         ]
+    )
+
+
+# ---------- Catalog admin ----------
+
+# Reload requests must carry this value in X-Reload-Token; without it the
+# endpoint is disabled.
+CATALOG_RELOAD_TOKEN = os.environ.get("CATALOG_RELOAD_TOKEN")
+
+
+@app.post("/api/catalog/reload")
+async def reload_catalog(x_reload_token: Optional[str] = Header(None)):
+    """
+    Rebuild the catalog from its data file and swap it in.
+    In-flight requests finish against the snapshot they started with.
+    Answers 404 unless CATALOG_RELOAD_TOKEN is configured.
+    """
+    if not CATALOG_RELOAD_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_reload_token or "").encode(), CATALOG_RELOAD_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid reload token")
+    try:
+        snapshot = await run_in_threadpool(catalog.reload)
+    except (OSError, ValueError, KeyError) as e:
+        raise HTTPException(status_code=500, detail=f"Catalog reload failed: {str(e)}")
+    publish_in_background(snapshot)
+    return {"version": snapshot.version, "foods": len(snapshot.foods), "recipes": len(snapshot.recipes)}
+
+
+# ---------- Offline sync ----------
+
+# Change log of every catalog version served (see sync.py).
+sync_log = SyncLog()
+
+
+def publish_sync_version(snapshot: CatalogSnapshot) -> None:
+    """Log `snapshot` and write its full-snapshot file ahead of the first download."""
+    sync_log.record(snapshot)
+    sync_log.snapshot_file()
+
+
+def _log_publish_failure(future: asyncio.Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Recording the catalog for /api/sync failed", exc_info=future.exception())
+
+
+def publish_in_background(snapshot: CatalogSnapshot) -> None:
+    # Diffing a new version touches the whole catalog, so it runs off the loop;
+    # until it lands, /api/sync keeps serving the previously recorded head
+    # (or 503 when nothing has been recorded yet).
+    future = asyncio.get_running_loop().run_in_executor(None, publish_sync_version, snapshot)
+    future.add_done_callback(_log_publish_failure)
+
+
+@app.on_event("startup")
+async def record_catalog_version():
+    publish_in_background(catalog.snapshot)
+
+
+def sync_not_ready() -> HTTPException:
+    return HTTPException(
+        status_code=503, detail="Catalog sync is starting up, try again shortly", headers={"Retry-After": "5"}
+    )
+
+
+@app.get("/api/sync")
+async def sync_catalog(request: Request, since: Optional[str] = Query(None)):
+    """
+    Catalog changes after cursor `since`: upserted records and deleted keys
+    per kind, plus the cursor to send next time. Without a usable cursor the
+    response has "reset": true and the client should fetch
+    /api/sync/snapshot instead. Bodies are gzip-compressed.
+    """
+    try:
+        rendered = await run_in_threadpool(sync_log.delta, since)
+    except SyncNotReady:
+        raise sync_not_ready()
+    return cached_response(request, rendered, max_age=0)
+
+
+@app.get("/api/sync/snapshot")
+async def download_catalog_snapshot(request: Request):
+    """
+    The whole catalog as one precompressed file, in the same format as a
+    delta, with the cursor to continue syncing from in X-Sync-Cursor.
+    """
+    try:
+        path, cursor = await run_in_threadpool(sync_log.snapshot_file)
+    except SyncNotReady:
+        raise sync_not_ready()
+    gzip_ok = accepts_encoding(request, "gzip")
+    headers = {
+        "ETag": f'"{cursor}"' if gzip_ok else f'"{cursor}-file"',
+        "X-Sync-Cursor": cursor,
+        "Cache-Control": "public, max-age=0",
+        "Vary": "Accept-Encoding",
     }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if gzip_ok:
+        headers["Content-Encoding"] = "gzip"
+        return FileResponse(path, media_type="application/json", headers=headers)
+    # Clients that can't decode gzip transparently get the file itself to unpack.
+    return FileResponse(path, media_type="application/gzip", filename=os.path.basename(path), headers=headers)
+
+
+ROOT_RESPONSE = RenderedResponse(
+    json.dumps({"message": "Food Energy API is running!", "version": "1.0.0"}, separators=(",", ":")).encode()
+)
 
 
 @app.get("/")
-async def root():
-    return {"message": "Food Energy API is running!", "version": "1.0.0"}
+async def root(request: Request):
+    return cached_response(request, ROOT_RESPONSE)
 
 
 if __name__ == "__main__":
+    # Single-process development server; see serve.py for multi-worker production serving.
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,570 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping, Sequence
+from functools import cached_property
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from catalog import CatalogSnapshot, _coerce_food, _coerce_recipe, _json_default
+from compatibility import CompatibilityEngine
+from health_notes import HealthNotesMatcher
+from http_cache import RenderCache
+from markets import MarketIndex
+from models import Food, Season
+from recommend import RecommendationModel
+from recipe_match import RecipeMatcher, balance_code, recipe_size
+from search import FoodSearchIndex
+
+# ---------- Compiled, memory-mapped catalog ----------
+
+# File layout:
+#   MAGIC | u64 header length | header JSON | sections...
+# The header records the catalog version, the offset/length of every
+# section (relative to the first section, 64-byte aligned) and the feature
+# matrix shape. Sections are raw bytes: concatenated compact JSON documents,
+# little-endian u64 offset arrays, u32 value arrays, float32/float64 arrays
+# and a float32 matrix. The search postings, market grid and health-notes
+# automaton are compiled into sections too (prefixed search_, market_ and
+# rule_); files written before those existed rebuild the indexes in-process.
+# Readers map the file read-only, so every worker serving the same file
+# shares its pages through the OS page cache.
+MAGIC = b"FECAT01\n"
+ALIGNMENT = 64
+
+_HEADER = struct.Struct("<8sQ")
+
+
+def _align(n: int) -> int:
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, default=_json_default, separators=(",", ":")).encode()
+
+
+def _blob(items: List[bytes]) -> Tuple[bytes, bytes]:
+    """Concatenate `items`; returns (data, u64 offsets with a trailing end)."""
+    offsets = array("Q", [0])
+    for item in items:
+        offsets.append(offsets[-1] + len(item))
+    return b"".join(items), offsets.tobytes()
+
+
+def _sorted_table(entries: Dict[str, int]) -> Tuple[bytes, bytes, bytes]:
+    """Keys sorted by UTF-8 bytes, their offsets, and a u32 value per key."""
+    encoded = sorted((key.encode(), value) for key, value in entries.items())
+    data, offsets = _blob([key for key, _ in encoded])
+    return data, offsets, array("I", [value for _, value in encoded]).tobytes()
+
+
+def _postings(table: Dict[str, List[int]], prefix: str) -> Dict[str, bytes]:
+    """A sorted key table (prefix) whose values index u64 ranges (prefix_ranges) of u32 ids (prefix_ids)."""
+    keys = sorted(table)
+    ids = array("I")
+    ranges = array("Q", [0])
+    for key in keys:
+        ids.extend(table[key])
+        ranges.append(len(ids))
+    data, offsets, values = _sorted_table({key: i for i, key in enumerate(keys)})
+    return {
+        prefix: data,
+        prefix + "_offsets": offsets,
+        prefix + "_values": values,
+        prefix + "_ranges": ranges.tobytes(),
+        prefix + "_ids": ids.tobytes(),
+    }
+
+
+def _search_sections(index: FoodSearchIndex) -> Dict[str, bytes]:
+    sections: Dict[str, bytes] = {}
+    sections["search_terms"], sections["search_term_offsets"] = _blob([term.encode() for term in index.terms])
+    sections["search_names"], sections["search_name_offsets"] = _blob([name.encode() for name in index.names])
+    sections["search_posting_offsets"] = array("Q", index.posting_offsets).tobytes()
+    sections["search_posting_docs"] = array("I", index.posting_docs).tobytes()
+    sections["search_posting_weights"] = array("f", index.posting_weights).tobytes()
+    sections["search_term_weights"] = array("f", index.term_weights).tobytes()
+    sections.update(_postings(index.trigram_table(), "search_trigrams"))
+    return sections
+
+
+def _market_sections(index: MarketIndex) -> Dict[str, bytes]:
+    sections = {
+        "market_latitudes": array("d", index.latitudes).tobytes(),
+        "market_longitudes": array("d", index.longitudes).tobytes(),
+        "market_cell_keys": array("Q", index.cell_keys).tobytes(),
+        "market_cell_offsets": array("Q", index.cell_offsets).tobytes(),
+        "market_cell_markets": array("I", index.cell_markets).tobytes(),
+    }
+    sections.update(_postings(index.ingredient_table(), "market_stock"))
+    return sections
+
+
+def compile_catalog(snapshot: CatalogSnapshot, path: str) -> str:
+    """
+    Write `snapshot` as a compiled catalog file at `path` (atomically, via a
+    temp file in the same directory). Returns the path.
+    """
+    foods = snapshot.foods
+    position = {key: i for i, key in enumerate(snapshot.food_keys)}
+    sections: Dict[str, bytes] = {}
+
+    sections["foods"], sections["food_offsets"] = _blob([_dumps(data) for data in foods.values()])
+    sections["keys"], sections["key_offsets"] = _blob([key.encode() for key in snapshot.food_keys])
+    for name, entries in (
+        ("key_index", position),
+        ("id_index", {food["id"]: position[key] for key, food in foods.items()}),
+        ("name_index", {name: position[key] for name, key in snapshot.food_key_by_name.items()}),
+    ):
+        sections[name], sections[name + "_offsets"], sections[name + "_values"] = _sorted_table(entries)
+
+    sections["recipes"], sections["recipe_offsets"] = _blob([_dumps(recipe) for recipe in snapshot.recipes])
+    # Recipes per ingredient: a sorted ingredient table whose values index into posting ranges.
+    ingredients = sorted(snapshot.recipes_by_ingredient)
+    recipe_position = {id(recipe): i for i, recipe in enumerate(snapshot.recipes)}
+    postings = array("I")
+    posting_offsets = array("Q", [0])
+    for ingredient in ingredients:
+        postings.extend(recipe_position[id(r)] for r in snapshot.recipes_by_ingredient[ingredient])
+        posting_offsets.append(len(postings))
+    (
+        sections["ingredient_index"],
+        sections["ingredient_index_offsets"],
+        sections["ingredient_index_values"],
+    ) = _sorted_table({ingredient: i for i, ingredient in enumerate(ingredients)})
+    sections["postings"] = postings.tobytes()
+    sections["posting_offsets"] = posting_offsets.tobytes()
+    # Per-recipe distinct ingredient counts and energetic balances, for pantry matching.
+    sections["recipe_sizes"] = array("I", [recipe_size(r) for r in snapshot.recipes]).tobytes()
+    sections["recipe_balances"] = bytes(balance_code(r["energeticBalance"]) for r in snapshot.recipes)
+
+    features = np.ascontiguousarray(snapshot.recommender.features, dtype="<f4")
+    sections["features"] = features.tobytes()
+
+    sections.update(_search_sections(snapshot.search_index))
+    sections.update(_market_sections(snapshot.market_index))
+    sections.update({f"rule_{name}": table.tobytes() for name, table in snapshot.health_notes.tables().items()})
+
+    # Markets and rules are records of their own, so their indexes open without decoding the meta section.
+    sections["market_documents"], sections["market_document_offsets"] = _blob([_dumps(m) for m in snapshot.markets])
+    sections["rule_documents"], sections["rule_document_offsets"] = _blob([_dumps(r) for r in snapshot.health_note_rules])
+    sections["meta"] = _dumps({
+        "combinations": snapshot.combinations,
+        "seasonalRecommendations": {s.value: names for s, names in snapshot.seasonal_recommendations.items()},
+        "healthConditions": snapshot.health_conditions,
+    })
+
+    layout = {}
+    offset = 0
+    for name, data in sections.items():
+        layout[name] = [offset, len(data)]
+        offset = _align(offset + len(data))
+    header = _dumps({
+        "version": snapshot.version,
+        "foods": len(foods),
+        "recipes": len(snapshot.recipes),
+        "featureShape": list(features.shape),
+        "sections": layout,
+    })
+    data_start = _align(_HEADER.size + len(header))
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".catalog-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, len(header)))
+            f.write(header)
+            for name, data in sections.items():
+                f.seek(data_start + layout[name][0])
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return path
+
+
+class CatalogFile:
+    """A compiled catalog file mapped read-only."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = _HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a compiled catalog file")
+        self.header = json.loads(self.mmap[_HEADER.size:_HEADER.size + header_length])
+        self.data_start = _align(_HEADER.size + header_length)
+        self.view = memoryview(self.mmap)
+
+    def section(self, name: str) -> memoryview:
+        offset, length = self.header["sections"][name]
+        start = self.data_start + offset
+        return self.view[start:start + length]
+
+    def records(self, name: str, offsets: str) -> "RecordTable":
+        return RecordTable(self.section(name), self.section(offsets))
+
+    def table(self, name: str) -> "SortedTable":
+        return SortedTable(self.section(name), self.section(name + "_offsets"), self.section(name + "_values"))
+
+
+class RecordTable(Sequence):
+    """Variable-length byte records addressed through a u64 offset array."""
+
+    def __init__(self, data: memoryview, offsets: memoryview):
+        self.data = data
+        self.offsets = offsets.cast("Q")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def raw(self, index: int) -> memoryview:
+        return self.data[self.offsets[index]:self.offsets[index + 1]]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return bytes(self.raw(index))
+
+
+class SortedTable:
+    """String -> u32 lookups by binary search over sorted UTF-8 keys."""
+
+    def __init__(self, data: memoryview, offsets: memoryview, values: memoryview):
+        self.keys = RecordTable(data, offsets)
+        self.values = values.cast("I")
+
+    def get(self, key: str) -> Optional[int]:
+        target = key.encode()
+        keys = self.keys
+        lo, hi = 0, len(keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if bytes(keys.raw(mid)) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(keys) and keys.raw(lo) == target:
+            return self.values[lo]
+        return None
+
+
+class IntTable:
+    """u64 -> u32 lookups by binary search over sorted keys."""
+
+    def __init__(self, keys: memoryview, values: memoryview):
+        self.keys = keys.cast("Q")
+        self.values = values.cast("I")
+
+    def get(self, key: int, default=None):
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            return self.values[index]
+        return default
+
+
+class _PostingLookup:
+    """`lookup(key)` -> the u32 ids a compiled posting table holds for `key` (empty when absent)."""
+
+    def __init__(self, file: "CatalogFile", prefix: str):
+        self.table = file.table(prefix)
+        self.ranges = file.section(prefix + "_ranges").cast("Q")
+        self.ids = file.section(prefix + "_ids").cast("I")
+
+    def __call__(self, key: str) -> Sequence[int]:
+        ordinal = self.table.get(key)
+        if ordinal is None:
+            return ()
+        return self.ids[self.ranges[ordinal]:self.ranges[ordinal + 1]]
+
+
+class _DecodedRecords(Sequence):
+    """JSON documents decoded on access."""
+
+    def __init__(self, records: RecordTable, coerce):
+        self.records = records
+        self.coerce = coerce
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.coerce(json.loads(self.records[index]))
+
+
+class _StringRecords(_DecodedRecords):
+    def __init__(self, records: RecordTable):
+        super().__init__(records, None)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return self.records[index].decode()
+
+
+class MappedFoods(Mapping):
+    """Food key -> food dict, decoded from the mapped file on access."""
+
+    def __init__(self, keys: Sequence, key_index: SortedTable, documents: _DecodedRecords):
+        self.keys_in_order = keys
+        self.key_index = key_index
+        self.documents = documents
+
+    def __getitem__(self, key: str) -> dict:
+        position = self.key_index.get(key) if isinstance(key, str) else None
+        if position is None:
+            raise KeyError(key)
+        return self.documents[position]
+
+    def __contains__(self, key) -> bool:
+        return isinstance(key, str) and self.key_index.get(key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys_in_order)
+
+    def __len__(self) -> int:
+        return len(self.keys_in_order)
+
+    def values(self):
+        return iter(self.documents)
+
+    def items(self):
+        return zip(self.keys_in_order, self.documents)
+
+
+class _KeyLookup:
+    """`.get(x)` -> food key, for tables that map to food positions."""
+
+    def __init__(self, table: SortedTable, keys: Sequence):
+        self.table = table
+        self.keys = keys
+
+    def get(self, value: str, default=None):
+        position = self.table.get(value)
+        return self.keys[position] if position is not None else default
+
+    def __contains__(self, value) -> bool:
+        return self.get(value) is not None
+
+    def __getitem__(self, value: str) -> str:
+        key = self.get(value)
+        if key is None:
+            raise KeyError(value)
+        return key
+
+
+class _PositionLookup:
+    """Normalized food key or name -> row, as RecommendationModel expects."""
+
+    def __init__(self, name_index: SortedTable):
+        self.name_index = name_index
+
+    def get(self, name: str, default=None):
+        position = self.name_index.get(name)
+        return default if position is None else position
+
+    def __getitem__(self, name: str) -> int:
+        position = self.name_index.get(name)
+        if position is None:
+            raise KeyError(name)
+        return position
+
+
+class MappedCatalogSnapshot(CatalogSnapshot):
+    """
+    A CatalogSnapshot served from a compiled catalog file.
+
+    Opening one only maps the file and reads its header: food and recipe
+    documents are decoded on access, lookups by key, id and name are binary
+    searches over the mapped tables, and the recommendation feature matrix,
+    recipe postings, search postings, market grid and health-notes automaton
+    are used in place the first time they are needed. The compatibility
+    engine is still built in-process on first use, as are the search, market
+    and rule indexes of a file compiled without their sections.
+    """
+
+    def __init__(self, path: str):
+        self.file = CatalogFile(path)
+        self.version = self.file.header["version"]
+
+        self.food_keys = _StringRecords(self.file.records("keys", "key_offsets"))
+        key_index = self.file.table("key_index")
+        self.foods = MappedFoods(
+            self.food_keys, key_index, _DecodedRecords(self.file.records("foods", "food_offsets"), _coerce_food)
+        )
+        self.recipes = _DecodedRecords(self.file.records("recipes", "recipe_offsets"), _coerce_recipe)
+        self.food_key_by_id = _KeyLookup(self.file.table("id_index"), self.food_keys)
+        self.food_key_by_name = _KeyLookup(self.file.table("name_index"), self.food_keys)
+        self.ingredient_index = self.file.table("ingredient_index")
+        self.postings = self.file.section("postings").cast("I")
+        self.posting_offsets = self.file.section("posting_offsets").cast("Q")
+        self.rendered = RenderCache()
+
+    @cached_property
+    def _meta(self) -> dict:
+        return json.loads(bytes(self.file.section("meta")))
+
+    @cached_property
+    def combinations(self) -> Dict[str, List[dict]]:
+        return self._meta["combinations"]
+
+    @cached_property
+    def seasonal_recommendations(self) -> Dict[Season, List[str]]:
+        return {Season(season): names for season, names in self._meta["seasonalRecommendations"].items()}
+
+    @cached_property
+    def markets(self) -> Sequence[dict]:
+        if "market_documents" not in self.file.header["sections"]:
+            return self._meta["markets"]
+        return _DecodedRecords(self.file.records("market_documents", "market_document_offsets"), dict)
+
+    @cached_property
+    def health_conditions(self) -> List[str]:
+        return self._meta["healthConditions"]
+
+    @cached_property
+    def health_note_rules(self) -> Sequence[dict]:
+        if "rule_documents" not in self.file.header["sections"]:
+            return self._meta.get("healthNoteRules", [])
+        return _DecodedRecords(self.file.records("rule_documents", "rule_document_offsets"), dict)
+
+    @cached_property
+    def search_index(self) -> FoodSearchIndex:
+        if "search_terms" not in self.file.header["sections"]:
+            # Files compiled before the search sections existed.
+            return FoodSearchIndex.from_foods(self.foods, self.version)
+        section = self.file.section
+        documents = _DecodedRecords(
+            self.file.records("foods", "food_offsets"), lambda d: Food(**_coerce_food(d)).model_dump(mode="json")
+        )
+        return FoodSearchIndex(
+            self.version,
+            documents,
+            _StringRecords(self.file.records("search_names", "search_name_offsets")),
+            _StringRecords(self.file.records("search_terms", "search_term_offsets")),
+            section("search_posting_offsets").cast("Q"),
+            section("search_posting_docs").cast("I"),
+            section("search_posting_weights").cast("f"),
+            section("search_term_weights").cast("f"),
+            _PostingLookup(self.file, "search_trigrams"),
+        )
+
+    @cached_property
+    def compatibility(self) -> CompatibilityEngine:
+        return CompatibilityEngine(self.combinations)
+
+    @cached_property
+    def health_notes(self) -> HealthNotesMatcher:
+        if "rule_goto_keys" not in self.file.header["sections"]:
+            return HealthNotesMatcher.from_rules(self.health_note_rules)
+        section = self.file.section
+        return HealthNotesMatcher(
+            self.health_note_rules,
+            IntTable(section("rule_goto_keys"), section("rule_goto_states")),
+            section("rule_fail").cast("I"),
+            section("rule_links").cast("I"),
+            section("rule_output_offsets").cast("I"),
+            section("rule_outputs").cast("I"),
+            section("rule_lengths").cast("I"),
+            section("rule_words").cast("I"),
+            section("rule_targets").cast("i"),
+            section("rule_flags").cast("B"),
+        )
+
+    @cached_property
+    def market_index(self) -> MarketIndex:
+        if "market_cell_keys" not in self.file.header["sections"]:
+            return MarketIndex.from_markets(self.markets)
+        section = self.file.section
+        return MarketIndex(
+            self.markets,
+            section("market_latitudes").cast("d"),
+            section("market_longitudes").cast("d"),
+            section("market_cell_keys").cast("Q"),
+            section("market_cell_offsets").cast("Q"),
+            section("market_cell_markets").cast("I"),
+            _PostingLookup(self.file, "market_stock"),
+        )
+
+    @cached_property
+    def recommender(self) -> RecommendationModel:
+        rows, cols = self.file.header["featureShape"]
+        features = np.frombuffer(self.file.section("features"), dtype="<f4").reshape(rows, cols)
+        return RecommendationModel.from_features(
+            self.food_keys, self.health_conditions, features, _PositionLookup(self.file.table("name_index"))
+        )
+
+    @cached_property
+    def recipe_matcher(self) -> RecipeMatcher:
+        postings = np.frombuffer(self.postings, dtype=np.uint32)
+
+        def postings_for(ingredient: str) -> Optional[np.ndarray]:
+            ordinal = self.ingredient_index.get(ingredient)
+            if ordinal is None:
+                return None
+            return postings[self.posting_offsets[ordinal]:self.posting_offsets[ordinal + 1]]
+
+        if "recipe_sizes" in self.file.header["sections"]:
+            sizes = np.frombuffer(self.file.section("recipe_sizes"), dtype=np.uint32)
+            balances = np.frombuffer(self.file.section("recipe_balances"), dtype=np.uint8)
+        else:
+            # Files compiled before these sections existed.
+            sizes = np.array([recipe_size(r) for r in self.recipes], dtype=np.uint32)
+            balances = np.array([balance_code(r["energeticBalance"]) for r in self.recipes], dtype=np.uint8)
+        return RecipeMatcher(self.recipes, postings_for, sizes, balances)
+
+    def recipes_for(self, food_key: str) -> List[dict]:
+        ordinal = self.ingredient_index.get(food_key)
+        if ordinal is None:
+            return []
+        start, end = self.posting_offsets[ordinal], self.posting_offsets[ordinal + 1]
+        return [self.recipes[i] for i in self.postings[start:end]]
+
+    def to_dict(self) -> dict:
+        return {
+            "foods": dict(self.foods.items()),
+            "recipes": list(self.recipes),
+            "combinations": self.combinations,
+            "seasonalRecommendations": {
+                season.value: names for season, names in self.seasonal_recommendations.items()
+            },
+            "markets": list(self.markets),
+            "healthConditions": self.health_conditions,
+            "healthNoteRules": list(self.health_note_rules),
+        }
+
+    def warm(self) -> None:
+        """Open every index now instead of on first use."""
+        for name in (
+            "search_index", "compatibility", "health_notes", "market_index", "recommender", "recipe_matcher",
+            "seasonal_recommendations",
+        ):
+            getattr(self, name)
+
+
+if __name__ == "__main__":
+    # Compile the configured catalog ($CATALOG_PATH or the bundled mock data):
+    #   python mapped_catalog.py catalog.bin
+    import sys
+
+    from catalog import load_snapshot
+
+    target = sys.argv[1] if len(sys.argv) > 1 else "catalog.bin"
+    compile_catalog(load_snapshot(), target)
+    print(f"Compiled catalog to {target}")
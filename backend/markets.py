@@ -0,0 +1,337 @@
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timezone
+from typing import Callable, Collection, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from names import normalize_name
+
+# ---------- Market spatial + inventory index ----------
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.05
+
+# Grid cell size in degrees (~7 miles of latitude).
+CELL_DEGREES = 0.1
+# Grid columns around the globe; column indexes wrap at the antimeridian.
+COLUMNS = round(360 / CELL_DEGREES)
+
+# Grid cells are stored under one integer key, row-major: rows and columns
+# are shifted by CELL_KEY_OFFSET so every cell on the globe has a positive key.
+CELL_KEY_OFFSET = 2048
+CELL_KEY_STRIDE = 4096
+
+# Below this many stocking markets, scoring them all beats walking the grid.
+DIRECT_SCAN_LIMIT = 2048
+
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+
+_DAY_RANGE_RE = re.compile(r"^([a-z]{3})(?:\s*-\s*([a-z]{3}))?$")
+_TIME_RE = re.compile(r"^(\d{1,2})(?::(\d{2}))?\s*(am|pm)$")
+
+
+def haversine_miles(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    # The shorter way around, so points either side of the antimeridian are close.
+    dlambda = math.radians((lon2 - lon1 + 180) % 360 - 180)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * math.asin(min(1.0, math.sqrt(a)))
+
+
+def _parse_time(text: str) -> Optional[int]:
+    match = _TIME_RE.match(text.strip().lower())
+    if not match:
+        return None
+    hour, minute, meridiem = int(match.group(1)), int(match.group(2) or 0), match.group(3)
+    if hour > 12 or minute > 59:
+        return None
+    hour = hour % 12 + (12 if meridiem == "pm" else 0)
+    return hour * 60 + minute
+
+
+def parse_hours(hours: str) -> Optional[List[Optional[Tuple[int, int]]]]:
+    """
+    Parse strings like "Mon-Fri: 7AM - 10PM, Sat-Sun: 9AM - 8PM" into one
+    (open, close) minute-of-day pair per weekday (None when closed). A close
+    time at or before the opening time runs past midnight ("6AM - 12AM").
+    Returns None when the format is not understood.
+    """
+    schedule: List[Optional[Tuple[int, int]]] = [None] * 7
+    for part in hours.split(","):
+        if ":" not in part:
+            return None
+        days_text, times_text = part.split(":", 1)
+        day_match = _DAY_RANGE_RE.match(days_text.strip().lower())
+        if not day_match or "-" not in times_text:
+            return None
+        start_day, end_day = day_match.group(1), day_match.group(2) or day_match.group(1)
+        if start_day not in DAYS or end_day not in DAYS:
+            return None
+        open_text, close_text = times_text.split("-", 1)
+        opens, closes = _parse_time(open_text), _parse_time(close_text)
+        if opens is None or closes is None:
+            return None
+        if closes <= opens:
+            closes += 24 * 60
+
+        day = DAYS.index(start_day)
+        while True:
+            schedule[day] = (opens, closes)
+            if day == DAYS.index(end_day):
+                break
+            day = (day + 1) % 7
+    return schedule
+
+
+def market_zone(market: dict) -> Optional[ZoneInfo]:
+    """
+    The market's time zone from its IANA "timezone" field (e.g.
+    "America/New_York"); None when missing or unknown. On Windows the zone
+    database comes from the tzdata package.
+    """
+    name = market.get("timezone")
+    if not name:
+        return None
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def is_open(
+    schedule: Optional[List[Optional[Tuple[int, int]]]], at: datetime, zone: Optional[ZoneInfo] = None
+) -> Optional[bool]:
+    """
+    Whether a parsed schedule is open at `at`, read as wall-clock time in
+    `zone`. None when hours are unknown, including an aware `at` with no
+    zone to convert it to.
+    """
+    if schedule is None:
+        return None
+    if at.tzinfo is not None:
+        if zone is None:
+            return None
+        at = at.astimezone(zone)
+    minute = at.hour * 60 + at.minute
+    today = schedule[at.weekday()]
+    if today is not None and today[0] <= minute < today[1]:
+        return True
+    # Still inside yesterday's after-midnight window?
+    yesterday = schedule[(at.weekday() - 1) % 7]
+    return yesterday is not None and minute + 24 * 60 < yesterday[1]
+
+
+def _wrap_column(col: int) -> int:
+    """The same column within [-COLUMNS / 2, COLUMNS / 2), so 180°E and 180°W are one."""
+    return (col + COLUMNS // 2) % COLUMNS - COLUMNS // 2
+
+
+def cell_key(row: int, col: int) -> int:
+    return (row + CELL_KEY_OFFSET) * CELL_KEY_STRIDE + col + CELL_KEY_OFFSET
+
+
+class MarketIndex:
+    """
+    Nearest-market lookups combining a lat/lon grid with an
+    ingredient -> markets inverted index.
+
+    A query first intersects the posting sets of the requested ingredients,
+    smallest first. When few markets stock everything, those candidates are
+    scored directly; otherwise the grid is searched in rings of cells around
+    the query point until no unvisited cell can beat the current k-th result.
+    Distances are great-circle (haversine) miles.
+
+    Coordinates and the grid are flat arrays, so a compiled catalog file
+    stores them as sections and a mapped snapshot uses them in place.
+    """
+
+    def __init__(
+        self,
+        markets: Sequence[dict],
+        latitudes: Sequence[float],
+        longitudes: Sequence[float],
+        cell_keys: Sequence[int],
+        cell_offsets: Sequence[int],
+        cell_markets: Sequence[int],
+        stocking: Callable[[str], Collection[int]],
+    ):
+        """
+        Markets with their coordinates, the occupied grid cells as sorted
+        `cell_key`s with ranges into `cell_markets`, and `stocking`, which
+        returns the markets carrying a normalized ingredient name.
+        """
+        self.markets = markets
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.cell_keys = cell_keys
+        self.cell_offsets = cell_offsets
+        self.cell_markets = cell_markets
+        self.stocking = stocking
+        # Opening hours are parsed the first time a market is considered.
+        self._hours: Dict[int, Tuple[Optional[List[Optional[Tuple[int, int]]]], Optional[ZoneInfo]]] = {}
+
+        rows = [key // CELL_KEY_STRIDE - CELL_KEY_OFFSET for key in (cell_keys[0], cell_keys[-1])] if cell_keys else [0]
+        cols = [key % CELL_KEY_STRIDE - CELL_KEY_OFFSET for key in cell_keys] or [0]
+        self.bounds = (min(rows), max(rows), min(cols), max(cols))
+
+    @classmethod
+    def from_markets(cls, markets: List[dict]) -> "MarketIndex":
+        by_ingredient: Dict[str, Set[int]] = {}
+        for position, market in enumerate(markets):
+            for ingredient in market.get("hasInStock", []):
+                by_ingredient.setdefault(normalize_name(ingredient), set()).add(position)
+
+        latitudes = array("d", [m["coordinates"]["latitude"] for m in markets])
+        longitudes = array("d", [m["coordinates"]["longitude"] for m in markets])
+        grid: Dict[int, List[int]] = {}
+        for position, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+            grid.setdefault(cell_key(*cls._cell(lat, lon)), []).append(position)
+        cell_keys = array("Q", sorted(grid))
+        cell_offsets = array("Q", [0])
+        cell_markets = array("I")
+        for key in cell_keys:
+            cell_markets.extend(grid[key])
+            cell_offsets.append(len(cell_markets))
+
+        return cls(
+            markets, latitudes, longitudes, cell_keys, cell_offsets, cell_markets,
+            lambda ingredient: by_ingredient.get(ingredient, ()),
+        )
+
+    def ingredient_table(self) -> Dict[str, List[int]]:
+        """Every stocked ingredient's markets, for compiling the index into a catalog file."""
+        table: Dict[str, List[int]] = {}
+        for position, market in enumerate(self.markets):
+            for ingredient in market.get("hasInStock", []):
+                positions = table.setdefault(normalize_name(ingredient), [])
+                if not positions or positions[-1] != position:
+                    positions.append(position)
+        return table
+
+    @staticmethod
+    def _cell(lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / CELL_DEGREES), _wrap_column(math.floor(lon / CELL_DEGREES))
+
+    def _cell_markets(self, key: int) -> Sequence[int]:
+        index = bisect_left(self.cell_keys, key)
+        if index == len(self.cell_keys) or self.cell_keys[index] != key:
+            return ()
+        return self.cell_markets[self.cell_offsets[index]:self.cell_offsets[index + 1]]
+
+    def _open(self, position: int, at: datetime) -> Optional[bool]:
+        hours = self._hours.get(position)
+        if hours is None:
+            market = self.markets[position]
+            hours = self._hours[position] = (parse_hours(market.get("hours", "")), market_zone(market))
+        return is_open(hours[0], at, hours[1])
+
+    def _stocking(self, ingredients: Iterable[str]) -> Optional[Set[int]]:
+        """Markets stocking every ingredient; None means no ingredient filter."""
+        postings = [self.stocking(normalize_name(i)) for i in dict.fromkeys(ingredients)]
+        if not postings:
+            return None
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result.intersection_update(posting)
+            if not result:
+                break
+        return result
+
+    def nearest(
+        self,
+        lat: float,
+        lon: float,
+        ingredients: Iterable[str] = (),
+        k: int = 5,
+        max_miles: Optional[float] = None,
+        at: Optional[datetime] = None,
+    ) -> List[Tuple[float, dict, Optional[bool]]]:
+        """
+        Up to `k` markets as (distance in miles, market, open now) sorted by
+        distance. With `at`, markets known to be closed then are skipped;
+        markets whose hours or time zone are unknown are kept with open =
+        None. Hours are local to each market, so `at` should be aware (it
+        defaults to the current UTC time).
+        """
+        candidates = self._stocking(ingredients)
+        if candidates is not None and not candidates:
+            return []
+
+        heap: List[Tuple[float, int]] = []  # max-heap of (-distance, position)
+
+        def consider(position: int) -> None:
+            open_now = self._open(position, at) if at is not None else None
+            if open_now is False:
+                return
+            distance = haversine_miles(lat, lon, self.latitudes[position], self.longitudes[position])
+            if max_miles is not None and distance > max_miles:
+                return
+            if len(heap) < k:
+                heapq.heappush(heap, (-distance, position))
+            elif distance < -heap[0][0]:
+                heapq.heapreplace(heap, (-distance, position))
+
+        pool = candidates if candidates is not None else range(len(self.markets))
+        if len(pool) <= DIRECT_SCAN_LIMIT or not self._ring_search(lat, lon, candidates, consider, heap, k, max_miles):
+            heap.clear()
+            for position in pool:
+                consider(position)
+
+        now = at or datetime.now(timezone.utc)
+        results = []
+        for neg_distance, position in sorted(heap, reverse=True):
+            open_now = self._open(position, now)
+            results.append((-neg_distance, self.markets[position], open_now))
+        return results
+
+    def _ring_search(self, lat, lon, candidates, consider, heap, k, max_miles) -> bool:
+        """
+        Visit grid cells ring by ring. Gives up (returns False) once it has
+        probed more cells than there are candidate markets, i.e. when the
+        matches are sparse enough that scoring them directly is cheaper.
+        Columns wrap at the antimeridian.
+        """
+        center_row, center_col = self._cell(lat, lon)
+        budget = len(candidates) if candidates is not None else len(self.markets)
+        probed = 0
+        min_row, max_row, min_col, max_col = self.bounds
+        # Once the ring encloses every occupied cell there is nothing left to visit. Columns
+        # wrap, so no occupied column is more than half the globe away.
+        col_reach = min(max(center_col - min_col, max_col - center_col), COLUMNS // 2)
+        max_rings = max(center_row - min_row, max_row - center_row, col_reach, 0)
+        # Rings wider than half the globe meet themselves, and earlier rings, across the antimeridian.
+        visited: Set[int] = set()
+        for ring in range(max_rings + 1):
+            if ring > 0:
+                # Longitude cells shrink towards the poles; use the narrowest width in range.
+                edge_lat = min(89.9, abs(lat) + ring * CELL_DEGREES)
+                cell_miles = CELL_DEGREES * MILES_PER_DEGREE_LAT * math.cos(math.radians(edge_lat))
+                # Anything in this ring or beyond is at least this far away.
+                lower_bound = (ring - 1) * cell_miles
+                if len(heap) >= k and lower_bound > -heap[0][0]:
+                    return True
+                if max_miles is not None and lower_bound > max_miles:
+                    return True
+                if cell_miles <= 0:
+                    return True
+
+            for row in range(center_row - ring, center_row + ring + 1):
+                on_edge_row = row in (center_row - ring, center_row + ring)
+                step = 1 if on_edge_row else 2 * ring
+                for col in range(center_col - ring, center_col + ring + 1, max(step, 1)):
+                    key = cell_key(row, _wrap_column(col))
+                    if key in visited:
+                        continue
+                    visited.add(key)
+                    probed += 1
+                    for position in self._cell_markets(key):
+                        if candidates is None or position in candidates:
+                            consider(position)
+                if probed > budget:
+                    return False
+        return True
@@ -0,0 +1,270 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from starlette.routing import Match
+
+# ---------- Request metrics + Server-Timing ----------
+
+# Latency buckets in seconds, from sub-millisecond cache hits to slow uploads.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_ROUTE = "unmatched"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, labels: LabelValues = (), amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_labels(self.label_names, labels)} {_format(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, labels: LabelValues, value: float) -> None:
+        self.values[labels] = value
+
+    def dec(self, labels: LabelValues = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Observations only bump one bucket count; the
+    cumulative counts Prometheus expects are computed at render time.
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count], sum
+        self.values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, labels: LabelValues, value: float) -> None:
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = _labels(self.label_names, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            cumulative += counts[-1]
+            bucket_labels = _labels(self.label_names, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {repr(total[0])}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The API's request metrics, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter("http_requests_total", "Requests by route and status.", ("method", "route", "status"))
+        self.errors = Counter(
+            "http_request_errors_total", "Requests that failed with a 5xx or an exception.", ("method", "route")
+        )
+        self.latency = Histogram("http_request_duration_seconds", "Request latency.", ("method", "route"))
+        self.in_flight = Gauge("http_requests_in_flight", "Requests currently being handled.")
+        self.request_bytes = Counter("http_request_bytes_total", "Request body bytes received.", ("method", "route"))
+        self.response_bytes = Counter("http_response_bytes_total", "Response body bytes sent.", ("method", "route"))
+        self.stages = Histogram("http_stage_duration_seconds", "Time spent in named handler stages.", ("route", "stage"))
+        self.metrics = [
+            self.requests, self.errors, self.latency, self.in_flight,
+            self.request_bytes, self.response_bytes, self.stages,
+        ]
+
+    def register(self, metric):
+        """Add a metric defined elsewhere (e.g. by another middleware) to the output."""
+        with self.lock:
+            self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self.lock:
+            lines = [line for metric in self.metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# ---------- Stage timers ----------
+
+class RequestTimings:
+    """Named stage durations (seconds) for the current request, in order."""
+
+    __slots__ = ("stages",)
+
+    def __init__(self):
+        self.stages: List[Tuple[str, float]] = []
+
+    def server_timing(self, total: float) -> bytes:
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts).encode("latin-1")
+
+
+_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+class StageTimer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "StageTimer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        timings = _timings.get()
+        if timings is not None:
+            timings.stages.append((self.name, time.perf_counter() - self.start))
+
+
+def stage(name: str) -> StageTimer:
+    """
+    Time a block of a handler as a named stage:
+
+        with stage("lookup"):
+            ...
+
+    Stages show up in the response's Server-Timing header and in the
+    http_stage_duration_seconds histogram. Outside a request they are no-ops.
+    """
+    return StageTimer(name)
+
+
+# ---------- Middleware ----------
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, status, body sizes and stage
+    timings per route template (e.g. /api/foods/{food_id}), so label
+    cardinality stays bounded. Adds a Server-Timing header to every response.
+    Add it last so it is outermost and also sees requests rejected by other
+    middleware.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry = registry):
+        self.app = app
+        self.registry = registry
+        self.routes: Optional[Dict[object, str]] = None
+        self.router_app = None
+
+    def _route_label(self, scope) -> str:
+        app = scope.get("app")
+        if self.routes is None and app is not None:
+            self.router_app = app
+            self.routes = {getattr(r, "endpoint", None): r.path for r in app.routes if hasattr(r, "path")}
+        endpoint = scope.get("endpoint")
+        if endpoint is not None and self.routes and endpoint in self.routes:
+            return self.routes[endpoint]
+        # Rejected before routing (e.g. by the upload limit): match the path ourselves.
+        if self.router_app is not None:
+            for route in self.router_app.routes:
+                match, _ = route.matches(scope)
+                if match == Match.FULL and hasattr(route, "path"):
+                    return route.path
+        return UNMATCHED_ROUTE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        timings = RequestTimings()
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+        request_bytes = 0
+        response_bytes = 0
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def timing_send(message):
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", ()))
+                headers.append((b"server-timing", timings.server_timing(time.perf_counter() - start)))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        with registry.lock:
+            registry.in_flight.inc()
+        failed = False
+        try:
+            await self.app(scope, counting_receive, timing_send)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            _timings.reset(token)
+            method = scope["method"]
+            route = self._route_label(scope)
+            labels = (method, route)
+            with registry.lock:
+                registry.in_flight.dec()
+                registry.requests.inc((method, route, str(status)))
+                registry.latency.observe(labels, elapsed)
+                registry.request_bytes.inc(labels, request_bytes)
+                registry.response_bytes.inc(labels, response_bytes)
+                if failed or status >= 500:
+                    registry.errors.inc(labels)
+                for name, seconds in timings.stages:
+                    registry.stages.observe((route, name), seconds)
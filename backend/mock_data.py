@@ -188,6 +188,84 @@ SEASONAL_RECOMMENDATIONS = {
     Season.WINTER: ["ginger", "lamb", "walnut", "black sesame"]
 }
 
+HEALTH_CONDITIONS = [
+    "Cold constitution",
+    "Heat constitution",
+    "Digestive issues",
+    "Poor circulation",
+    "Insomnia",
+    "Fatigue",
+    "Allergies",
+    "High blood pressure",
+]
+
+# Keywords in free-text health notes -> condition and advice. A trailing "*"
+# matches any word starting with the term; matches preceded by a negation
+# ("no", "not", "never"...) in the same clause are ignored. Higher weights rank first.
+HEALTH_NOTE_RULES = [
+    {
+        "id": "cold",
+        "condition": "Cold constitution",
+        "terms": ["cold", "chills", "chilly", "cold hands", "cold feet", "always cold", "frio", "frío", "怕冷", "手脚冰凉"],
+        "recommendation": "Add warming foods like ginger or cinnamon",
+        "avoidFoods": ["watermelon", "bamboo_shoots", "mint", "cucumber"],
+        "weight": 2.0,
+    },
+    {
+        "id": "heat",
+        "condition": "Heat constitution",
+        "terms": ["hot flash*", "overheat*", "night sweats", "feel hot", "feeling hot", "thirsty", "dry mouth", "上火"],
+        "recommendation": "Favor cooling foods like cucumber, mung bean or pear",
+        "avoidFoods": ["ginger", "cinnamon", "lamb"],
+        "weight": 2.0,
+    },
+    {
+        "id": "digestion",
+        "condition": "Digestive issues",
+        "terms": ["digest*", "indigestion", "bloat*", "stomach ache", "stomachache", "gassy", "nausea", "diarrhea", "loose stools", "constipat*", "heartburn", "reflux", "digestión", "消化不良", "胃痛", "胃胀", "胃不舒服"],
+        "recommendation": "Consider adding digestive aids like ginger or fennel",
+        "avoidFoods": ["cucumber", "spinach", "strawberry", "pear"],
+        "weight": 2.0,
+    },
+    {
+        "id": "circulation",
+        "condition": "Poor circulation",
+        "terms": ["circulation", "numb*", "tingling", "pins and needles", "cold fingers", "血液循环"],
+        "recommendation": "Warming spices like ginger and cinnamon support circulation",
+        "weight": 1.5,
+    },
+    {
+        "id": "insomnia",
+        "condition": "Insomnia",
+        "terms": ["insomnia", "sleepless*", "can t sleep", "cannot sleep", "trouble sleeping", "poor sleep", "wake up at night", "insomnio", "失眠"],
+        "recommendation": "Try calming foods like walnut, honey or black sesame in the evening",
+        "avoidFoods": ["green_tea"],
+        "weight": 1.5,
+    },
+    {
+        "id": "fatigue",
+        "condition": "Fatigue",
+        "terms": ["fatigue*", "tired*", "exhaust*", "low energy", "no energy", "weak*", "cansado", "cansancio", "疲劳", "累"],
+        "recommendation": "Build energy with warming, nourishing foods like sweet potato, rice and lamb",
+        "weight": 1.0,
+    },
+    {
+        "id": "allergies",
+        "condition": "Allergies",
+        "terms": ["allerg*", "hay fever", "hives", "sneez*", "itchy eyes", "alergia*", "过敏"],
+        "recommendation": "Keep meals simple and check each ingredient against your known allergens",
+        "weight": 2.5,
+    },
+    {
+        "id": "blood_pressure",
+        "condition": "High blood pressure",
+        "terms": ["blood pressure", "hypertension", "hypertensive", "presión alta", "hipertensión", "高血压"],
+        "recommendation": "Go easy on rich meats and salt; favor vegetables like spinach",
+        "avoidFoods": ["lamb"],
+        "weight": 2.5,
+    },
+]
+
 FOOD_COMBINATIONS = {
     "good": [
         {"food1": "ginger", "food2": "honey", "reason": "Enhances warming effect"},
@@ -218,4 +296,91 @@ MOCK_RECIPES = [
         "prepTime": 10,
         "energeticBalance": EnergeticType.COLD
     }
-]
\ No newline at end of file
+]
+
+MOCK_MARKETS = [
+    {
+        "id": "asia_food_market",
+        "name": "Asia Food Market",
+        "type": "asian_market",
+        "address": "2752 Brewerton Rd, Syracuse, NY 13211",
+        "rating": 4.7,
+        "coordinates": {"latitude": 43.0962, "longitude": -76.12},
+        "hours": "Mon-Sun: 10AM - 8PM",
+        "timezone": "America/New_York",
+        "phone": "(315) 555-0123",
+        "hasInStock": ["chinese_yam", "ginger", "bok_choy", "shiitake", "rice_noodles", "tofu"],
+        "priceRange": "$$",
+        "specialties": ["Asian vegetables", "Fresh herbs", "Rice varieties"]
+    },
+    {
+        "id": "wegmans_dewitt",
+        "name": "Wegmans DeWitt",
+        "type": "grocery_store",
+        "address": "3325 W Genesee St, Syracuse, NY 13219",
+        "rating": 4.8,
+        "coordinates": {"latitude": 43.0481, "longitude": -76.2058},
+        "hours": "Mon-Sun: 6AM - 12AM",
+        "timezone": "America/New_York",
+        "phone": "(315) 555-0456",
+        "hasInStock": ["ginger", "watermelon", "cucumber", "apple", "rice", "organic_vegetables"],
+        "priceRange": "$$",
+        "specialties": ["Organic produce", "International foods", "Fresh bakery"]
+    },
+    {
+        "id": "regional_market",
+        "name": "Syracuse Regional Market",
+        "type": "farmers_market",
+        "address": "2100 Park St, Syracuse, NY 13208",
+        "rating": 4.6,
+        "coordinates": {"latitude": 43.0723, "longitude": -76.1644},
+        "hours": "Sat-Sun: 7AM - 2PM",
+        "timezone": "America/New_York",
+        "phone": "(315) 555-0789",
+        "hasInStock": ["watermelon", "cucumber", "apple", "tomato", "seasonal_vegetables"],
+        "priceRange": "$",
+        "specialties": ["Local produce", "Seasonal fruits", "Farm-fresh items"]
+    },
+    {
+        "id": "price_rite",
+        "name": "Price Rite Marketplace",
+        "type": "grocery_store",
+        "address": "3955 Route 31, Liverpool, NY 13090",
+        "rating": 4.2,
+        "coordinates": {"latitude": 43.1156, "longitude": -76.2167},
+        "hours": "Mon-Sun: 8AM - 9PM",
+        "timezone": "America/New_York",
+        "phone": "(315) 555-1234",
+        "hasInStock": ["rice", "ginger", "apple", "cucumber", "basic_vegetables"],
+        "priceRange": "$",
+        "specialties": ["Budget-friendly", "Bulk items", "International aisle"]
+    },
+    {
+        "id": "aldi_salina",
+        "name": "ALDI",
+        "type": "grocery_store",
+        "address": "103 W Seneca Turnpike, Syracuse, NY 13205",
+        "rating": 4.5,
+        "coordinates": {"latitude": 43.0265, "longitude": -76.1472},
+        "hours": "Mon-Sun: 9AM - 8PM",
+        "timezone": "America/New_York",
+        "phone": "(315) 555-5678",
+        "hasInStock": ["rice", "ginger", "apple", "seasonal_produce"],
+        "priceRange": "$",
+        "specialties": ["Organic options", "Weekly deals", "Fresh produce"]
+    },
+    {
+        "id": "su_corner_market",
+        "name": "SU Corner Market",
+        "type": "specialty_store",
+        "address": "700 S Crouse Ave, Syracuse, NY 13210",
+        "rating": 4.3,
+        "coordinates": {"latitude": 43.0395, "longitude": -76.1347},
+        "hours": "Mon-Fri: 7AM - 10PM, Sat-Sun: 9AM - 8PM",
+        "timezone": "America/New_York",
+        "phone": "(315) 555-9012",
+        "hasInStock": ["ginger", "apple", "cucumber", "snacks"],
+        "priceRange": "$$",
+        "specialties": ["Campus convenience", "Quick essentials", "Grab & go"]
+    },
+]
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from enum import Enum
 
@@ -52,6 +52,10 @@ class CombinationAnalysisResponse(BaseModel):
     goodCombinations: List[dict]
     badCombinations: List[dict]
     recommendations: List[str]
+    bestCombination: Optional[dict] = None
+    worstCombination: Optional[dict] = None
+    compatibilityScore: float = 0.0
+    matchedConditions: List[str] = []  # conditions recognized in healthNotes, strongest first
 
 class Recipe(BaseModel):
     id: str
@@ -59,4 +63,88 @@ class Recipe(BaseModel):
     ingredients: List[str]
     instructions: str
     prepTime: int
-    energeticBalance: EnergeticType
\ No newline at end of file
+    energeticBalance: EnergeticType
+
+class RecipeMatchRequest(BaseModel):
+    ingredients: List[str] = Field(..., max_length=200)  # food keys or names in the pantry
+    season: Optional[Season] = None  # favor recipes whose energetic balance suits it
+    k: int = Field(10, ge=1, le=100)
+    maxMissing: Optional[int] = Field(None, ge=0)
+
+class RecipeMatch(BaseModel):
+    recipe: Recipe
+    matchedIngredients: List[str]
+    missingIngredients: List[str]
+    coverage: float  # share of the recipe's ingredients already in the pantry
+
+class RecipeMatchResponse(BaseModel):
+    recipes: List[RecipeMatch]
+
+class Coordinates(BaseModel):
+    latitude: float
+    longitude: float
+
+class Market(BaseModel):
+    id: str
+    name: str
+    type: str
+    address: str
+    rating: float
+    coordinates: Coordinates
+    hours: str
+    timezone: Optional[str] = None  # IANA zone the hours are in, e.g. "America/New_York"
+    phone: Optional[str] = None
+    hasInStock: List[str] = []
+    priceRange: Optional[str] = None
+    specialties: List[str] = []
+
+class NearbyMarket(Market):
+    distance: float  # miles from the query point
+    openNow: Optional[bool] = None
+
+class NearbyMarketsResponse(BaseModel):
+    markets: List[NearbyMarket]
+
+class RecommendationRequest(BaseModel):
+    season: Season
+    constitution: Optional[str] = None  # e.g. "cold" or "Cold constitution"
+    conditions: List[str] = []  # names from /api/health-conditions
+    recentFoods: List[str] = []  # food keys or names eaten recently
+    k: int = Field(10, ge=1, le=100)
+
+class ScoredFood(BaseModel):
+    food: Food
+    score: float
+
+class RecommendationResponse(BaseModel):
+    season: Season
+    foods: List[ScoredFood]
+
+class BatchRecommendationRequest(BaseModel):
+    users: List[RecommendationRequest] = Field(..., max_length=1000)
+
+class BatchRecommendationResponse(BaseModel):
+    results: List[RecommendationResponse]
+
+class JobState(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+class JobAccepted(BaseModel):
+    jobId: str
+    status: JobState
+    statusUrl: str
+    eventsUrl: str
+
+class AnalysisJob(BaseModel):
+    id: str
+    status: JobState
+    stage: Optional[str] = None
+    progress: float = 0.0
+    result: Optional[CombinationAnalysisResponse] = None
+    error: Optional[str] = None
+    createdAt: float
+    updatedAt: float
+    expiresAt: Optional[float] = None
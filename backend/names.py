@@ -0,0 +1,10 @@
+# ---------- Ingredient name normalization ----------
+
+
+def normalize_name(name: str) -> str:
+    """
+    Fold a food key or display name into the form used by the indexes:
+    lowercase, with spaces and dashes treated like underscores.
+    "Bamboo Shoots", "bamboo shoots" and "bamboo_shoots" all normalize alike.
+    """
+    return "_".join(name.lower().replace("-", " ").replace("_", " ").split())
@@ -0,0 +1,132 @@
+from array import array
+from itertools import combinations
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+
+# ---------- Perceptual hashing ----------
+
+HASH_BITS = 64
+
+# Hashes within this Hamming distance are treated as the same photo.
+DEFAULT_MAX_DISTANCE = 3
+
+DEFAULT_MAX_ENTRIES = 2_000_000
+
+# Flat or near-flat images hash to (almost) all zeros or ones and would all
+# "match" each other, so hashes with too few or too many set bits are ignored.
+MIN_INFORMATIVE_BITS = 4
+
+
+def dhash(img: Image.Image, hash_size: int = 8) -> int:
+    """
+    Difference hash: shrink to (hash_size + 1) x hash_size grayscale and set
+    one bit per horizontally adjacent pixel pair that gets brighter. Survives
+    resizing, recompression and metadata changes.
+    """
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def is_informative(value: int) -> bool:
+    return MIN_INFORMATIVE_BITS <= value.bit_count() <= HASH_BITS - MIN_INFORMATIVE_BITS
+
+
+class PerceptualHashIndex:
+    """
+    Multi-index hashing over 64-bit perceptual hashes.
+
+    Each hash is split into `chunks` 16-bit pieces, each with its own table.
+    Two hashes within `max_distance` bits must agree on some chunk to within
+    max_distance // chunks bits (pigeonhole), so a lookup probes only those
+    buckets and checks the few candidates it finds, instead of the whole set.
+    Hashes and bucket postings live in typed arrays (about 30 bytes per
+    entry), so millions of hashes stay cheap to hold.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE, chunks: int = 4, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_distance = max_distance
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self.chunk_mask = (1 << self.chunk_bits) - 1
+        self.max_entries = max_entries
+
+        self.hashes = array("Q")
+        self.values: List[str] = []
+        self.tables: List[Dict[int, array]] = [{} for _ in range(chunks)]
+        self.lookups = 0
+        self.hits = 0
+
+        # Every chunk value within the per-chunk radius, as XOR masks.
+        radius = max_distance // chunks
+        self._probe_masks = [0]
+        for r in range(1, radius + 1):
+            for bits in combinations(range(self.chunk_bits), r):
+                mask = 0
+                for bit in bits:
+                    mask |= 1 << bit
+                self._probe_masks.append(mask)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def _chunk_values(self, value: int):
+        for i in range(self.chunks):
+            yield i, (value >> (i * self.chunk_bits)) & self.chunk_mask
+
+    def add(self, value: int, payload: str) -> bool:
+        """Store `payload` for `value`; returns False when the index is full."""
+        for position in self.tables[0].get(value & self.chunk_mask, ()):
+            if self.hashes[position] == value:
+                self.values[position] = payload
+                return True
+        if len(self.hashes) >= self.max_entries:
+            return False
+
+        position = len(self.hashes)
+        self.hashes.append(value)
+        self.values.append(payload)
+        for i, chunk in self._chunk_values(value):
+            bucket = self.tables[i].get(chunk)
+            if bucket is None:
+                bucket = self.tables[i][chunk] = array("I")
+            bucket.append(position)
+        return True
+
+    def nearest(self, value: int) -> Optional[Tuple[str, int]]:
+        """Closest stored payload within max_distance as (payload, distance), or None."""
+        self.lookups += 1
+        best = self._nearest(value)
+        if best is not None:
+            self.hits += 1
+        return best
+
+    def _nearest(self, value: int) -> Optional[Tuple[str, int]]:
+        best: Optional[Tuple[str, int]] = None
+        seen = set()
+        for i, chunk in self._chunk_values(value):
+            table = self.tables[i]
+            for mask in self._probe_masks:
+                for candidate in table.get(chunk ^ mask, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    distance = hamming(value, self.hashes[candidate])
+                    if distance <= self.max_distance and (best is None or distance < best[1]):
+                        best = (self.values[candidate], distance)
+                        if distance == 0:
+                            return best
+        return best
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self.hashes), "lookups": self.lookups, "hits": self.hits}
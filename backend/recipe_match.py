@@ -0,0 +1,123 @@
+import heapq
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from models import EnergeticType, Season
+from recommend import SEASON_ENERGETICS
+
+# ---------- Pantry recipe matching ----------
+
+ENERGETIC_TYPES = list(EnergeticType)
+
+
+def balance_code(balance) -> int:
+    """Small integer for a recipe's energetic balance, as stored in the per-recipe arrays."""
+    return ENERGETIC_TYPES.index(EnergeticType(balance))
+
+
+def recipe_size(recipe: dict) -> int:
+    return len(dict.fromkeys(recipe["ingredients"]))
+
+
+class PantryMatch:
+    __slots__ = ("recipe", "matched", "missing", "coverage")
+
+    def __init__(self, recipe: dict, matched: List[str], missing: List[str], coverage: float):
+        self.recipe = recipe
+        self.matched = matched
+        self.missing = missing
+        self.coverage = coverage
+
+
+class RecipeMatcher:
+    """
+    Top-k recipes for a pantry, ranked by ingredient coverage, then fewest
+    missing ingredients, then how well the recipe's energetic balance suits
+    the season.
+
+    Only recipes sharing at least one ingredient with the pantry are looked
+    at: the pantry's posting lists (ingredient -> sorted recipe positions)
+    are merged and counted, which gives each candidate's matched-ingredient
+    count. Per-recipe sizes and balances live in flat arrays, so scoring is
+    vectorized over the candidates; a partition on coverage discards every
+    candidate that can't reach the top k before a heap settles the order.
+    Cost follows the pantry's posting lists, not the number of recipes.
+    """
+
+    def __init__(
+        self,
+        recipes: Sequence[dict],
+        postings: Callable[[str], Optional[np.ndarray]],
+        sizes: np.ndarray,
+        balances: np.ndarray,
+    ):
+        self.recipes = recipes
+        self.postings = postings
+        self.sizes = sizes
+        self.balances = balances
+
+    @classmethod
+    def from_recipes(cls, recipes: Sequence[dict], recipes_by_ingredient: Dict[str, List[dict]]) -> "RecipeMatcher":
+        position = {id(recipe): i for i, recipe in enumerate(recipes)}
+        lists = {
+            ingredient: np.fromiter((position[id(r)] for r in matches), dtype=np.uint32, count=len(matches))
+            for ingredient, matches in recipes_by_ingredient.items()
+        }
+        sizes = np.fromiter((recipe_size(r) for r in recipes), dtype=np.uint32, count=len(recipes))
+        balances = np.fromiter(
+            (balance_code(r["energeticBalance"]) for r in recipes), dtype=np.uint8, count=len(recipes)
+        )
+        return cls(recipes, lists.get, sizes, balances)
+
+    def match(
+        self,
+        pantry: Iterable[str],
+        k: int = 10,
+        season: Optional[Season] = None,
+        max_missing: Optional[int] = None,
+    ) -> List[PantryMatch]:
+        """`pantry` holds ingredient keys as they appear in recipes."""
+        pantry = list(dict.fromkeys(pantry))
+        lists = [p for p in map(self.postings, pantry) if p is not None and len(p)]
+        if not lists or k <= 0:
+            return []
+
+        # A recipe appears once per pantry ingredient it uses, so counting positions gives matches per recipe.
+        candidates, matched = np.unique(np.concatenate(lists), return_counts=True)
+        sizes = self.sizes[candidates]
+        missing = sizes - matched
+        if max_missing is not None:
+            keep = missing <= max_missing
+            candidates, matched, sizes, missing = candidates[keep], matched[keep], sizes[keep], missing[keep]
+        if not len(candidates):
+            return []
+        coverage = matched / sizes
+
+        fit_by_code = np.zeros(len(ENERGETIC_TYPES))
+        if season is not None:
+            for balance, weight in SEASON_ENERGETICS[season].items():
+                fit_by_code[ENERGETIC_TYPES.index(balance)] = weight
+        fit = fit_by_code[self.balances[candidates]]
+
+        if len(candidates) > k:
+            # Nothing less covered than the k-th best can make the cut; ties at the threshold go to the heap.
+            threshold = np.partition(coverage, len(coverage) - k)[len(coverage) - k]
+            keep = coverage >= threshold
+            candidates, missing, coverage, fit = candidates[keep], missing[keep], coverage[keep], fit[keep]
+
+        best = heapq.nsmallest(
+            k, zip((-coverage).tolist(), missing.tolist(), (-fit).tolist(), candidates.tolist())
+        )
+        in_pantry = set(pantry)
+        results = []
+        for negative_coverage, _, _, position in best:
+            recipe = self.recipes[position]
+            ingredients = list(dict.fromkeys(recipe["ingredients"]))
+            results.append(PantryMatch(
+                recipe,
+                matched=[i for i in ingredients if i in in_pantry],
+                missing=[i for i in ingredients if i not in in_pantry],
+                coverage=-negative_coverage,
+            ))
+        return results
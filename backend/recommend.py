@@ -0,0 +1,205 @@
+from typing import List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from models import EnergeticType, Season
+from names import normalize_name
+
+# ---------- Vectorized seasonal recommendations ----------
+
+ENERGETIC_TYPES = [EnergeticType.WARM, EnergeticType.COLD, EnergeticType.NEUTRAL]
+SEASONS = [Season.SPRING, Season.SUMMER, Season.FALL, Season.WINTER]
+
+# How each condition from /api/health-conditions reads a food: energetic types
+# it should avoid or favour, and words in the food's warnings / benefits that
+# mark it as contraindicated / helpful.
+CONDITION_PROFILES = {
+    "cold constitution": {
+        "avoid_types": [EnergeticType.COLD],
+        "favour_types": [EnergeticType.WARM],
+        "avoid_words": ["cold constitution", "cold weather"],
+        "help_words": ["warms", "warming"],
+    },
+    "heat constitution": {
+        "avoid_types": [EnergeticType.WARM],
+        "favour_types": [EnergeticType.COLD],
+        "avoid_words": ["heat"],
+        "help_words": ["clears heat", "cools"],
+    },
+    "digestive issues": {
+        "avoid_words": ["digestion", "diarrhea", "spleen", "stomach", "bloating", "loose stools"],
+        "help_words": ["digest", "tonifies spleen", "nausea"],
+    },
+    "poor circulation": {
+        "avoid_types": [EnergeticType.COLD],
+        "help_words": ["circulation", "nourishes blood", "warms"],
+    },
+    "insomnia": {
+        "help_words": ["heart", "calms", "nourishes blood"],
+    },
+    "fatigue": {
+        "help_words": ["energy", "strengthens", "tonifies"],
+    },
+    "allergies": {
+        "avoid_words": ["allergy", "allergies"],
+    },
+    "high blood pressure": {
+        "avoid_words": ["blood pressure"],
+        "help_words": ["clears heat"],
+    },
+}
+
+# Energetic lean of each season: warming foods in winter, cooling in summer.
+SEASON_ENERGETICS = {
+    Season.SPRING: {EnergeticType.NEUTRAL: 0.5, EnergeticType.COLD: 0.25},
+    Season.SUMMER: {EnergeticType.COLD: 1.0, EnergeticType.WARM: -0.5},
+    Season.FALL: {EnergeticType.NEUTRAL: 0.5, EnergeticType.WARM: 0.25},
+    Season.WINTER: {EnergeticType.WARM: 1.0, EnergeticType.COLD: -0.5},
+}
+
+SEASON_WEIGHT = 2.0
+ALL_SEASON_WEIGHT = 0.5
+CONSTITUTION_WEIGHT = 1.0
+AVOID_WEIGHT = 3.0
+HELP_WEIGHT = 1.0
+RECENT_PENALTY = 2.5
+
+
+def condition_key(name: str) -> str:
+    return " ".join(name.lower().split())
+
+
+class RecommendationModel:
+    """
+    Scores every food in the catalog for a user with one matrix product.
+
+    Each food is a row of features: energetic type (one-hot), season (one-hot
+    plus an "all seasons" flag), and for every known condition whether the
+    food is contraindicated or helpful. A user becomes a weight vector over
+    the same columns, so scores = features @ weights, and a batch of users is
+    a single (users x features) @ (features x foods) product. Top-k uses
+    argpartition, so only the k winners are fully sorted.
+    """
+
+    def __init__(self, foods: Mapping[str, dict], conditions: Sequence[str]):
+        position = {normalize_name(key): i for i, key in enumerate(foods)}
+        for i, data in enumerate(foods.values()):
+            position.setdefault(normalize_name(data["name"]), i)
+        self._layout(list(foods), conditions, position)
+        self.features = self.build_features(foods)
+
+    @classmethod
+    def from_features(
+        cls, food_keys: Sequence[str], conditions: Sequence[str], features: np.ndarray, position
+    ) -> "RecommendationModel":
+        """
+        A model over a precomputed feature matrix, e.g. one mapped from a
+        compiled catalog file (see mapped_catalog.py). `position` maps a
+        normalized food key or name to its row via `.get()`.
+        """
+        model = cls.__new__(cls)
+        model._layout(food_keys, conditions, position)
+        if features.shape != (len(food_keys), model.width):
+            raise ValueError(f"Feature matrix shape {features.shape} does not match the catalog")
+        model.features = features
+        return model
+
+    def _layout(self, food_keys: Sequence[str], conditions: Sequence[str], position) -> None:
+        self.food_keys = food_keys
+        self.position = position
+
+        self.conditions = [condition_key(c) for c in conditions]
+        self.condition_index = {c: i for i, c in enumerate(self.conditions)}
+
+        n_conditions = len(self.conditions)
+        self.energetic_cols = slice(0, 3)
+        self.season_cols = slice(3, 7)
+        self.all_season_col = 7
+        self.avoid_cols = slice(8, 8 + n_conditions)
+        self.help_cols = slice(8 + n_conditions, 8 + 2 * n_conditions)
+        self.width = 8 + 2 * n_conditions
+
+    def build_features(self, foods: Mapping[str, dict]) -> np.ndarray:
+        features = np.zeros((len(foods), self.width), dtype=np.float32)
+        for row, data in enumerate(foods.values()):
+            energetic = EnergeticType(data["energeticType"])
+            features[row, ENERGETIC_TYPES.index(energetic)] = 1.0
+            if data.get("season") is None:
+                features[row, self.all_season_col] = 1.0
+            else:
+                features[row, 3 + SEASONS.index(Season(data["season"]))] = 1.0
+
+            warnings = (data.get("warnings") or "").lower()
+            benefits = (data.get("benefits") or "").lower()
+            for c, condition in enumerate(self.conditions):
+                profile = CONDITION_PROFILES.get(condition, {})
+                avoid = energetic in profile.get("avoid_types", ()) or any(
+                    word in warnings for word in profile.get("avoid_words", ())
+                )
+                helps = energetic in profile.get("favour_types", ()) or any(
+                    word in benefits for word in profile.get("help_words", ())
+                )
+                features[row, self.avoid_cols.start + c] = float(avoid)
+                features[row, self.help_cols.start + c] = float(helps and not avoid)
+        return features
+
+    def user_weights(self, season: Season, conditions: Sequence[str] = ()) -> np.ndarray:
+        weights = np.zeros(self.width, dtype=np.float32)
+        weights[self.season_cols.start + SEASONS.index(season)] = SEASON_WEIGHT
+        weights[self.all_season_col] = ALL_SEASON_WEIGHT
+        for energetic, lean in SEASON_ENERGETICS[season].items():
+            weights[ENERGETIC_TYPES.index(energetic)] += lean
+
+        for name in conditions:
+            c = self.condition_index.get(condition_key(name))
+            if c is None:
+                continue
+            profile = CONDITION_PROFILES.get(self.conditions[c], {})
+            for energetic in profile.get("favour_types", ()):
+                weights[ENERGETIC_TYPES.index(energetic)] += CONSTITUTION_WEIGHT
+            weights[self.avoid_cols.start + c] = -AVOID_WEIGHT
+            weights[self.help_cols.start + c] = HELP_WEIGHT
+        return weights
+
+    def recent_positions(self, recent_foods: Sequence[str]) -> List[int]:
+        positions = (self.position.get(normalize_name(name)) for name in recent_foods)
+        return [p for p in positions if p is not None]
+
+    def score_batch(self, weights: np.ndarray, recent: Sequence[Sequence[int]]) -> np.ndarray:
+        """(users x features) weights -> (users x foods) scores."""
+        scores = weights @ self.features.T
+        for user, positions in enumerate(recent):
+            if positions:
+                scores[user, positions] -= RECENT_PENALTY
+        return scores
+
+    @staticmethod
+    def top_k(scores: np.ndarray, k: int) -> List[int]:
+        k = min(k, scores.shape[0])
+        if k <= 0:
+            return []
+        if k < scores.shape[0]:
+            candidates = np.argpartition(-scores, k - 1)[:k]
+        else:
+            candidates = np.arange(scores.shape[0])
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return order.tolist()
+
+    def recommend_batch(self, users: Sequence[dict], k: int) -> List[List[Tuple[int, float]]]:
+        """
+        `users` are dicts with season, conditions and recentFoods. Returns, per
+        user, the top-k as (row, score) pairs; rows follow the catalog's food
+        order, so `food_keys[row]` is the food.
+        """
+        if not users:
+            return []
+        weights = np.stack([self.user_weights(u["season"], u.get("conditions", ())) for u in users])
+        recent = [self.recent_positions(u.get("recentFoods", ())) for u in users]
+        scores = self.score_batch(weights, recent)
+        results = []
+        for user_scores in scores:
+            results.append([(i, float(user_scores[i])) for i in self.top_k(user_scores, k)])
+        return results
+
+    def recommend(self, season: Season, conditions: Sequence[str] = (), recent_foods: Sequence[str] = (), k: int = 10):
+        return self.recommend_batch([{"season": season, "conditions": conditions, "recentFoods": recent_foods}], k)[0]
@@ -0,0 +1,263 @@
+import base64
+import heapq
+import re
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from models import Food
+
+# ---------- Food search index ----------
+
+# Relative weight of a hit in each field.
+FIELD_WEIGHTS = {"name": 3.0, "commonUses": 1.5, "benefits": 1.0}
+
+# Match quality by how a query token reached an indexed term.
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+FUZZY_SCORE = 0.6
+
+# Bounds that keep per-query work flat as the vocabulary grows.
+PREFIX_EXPANSION_LIMIT = 64
+FUZZY_EXPANSION_LIMIT = 16
+FUZZY_MIN_SIMILARITY = 0.45
+FUZZY_MIN_TOKEN_LENGTH = 3
+
+# Bonus when the food name starts with the whole query ("swe" -> "Sweet Potato").
+NAME_PREFIX_BONUS = 2.0
+
+QUERY_CACHE_SIZE = 2048
+PREFIX_CACHE_SIZE = 4096
+
+# Rankings are cached only as deep as pages have been requested, rounded up
+# to a power of two no smaller than this, so a cached query holds a bounded
+# top-N rather than every match.
+RANK_DEPTH_MIN = 64
+
+# Sorts after every character tokens can contain, to find the end of a prefix range.
+_PREFIX_END = "{"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def trigrams(term: str) -> set:
+    padded = f"$${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class FoodSearchIndex:
+    """
+    Ranked search over the catalog's foods, built once per catalog snapshot.
+
+    Query tokens are matched against indexed terms exactly, by prefix (for
+    search-as-you-type) and by trigram similarity (for typos). Each matched
+    term contributes its field weight, and every query token has to match
+    something for a food to be returned.
+
+    The index itself is flat arrays: sorted terms, per-term posting ranges of
+    (food row, field weight), and each trigram's term ids behind
+    `trigram_terms`. A compiled catalog file stores them as sections, so a
+    mapped snapshot searches them in place (see mapped_catalog.py).
+    """
+
+    def __init__(
+        self,
+        version: str,
+        documents: Sequence[dict],
+        names: Sequence[str],
+        terms: Sequence[str],
+        posting_offsets: Sequence[int],
+        posting_docs: Sequence[int],
+        posting_weights: Sequence[float],
+        term_weights: Sequence[float],
+        trigram_terms: Callable[[str], Sequence[int]],
+    ):
+        self.version = version
+        self.documents = documents  # Food JSON per row, for responses
+        self.names = names  # lowercased names, for ties and the name-prefix bonus
+        self.terms = terms
+        self.posting_offsets = posting_offsets
+        self.posting_docs = posting_docs
+        self.posting_weights = posting_weights
+        self.term_weights = term_weights  # best field weight per term
+        self.trigram_terms = trigram_terms
+
+        self._ranked = lru_cache(maxsize=QUERY_CACHE_SIZE)(self._rank)
+        self._prefix_terms = lru_cache(maxsize=PREFIX_CACHE_SIZE)(self._prefix_range)
+
+    @classmethod
+    def from_foods(cls, foods: Dict[str, dict], version: str = "") -> "FoodSearchIndex":
+        # Serialized once so search responses reuse them instead of building models per hit.
+        documents: List[dict] = []
+        names: List[str] = []
+        postings: Dict[str, Dict[int, float]] = {}
+
+        for doc_id, (key, data) in enumerate(foods.items()):
+            documents.append(Food(**data).model_dump(mode="json"))
+            names.append(data["name"].lower())
+            fields = {
+                "name": f"{data['name']} {key}",
+                "commonUses": " ".join(data.get("commonUses") or []),
+                "benefits": data.get("benefits") or "",
+            }
+            for field, text in fields.items():
+                weight = FIELD_WEIGHTS[field]
+                for token in tokenize(text):
+                    docs = postings.setdefault(token, {})
+                    if docs.get(doc_id, 0.0) < weight:
+                        docs[doc_id] = weight
+
+        terms = sorted(postings)
+        posting_offsets = array("Q", [0])
+        posting_docs = array("I")
+        posting_weights = array("f")
+        term_weights = array("f")
+        trigram_index: Dict[str, List[int]] = {}
+        for term_id, term in enumerate(terms):
+            docs = postings[term]
+            posting_docs.extend(docs)
+            posting_weights.extend(docs.values())
+            posting_offsets.append(len(posting_docs))
+            term_weights.append(max(docs.values()))
+            for gram in trigrams(term):
+                trigram_index.setdefault(gram, []).append(term_id)
+
+        return cls(
+            version, documents, names, terms, posting_offsets, posting_docs, posting_weights, term_weights,
+            lambda gram: trigram_index.get(gram, ()),
+        )
+
+    def trigram_table(self) -> Dict[str, List[int]]:
+        """Every trigram's term ids, for compiling the index into a catalog file."""
+        table: Dict[str, List[int]] = {}
+        for term_id, term in enumerate(self.terms):
+            for gram in trigrams(term):
+                table.setdefault(gram, []).append(term_id)
+        return table
+
+    def postings(self, term_id: int):
+        """(food row, field weight) pairs for one term."""
+        start, end = self.posting_offsets[term_id], self.posting_offsets[term_id + 1]
+        return zip(self.posting_docs[start:end], self.posting_weights[start:end])
+
+    def term_relevance(self, term_id: int) -> Tuple[float, int, int]:
+        """How useful a term is as a prefix expansion: found in names first, then in more foods, then shorter."""
+        count = self.posting_offsets[term_id + 1] - self.posting_offsets[term_id]
+        return self.term_weights[term_id], count, -len(self.terms[term_id])
+
+    # ----- term expansion -----
+
+    def _prefix_range(self, token: str) -> List[int]:
+        """
+        Terms starting with `token`: all of them, or the PREFIX_EXPANSION_LIMIT
+        most relevant (see term_relevance) when there are more. The exact
+        term is always kept.
+        """
+        start = bisect_left(self.terms, token)
+        end = bisect_left(self.terms, token + _PREFIX_END, start)
+        if end - start <= PREFIX_EXPANSION_LIMIT:
+            return list(range(start, end))
+        matches = heapq.nlargest(PREFIX_EXPANSION_LIMIT, range(start, end), key=self.term_relevance)
+        if self.terms[start] == token and start not in matches:
+            matches[-1] = start
+        return matches
+
+    def _fuzzy_terms(self, token: str) -> List[Tuple[int, float]]:
+        grams = trigrams(token)
+        overlap: Dict[int, int] = {}
+        for gram in grams:
+            for term_id in self.trigram_terms(gram):
+                overlap[term_id] = overlap.get(term_id, 0) + 1
+
+        scored = []
+        for term_id, shared in overlap.items():
+            # Dice coefficient over trigram sets.
+            similarity = 2.0 * shared / (len(grams) + len(self.terms[term_id]) + 1)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                scored.append((term_id, similarity))
+        return heapq.nlargest(FUZZY_EXPANSION_LIMIT, scored, key=lambda item: item[1])
+
+    def _expand(self, token: str) -> Dict[int, float]:
+        """Map each indexed term reachable from `token` to its match quality."""
+        expanded: Dict[int, float] = {}
+        for term_id in self._prefix_terms(token):
+            expanded[term_id] = EXACT_SCORE if self.terms[term_id] == token else PREFIX_SCORE
+        if len(token) >= FUZZY_MIN_TOKEN_LENGTH:
+            for term_id, similarity in self._fuzzy_terms(token):
+                score = FUZZY_SCORE * similarity
+                if score > expanded.get(term_id, 0.0):
+                    expanded[term_id] = score
+        return expanded
+
+    # ----- ranking -----
+
+    def _rank(self, query: str, depth: int) -> Tuple[Tuple[int, ...], int]:
+        """The `depth` best documents for `query`, best first, and how many match in all."""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return (), 0
+
+        scores: Optional[Dict[int, float]] = None
+        for token in tokens:
+            token_scores: Dict[int, float] = {}
+            for term_id, quality in self._expand(token).items():
+                for doc_id, weight in self.postings(term_id):
+                    score = quality * weight
+                    if score > token_scores.get(doc_id, 0.0):
+                        token_scores[doc_id] = score
+
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {d: s + token_scores[d] for d, s in scores.items() if d in token_scores}
+            if not scores:
+                return (), 0
+
+        phrase = " ".join(tokens)
+        names = {doc_id: self.names[doc_id] for doc_id in scores}  # decoded once when mapped
+        for doc_id, name in names.items():
+            if name.startswith(phrase):
+                scores[doc_id] += NAME_PREFIX_BONUS
+
+        ranked = heapq.nsmallest(depth, scores.items(), key=lambda item: (-item[1], names[item[0]]))
+        return tuple(doc_id for doc_id, _ in ranked), len(scores)
+
+    def search(self, query: str, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[dict], Optional[str]]:
+        """Return one page of ranked foods and the cursor for the next page (or None)."""
+        offset = self.decode_cursor(cursor) if cursor else 0
+        next_offset = offset + limit
+        depth = max(RANK_DEPTH_MIN, 1 << (next_offset - 1).bit_length())
+        ranked, total = self._ranked(" ".join(tokenize(query)), depth)
+        page = [self.documents[doc_id] for doc_id in ranked[offset:next_offset]]
+        next_cursor = self.encode_cursor(next_offset) if next_offset < total else None
+        return page, next_cursor
+
+    # ----- cursors -----
+
+    def encode_cursor(self, offset: int) -> str:
+        raw = f"{self.version}:{offset}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, cursor: str) -> int:
+        """
+        Cursors are tied to the catalog version they were issued for, since
+        rankings shift when the catalog is reloaded.
+        """
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            version, offset = base64.urlsafe_b64decode(padded.encode()).decode().rsplit(":", 1)
+            offset = int(offset)
+        except ValueError:
+            raise InvalidCursor("Malformed cursor")
+        if version != self.version or offset < 0:
+            raise InvalidCursor("Cursor is stale; restart the search")
+        return offset
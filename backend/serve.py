@@ -0,0 +1,244 @@
+"""
+Production launcher: N uvicorn workers sharing one listening socket and one
+compiled, memory-mapped catalog.
+
+    python serve.py --workers 4 --port 8000
+    CATALOG_PATH=catalog.json python serve.py --workers 8
+
+The supervisor compiles the catalog ($CATALOG_PATH, or the bundled mock data)
+into CATALOG_SNAPSHOT_DIR/catalog-<version>.bin once, and every worker maps
+that file read-only (see mapped_catalog.py), so its pages are shared instead
+of being duplicated per process.
+
+Send SIGHUP to the supervisor to roll out a new catalog (or new code) with no
+downtime: it compiles a fresh snapshot, then replaces workers one at a time,
+starting each replacement and waiting until it is serving before asking the
+old worker to finish its in-flight requests and exit. Workers that die are
+restarted. SIGTERM / SIGINT shut everything down gracefully. (Windows has no
+SIGHUP; restart the supervisor there instead.)
+
+Workers open each catalog index on first use; pass --warm-indexes to open
+them all before a worker reports ready.
+
+Per-process state (identify cache, near-duplicate index, /metrics) is not
+shared between workers; POST /api/catalog/reload only reloads the worker
+that receives it, so use SIGHUP here instead.
+"""
+import argparse
+import asyncio
+import glob
+import logging
+import multiprocessing
+import os
+import signal
+import tempfile
+import time
+from multiprocessing.connection import Connection
+from typing import List, Optional
+
+import uvicorn
+
+logger = logging.getLogger("serve")
+
+SNAPSHOT_DIR_ENV = "CATALOG_SNAPSHOT_DIR"
+
+# How long a new worker gets to come up, and an old one to drain, during recycling.
+WORKER_START_TIMEOUT = 60.0
+WORKER_DRAIN_TIMEOUT = 30.0
+
+
+def compile_current_catalog(directory: str) -> str:
+    """Compile the configured catalog into `directory`; reuses an existing file for the same version."""
+    from catalog import load_snapshot
+    from mapped_catalog import compile_catalog
+    from sync import SyncLog
+
+    os.makedirs(directory, exist_ok=True)
+    snapshot = load_snapshot()
+    path = os.path.join(directory, f"catalog-{snapshot.version}.bin")
+    if not os.path.exists(path):
+        compile_catalog(snapshot, path)
+    # Log the new version for /api/sync here, once, so workers find it already recorded.
+    sync_log = SyncLog()
+    try:
+        sync_log.record(snapshot)
+        sync_log.snapshot_file()
+    finally:
+        sync_log.close()
+    return path
+
+
+def run_worker(config_kwargs: dict, sockets, snapshot_path: str, warm_indexes: bool, ready) -> None:
+    # Set before main is imported so its CatalogRepository maps the compiled file.
+    # uvicorn imports main before it starts accepting, so warmed indexes are
+    # open by the time the worker reports ready.
+    os.environ["CATALOG_SNAPSHOT"] = snapshot_path
+    if warm_indexes:
+        os.environ["CATALOG_WARM_INDEXES"] = "1"
+    config = uvicorn.Config("main:app", **config_kwargs)
+    server = uvicorn.Server(config)
+
+    async def serve() -> None:
+        task = asyncio.ensure_future(server.serve(sockets=sockets))
+        while not server.started and not task.done():
+            await asyncio.sleep(0.05)
+        if server.started:
+            ready.send(True)
+            ready.close()
+        await task
+
+    asyncio.run(serve())
+
+
+class Worker:
+    def __init__(self, process: multiprocessing.Process, ready: Connection, snapshot_path: str):
+        self.process = process
+        self.ready = ready
+        self.snapshot_path = snapshot_path
+
+
+class Supervisor:
+    def __init__(self, args):
+        self.args = args
+        self.context = multiprocessing.get_context("spawn")
+        self.config_kwargs = {
+            "host": args.host,
+            "port": args.port,
+            "log_level": args.log_level,
+            "timeout_graceful_shutdown": int(WORKER_DRAIN_TIMEOUT),
+        }
+        self.socket = uvicorn.Config("main:app", host=args.host, port=args.port).bind_socket()
+        self.snapshot_dir = args.snapshot_dir
+        self.snapshot_path = compile_current_catalog(self.snapshot_dir)
+        self.workers: List[Worker] = []
+        self.should_exit = False
+        self.should_recycle = False
+
+    def spawn(self) -> Worker:
+        # The worker reports readiness over a pipe once uvicorn is accepting connections.
+        ready, ready_writer = self.context.Pipe(duplex=False)
+        process = self.context.Process(
+            target=run_worker,
+            args=(self.config_kwargs, [self.socket], self.snapshot_path, self.args.warm_indexes, ready_writer),
+            daemon=False,
+        )
+        process.start()
+        ready_writer.close()
+        return Worker(process, ready, self.snapshot_path)
+
+    def wait_ready(self, worker: Worker, timeout: float = WORKER_START_TIMEOUT) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if worker.ready.poll(0.1):
+                    return bool(worker.ready.recv())
+            except EOFError:
+                return False
+            if not worker.process.is_alive():
+                return False
+        return False
+
+    @staticmethod
+    def stop(worker: Worker, timeout: float = WORKER_DRAIN_TIMEOUT) -> None:
+        """SIGTERM lets uvicorn stop accepting and finish in-flight requests."""
+        if worker.process.is_alive():
+            worker.process.terminate()
+        worker.process.join(timeout)
+        if worker.process.is_alive():
+            logger.warning("Worker %s did not drain in %.0fs; killing it", worker.process.pid, timeout)
+            worker.process.kill()
+            worker.process.join()
+
+    def recycle(self) -> None:
+        """Swap every worker for one serving the freshly compiled catalog, one at a time."""
+        try:
+            self.snapshot_path = compile_current_catalog(self.snapshot_dir)
+        except Exception:
+            logger.exception("Catalog compilation failed; keeping the current workers")
+            return
+        logger.info("Rolling workers onto %s", self.snapshot_path)
+
+        for index, old in enumerate(list(self.workers)):
+            new = self.spawn()
+            if not self.wait_ready(new):
+                logger.error("Replacement worker failed to start; aborting the rollout")
+                self.stop(new, timeout=5)
+                return
+            self.workers[index] = new
+            self.stop(old)
+        self.remove_stale_snapshots()
+
+    def remove_stale_snapshots(self) -> None:
+        in_use = {worker.snapshot_path for worker in self.workers} | {self.snapshot_path}
+        for path in glob.glob(os.path.join(self.snapshot_dir, "catalog-*.bin")):
+            if path not in in_use:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def restart_dead_workers(self) -> None:
+        for index, worker in enumerate(self.workers):
+            if not worker.process.is_alive():
+                logger.warning("Worker %s exited with %s; restarting", worker.process.pid, worker.process.exitcode)
+                self.workers[index] = self.spawn()
+
+    def handle_signal(self, signum, frame) -> None:
+        if signum == getattr(signal, "SIGHUP", None):
+            self.should_recycle = True
+        else:
+            self.should_exit = True
+
+    def run(self) -> None:
+        signals = [signal.SIGINT, signal.SIGTERM]
+        # Windows has no SIGHUP, so rolling restarts are POSIX-only.
+        if hasattr(signal, "SIGHUP"):
+            signals.append(signal.SIGHUP)
+        for signum in signals:
+            signal.signal(signum, self.handle_signal)
+
+        self.workers = [self.spawn() for _ in range(self.args.workers)]
+        for worker in self.workers:
+            self.wait_ready(worker)
+        logger.info(
+            "Serving on %s:%s with %d workers (catalog %s)",
+            self.args.host, self.args.port, len(self.workers), self.snapshot_path,
+        )
+
+        while not self.should_exit:
+            if self.should_recycle:
+                self.should_recycle = False
+                self.recycle()
+            else:
+                self.restart_dead_workers()
+            time.sleep(0.5)
+
+        for worker in self.workers:
+            if worker.process.is_alive():
+                worker.process.terminate()
+        for worker in self.workers:
+            self.stop(worker)
+        self.socket.close()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--snapshot-dir",
+        default=os.environ.get(SNAPSHOT_DIR_ENV, os.path.join(tempfile.gettempdir(), "food-energy-catalog")),
+    )
+    parser.add_argument(
+        "--warm-indexes", action="store_true", help="open every catalog index before serving, not on first use"
+    )
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    Supervisor(args).run()
+
+
+if __name__ == "__main__":
+    main()
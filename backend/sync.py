@@ -0,0 +1,353 @@
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+from catalog import CatalogSnapshot, _json_default
+from compatibility import rule_ingredients
+from http_cache import RenderedResponse
+
+# ---------- Catalog change log for offline sync ----------
+
+# SQLite file holding the change log. Keep it on persistent storage: clients'
+# cursors are only valid against the log that issued them.
+SYNC_DB_PATH = os.environ.get("SYNC_DB_PATH", os.path.join(tempfile.gettempdir(), "food-energy-sync.sqlite3"))
+# Where precompressed full snapshots are written.
+SYNC_SNAPSHOT_DIR = os.environ.get("SYNC_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "food-energy-sync"))
+# Tombstones older than this are dropped; clients further behind must download a full snapshot.
+SYNC_TOMBSTONE_RETENTION = float(os.environ.get("SYNC_TOMBSTONE_RETENTION", 90 * 24 * 60 * 60))
+
+# Superseded snapshot files are kept this long, since other workers may
+# still be sending one they looked up just before a new version landed.
+SYNC_SNAPSHOT_GRACE = float(os.environ.get("SYNC_SNAPSHOT_GRACE", 10 * 60))
+
+# Rendered deltas kept per process, keyed by (cursor, head).
+MAX_CACHED_DELTAS = 256
+GZIP_LEVEL = 6
+
+# Entity kinds, named after the catalog's top-level keys.
+KINDS = (
+    "foods", "recipes", "combinations", "seasonalRecommendations", "markets", "healthConditions", "healthNoteRules",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entities (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    hash TEXT,
+    body TEXT,
+    PRIMARY KEY (kind, key)
+);
+CREATE INDEX IF NOT EXISTS entities_seq ON entities (seq);
+CREATE TABLE IF NOT EXISTS versions (
+    seq INTEGER PRIMARY KEY,
+    catalog_version TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, default=_json_default, sort_keys=True, separators=(",", ":"))
+
+
+class SyncNotReady(RuntimeError):
+    """No catalog version has been recorded yet, so there is nothing to serve."""
+
+
+def _digest(body: str) -> str:
+    return hashlib.sha1(body.encode()).hexdigest()[:16]
+
+
+def rule_key(kind: str, rule: dict) -> str:
+    """
+    Sync key of a combination rule: its "id" when it has one, else its foods
+    plus a hash of the rule, since several rules can name the same foods.
+    """
+    if rule.get("id"):
+        return f"{kind}:{rule['id']}"
+    return f"{kind}:{'+'.join(sorted(rule_ingredients(rule)))}:{_digest(_dumps(rule))[:12]}"
+
+
+def catalog_entities(snapshot: CatalogSnapshot) -> Iterator[Tuple[str, str, str]]:
+    """(kind, key, JSON body) for every syncable record in the catalog."""
+    for key, food in snapshot.foods.items():
+        yield "foods", key, _dumps(food)
+    for recipe in snapshot.recipes:
+        yield "recipes", recipe["id"], _dumps(recipe)
+    for kind, rules in snapshot.combinations.items():
+        for rule in rules:
+            yield "combinations", rule_key(kind, rule), _dumps({"kind": kind, **rule})
+    for season, names in snapshot.seasonal_recommendations.items():
+        yield "seasonalRecommendations", season.value, _dumps(names)
+    for market in snapshot.markets:
+        yield "markets", market["id"], _dumps(market)
+    for condition in snapshot.health_conditions:
+        yield "healthConditions", condition, _dumps(condition)
+    for rule in snapshot.health_note_rules:
+        body = _dumps(rule)
+        yield "healthNoteRules", rule.get("id") or f"{rule['condition']}:{_digest(body)[:12]}", body
+
+
+class SyncLog:
+    """
+    Per-record change log of the catalog, for clients that keep an offline copy.
+
+    Every published catalog version is diffed record by record against the
+    last recorded one; changed records are stamped with a new sequence number
+    and removed ones become tombstones (a row without a body). A delta since
+    cursor N is then an indexed range scan over `seq > N`, so its cost follows
+    what changed rather than the catalog size. Cursors embed the log's id, so
+    a client holding a cursor from a different or rebuilt log is told to
+    start over from the full snapshot, as is one older than the tombstones
+    still kept.
+    """
+
+    def __init__(
+        self,
+        path: str = SYNC_DB_PATH,
+        snapshot_dir: str = SYNC_SNAPSHOT_DIR,
+        tombstone_retention: float = SYNC_TOMBSTONE_RETENTION,
+    ):
+        self.path = path
+        self.snapshot_dir = snapshot_dir
+        self.tombstone_retention = tombstone_retention
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._deltas: "OrderedDict[Tuple[int, int], RenderedResponse]" = OrderedDict()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._db.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('log_id', ?)", (uuid.uuid4().hex[:12],))
+        self._db.execute("INSERT OR IGNORE INTO meta (name, value) VALUES ('floor', '0')")
+        self.log_id = self._meta("log_id")
+
+    def _meta(self, name: str) -> str:
+        return self._db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()[0]
+
+    # ----- recording -----
+
+    def head(self) -> Tuple[int, Optional[str]]:
+        """Latest sequence number and the catalog version it belongs to."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT seq, catalog_version FROM versions ORDER BY seq DESC LIMIT 1"
+            ).fetchone()
+        return (row[0], row[1]) if row else (0, None)
+
+    def record(self, snapshot: CatalogSnapshot) -> int:
+        """
+        Log the differences between `snapshot` and the last recorded version.
+        A no-op when that version is already the head, so every worker can
+        call it on startup. Returns the head sequence number.
+        """
+        head, version = self.head()
+        if version == snapshot.version:
+            return head
+
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT seq, catalog_version FROM versions ORDER BY seq DESC LIMIT 1"
+                ).fetchone()
+                head, version = row if row else (0, None)
+                if version == snapshot.version:
+                    self._db.execute("COMMIT")
+                    return head
+
+                seq = head + 1
+                live = {
+                    (kind, key): digest
+                    for kind, key, digest in self._db.execute(
+                        "SELECT kind, key, hash FROM entities WHERE body IS NOT NULL"
+                    )
+                }
+                upserts = []
+                for kind, key, body in catalog_entities(snapshot):
+                    digest = _digest(body)
+                    if live.pop((kind, key), None) != digest:
+                        upserts.append((kind, key, seq, digest, body))
+                self._db.executemany(
+                    "INSERT INTO entities (kind, key, seq, hash, body) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (kind, key) DO UPDATE SET seq = excluded.seq, hash = excluded.hash, "
+                    "body = excluded.body",
+                    upserts,
+                )
+                # Whatever is left in `live` is gone from the catalog.
+                self._db.executemany(
+                    "UPDATE entities SET seq = ?, hash = NULL, body = NULL WHERE kind = ? AND key = ?",
+                    [(seq, kind, key) for kind, key in live],
+                )
+                self._db.execute(
+                    "INSERT INTO versions (seq, catalog_version, created_at) VALUES (?, ?, ?)",
+                    (seq, snapshot.version, now),
+                )
+                self._compact(now)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return seq
+
+    def _compact(self, now: float) -> None:
+        """Drop tombstones past retention and raise the oldest cursor still served."""
+        row = self._db.execute(
+            "SELECT MAX(seq) FROM versions WHERE created_at < ?", (now - self.tombstone_retention,)
+        ).fetchone()
+        floor = row[0] if row and row[0] is not None else 0
+        if floor > int(self._meta("floor")):
+            self._db.execute("DELETE FROM entities WHERE body IS NULL AND seq <= ?", (floor,))
+            self._db.execute("UPDATE meta SET value = ? WHERE name = 'floor'", (str(floor),))
+
+    # ----- cursors -----
+
+    def cursor(self, seq: int) -> str:
+        return f"{self.log_id}.{seq}"
+
+    def parse_cursor(self, cursor: Optional[str], head: int) -> Optional[int]:
+        """Sequence number of a cursor this log can serve a delta from, else None."""
+        if not cursor:
+            return None
+        log_id, _, seq = cursor.partition(".")
+        if log_id != self.log_id or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._lock:
+            floor = int(self._meta("floor"))
+        if seq > head or seq < floor:
+            return None
+        return seq
+
+    # ----- deltas -----
+
+    def delta(self, since: Optional[str]) -> RenderedResponse:
+        """
+        Gzip-compressed JSON with the changes after cursor `since`:
+
+            {"cursor": ..., "reset": false,
+             "changes": {"foods": {"upsert": {key: record}, "delete": [key]}, ...}}
+
+        An unusable cursor gets {"reset": true, "cursor": null} and the client
+        should download the full snapshot instead. Raises SyncNotReady until
+        the first version is recorded.
+        """
+        head, _ = self.head()
+        if not head:
+            raise SyncNotReady()
+        seq = self.parse_cursor(since, head)
+        if seq is None:
+            return RenderedResponse(
+                gzip.compress(_dumps({"reset": True, "cursor": None, "changes": {}}).encode(), GZIP_LEVEL),
+                encoding="gzip",
+            )
+
+        key = (seq, head)
+        rendered = self._deltas.get(key)
+        if rendered is not None:
+            return rendered
+
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT kind, key, body FROM entities WHERE seq > ? AND seq <= ? ORDER BY kind, key", (seq, head)
+            ).fetchall()
+        rendered = RenderedResponse(
+            gzip.compress(self._render(rows, head, reset=False).encode(), GZIP_LEVEL), encoding="gzip"
+        )
+        with self._lock:
+            self._deltas[key] = rendered
+            if len(self._deltas) > MAX_CACHED_DELTAS:
+                self._deltas.popitem(last=False)
+        return rendered
+
+    def _render(self, rows, head: int, reset: bool) -> str:
+        # Record bodies are stored as JSON already, so they are spliced in rather than re-encoded.
+        upserts = {}
+        deletes = {}
+        for kind, key, body in rows:
+            if body is None:
+                deletes.setdefault(kind, []).append(key)
+            else:
+                upserts.setdefault(kind, []).append(f"{json.dumps(key)}:{body}")
+        sections = []
+        for kind in KINDS:
+            parts = []
+            if kind in upserts:
+                parts.append('"upsert":{' + ",".join(upserts[kind]) + "}")
+            if kind in deletes:
+                parts.append('"delete":' + json.dumps(deletes[kind], separators=(",", ":")))
+            if parts:
+                sections.append(f'"{kind}":{{{",".join(parts)}}}')
+        return (
+            f'{{"cursor":{json.dumps(self.cursor(head))},"reset":{json.dumps(reset)},'
+            f'"changes":{{{",".join(sections)}}}}}'
+        )
+
+    # ----- full snapshot -----
+
+    def snapshot_file(self) -> Tuple[str, str]:
+        """
+        Path of the gzip-compressed full snapshot at the head, written on first
+        request, and its cursor. Same shape as a delta with "reset": true, so
+        clients apply it with the same code after clearing their copy. Raises
+        SyncNotReady until the first version is recorded.
+        """
+        head, _ = self.head()
+        if not head:
+            raise SyncNotReady()
+        path = os.path.join(self.snapshot_dir, f"snapshot-{self.log_id}-{head}.json.gz")
+        if os.path.exists(path):
+            return path, self.cursor(head)
+
+        with self._file_lock:
+            if not os.path.exists(path):
+                with self._lock:
+                    rows = self._db.execute(
+                        "SELECT kind, key, body FROM entities WHERE body IS NOT NULL AND seq <= ? ORDER BY kind, key",
+                        (head,),
+                    ).fetchall()
+                os.makedirs(self.snapshot_dir, exist_ok=True)
+                partial = f"{path}.{os.getpid()}.tmp"
+                with gzip.open(partial, "wb", compresslevel=GZIP_LEVEL) as f:
+                    f.write(self._render(rows, head, reset=True).encode())
+                os.replace(partial, path)
+                self._remove_stale_snapshots()
+        return path, self.cursor(head)
+
+    def _remove_stale_snapshots(self) -> None:
+        """Delete snapshot files superseded by a newer one more than SYNC_SNAPSHOT_GRACE ago."""
+        files = []
+        for name in os.listdir(self.snapshot_dir):
+            if name.startswith("snapshot-") and name.endswith(".json.gz"):
+                path = os.path.join(self.snapshot_dir, name)
+                try:
+                    files.append((os.path.getmtime(path), path))
+                except OSError:
+                    continue
+        files.sort(reverse=True)
+        cutoff = time.time() - SYNC_SNAPSHOT_GRACE
+        # Each file was superseded when the next newer one was written.
+        for (superseded_at, _), (_, path) in zip(files, files[1:]):
+            if superseded_at < cutoff:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the job store and sync log created by importing main out of the shared temp paths.
+_state = tempfile.mkdtemp(prefix="food-energy-tests-")
+os.environ.setdefault("JOB_STORE_PATH", os.path.join(_state, "jobs.sqlite3"))
+os.environ.setdefault("SYNC_DB_PATH", os.path.join(_state, "sync.sqlite3"))
+os.environ.setdefault("SYNC_SNAPSHOT_DIR", os.path.join(_state, "sync"))
@@ -0,0 +1,53 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from admission import AdmissionMiddleware, route_policies
+
+ROUTES = [("identify", "/identify", 1024), ("analyze", "/analyze", 1024)]
+
+
+def make_client(policies) -> TestClient:
+    app = FastAPI()
+
+    @app.post("/identify")
+    @app.post("/analyze")
+    @app.get("/catalog")
+    def ok():
+        return {"ok": True}
+
+    app.add_middleware(AdmissionMiddleware, policies=policies)
+    return TestClient(app)
+
+
+def test_clients_over_their_rate_get_429(monkeypatch):
+    monkeypatch.setenv("ADMISSION_IDENTIFY_RATE", "0.01")
+    monkeypatch.setenv("ADMISSION_IDENTIFY_BURST", "2")
+    client = make_client(route_policies(ROUTES))
+    assert [client.post("/identify").status_code for _ in range(3)] == [200, 200, 429]
+    shed = client.post("/identify")
+    assert shed.status_code == 429 and int(shed.headers["retry-after"]) >= 1
+    # The other route keeps its own (default) bucket.
+    assert client.post("/analyze").status_code == 200
+
+
+def test_full_lane_gets_503_and_unlaned_routes_still_pass():
+    policies = route_policies(ROUTES)
+    lane = policies["/identify"].lane
+    assert policies["/analyze"].lane is lane
+    client = make_client(policies)
+    for _ in range(lane.max_jobs):
+        assert lane.try_acquire(0)
+    shed = client.post("/identify")
+    assert shed.status_code == 503 and shed.headers["retry-after"] == "1"
+    assert client.get("/catalog").status_code == 200
+    for _ in range(lane.max_jobs):
+        lane.release(0)
+    assert client.post("/identify").status_code == 200
+
+
+def test_a_route_can_move_into_a_lane_of_its_own(monkeypatch):
+    monkeypatch.setenv("ADMISSION_ANALYZE_LANE", "analysis")
+    monkeypatch.setenv("ADMISSION_ANALYSIS_MAX_JOBS", "0")
+    client = make_client(route_policies(ROUTES))
+    assert client.post("/analyze").status_code == 503
+    assert client.post("/identify").status_code == 200
@@ -0,0 +1,18 @@
+from fastapi.testclient import TestClient
+
+
+def test_reload_is_disabled_without_a_token(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "CATALOG_RELOAD_TOKEN", None)
+    assert TestClient(main.app).post("/api/catalog/reload").status_code == 404
+
+
+def test_reload_requires_the_configured_token(monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "CATALOG_RELOAD_TOKEN", "s3cret")
+    client = TestClient(main.app)
+    assert client.post("/api/catalog/reload").status_code == 403
+    assert client.post("/api/catalog/reload", headers={"X-Reload-Token": "wrong"}).status_code == 403
+    assert client.post("/api/catalog/reload", headers={"X-Reload-Token": "s3cret"}).status_code == 200
@@ -0,0 +1,32 @@
+from health_notes import HealthNotesMatcher
+from mock_data import HEALTH_NOTE_RULES
+
+
+def conditions(notes: str) -> list:
+    return [match.condition for match in HealthNotesMatcher.from_rules(HEALTH_NOTE_RULES).match(notes)]
+
+
+def test_cue_inside_a_term_is_not_a_negation():
+    # "不" is part of "消化不良" and must not negate the insomnia that follows.
+    assert conditions("消化不良和失眠") == ["Digestive issues", "Insomnia"]
+    assert conditions("没有消化不良") == []
+
+
+def test_cjk_negation_is_bounded_by_character_distance():
+    assert conditions("不失眠") == []
+    assert conditions("不想说太多最近总是失眠") == ["Insomnia"]
+
+
+def test_stomach_terms_need_a_symptom():
+    assert conditions("最近胃口很好") == []
+    assert conditions("饭后胃胀") == ["Digestive issues"]
+
+
+def test_terms_sharing_a_suffix_all_match():
+    # "sweats" ends where "night sweats" does and is only reached through its suffix link.
+    rules = [
+        {"condition": "Long", "terms": ["night sweats"]},
+        {"condition": "Short", "terms": ["sweats"]},
+    ]
+    matches = HealthNotesMatcher.from_rules(rules).match("night sweats")
+    assert sorted(match.condition for match in matches) == ["Long", "Short"]
@@ -0,0 +1,34 @@
+import hashlib
+import io
+import json
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+
+def png(size: int) -> bytes:
+    buffer = io.BytesIO()
+    # Noise doesn't compress, so the larger image spills its spool to disk.
+    Image.effect_noise((size, size), 64).convert("RGB").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_batch_items_are_ingested_like_single_uploads():
+    import main
+
+    small, large = png(32), png(800)
+    files = [
+        ("files", ("small.png", small, "image/png")),
+        ("files", ("notes.txt", b"text", "text/plain")),
+        ("files", ("empty.png", b"", "image/png")),
+        ("files", ("large.png", large, "image/png")),
+    ]
+    response = TestClient(main.app).post("/api/food/identify/batch", files=files)
+    assert response.status_code == 200
+    lines = {line["index"]: line for line in map(json.loads, response.text.splitlines())}
+
+    assert lines[0]["image"]["digest"] == hashlib.sha256(small).hexdigest()
+    assert lines[1]["error"]["status"] == 400
+    assert lines[2]["error"] == {"status": 400, "detail": "Empty file uploaded"}
+    assert lines[3]["image"]["digest"] == hashlib.sha256(large).hexdigest()
+    assert lines[3]["image"]["width"] == 800
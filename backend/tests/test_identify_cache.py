@@ -0,0 +1,68 @@
+import asyncio
+import os
+
+from identify_cache import DiskCacheTier, IdentifyResultCache, LRUTTLCache
+from models import EnergeticType, FoodIdentifyResponse
+
+RESPONSE = FoodIdentifyResponse(
+    foodName="Ginger", energeticType=EnergeticType.WARM, description="Root", benefits="Warms", recipes=[]
+)
+
+
+def test_memory_tier_evicts_least_recently_used_and_expired_entries():
+    cache = LRUTTLCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None and cache.get("a") == 1 and cache.evictions == 1
+
+    expiring = LRUTTLCache(ttl=0)
+    expiring.set("a", 1)
+    assert expiring.get("a") is None and expiring.expirations == 1
+
+
+def test_disk_tier_is_shared_and_promoted_into_memory(tmp_path):
+    key = IdentifyResultCache.key("v1", "ab" * 32)
+
+    async def scenario():
+        writer = IdentifyResultCache(second_tier=DiskCacheTier(str(tmp_path)))
+        await writer.set(key, RESPONSE)
+        # Another worker: empty memory tier, same directory.
+        reader = IdentifyResultCache(second_tier=DiskCacheTier(str(tmp_path)))
+        first = await reader.get(key)
+        second = await reader.get(key)
+        missing = await reader.get(IdentifyResultCache.key("v2", "ab" * 32))
+        return reader, first, second, missing
+
+    reader, first, second, missing = asyncio.run(scenario())
+    assert first == RESPONSE and second == RESPONSE and missing is None
+    assert reader.stats()["secondTierHits"] == 1 and reader.stats()["hits"] == 1
+    assert reader.stats()["misses"] == 1
+
+
+def test_disk_tier_ignores_corrupt_entries(tmp_path):
+    tier = DiskCacheTier(str(tmp_path))
+    tier.set("v1:bad", b"not json")
+
+    async def lookup():
+        return await IdentifyResultCache(second_tier=tier).get("v1:bad")
+
+    assert asyncio.run(lookup()) is None
+
+
+def test_disk_tier_prunes_the_oldest_entries_past_its_limits(tmp_path):
+    tier = DiskCacheTier(str(tmp_path), max_entries=10)
+    for i in range(20):
+        tier.set(f"v1:{i:02d}", b"{}")
+        os.utime(tier._path(f"v1:{i:02d}"), (1_000_000_000 + i, 1_000_000_000 + i))
+    tier.ttl = float("inf")
+    tier.prune()
+    kept = sorted(os.listdir(tmp_path))
+    assert len(kept) == 9 and tier.evictions == 11
+    assert kept[0] == "v1_11.json"
+
+    expiring = DiskCacheTier(str(tmp_path / "expiring"), ttl=0)
+    expiring.set("v1:old", b"{}")
+    os.utime(expiring._path("v1:old"), (1_000_000_000, 1_000_000_000))
+    assert expiring.get("v1:old") is None and not os.listdir(tmp_path / "expiring")
@@ -0,0 +1,142 @@
+import asyncio
+import base64
+import hashlib
+import os
+import random
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from ingest import Base64StreamDecoder, ingest_multipart
+
+
+def decode_in_pieces(text: bytes, rng: random.Random) -> bytes:
+    decoder = Base64StreamDecoder()
+    out = bytearray()
+    i = 0
+    while i < len(text):
+        step = rng.randint(1, 9)
+        out += decoder.feed(text[i:i + step])
+        i += step
+    return bytes(out + decoder.finish())
+
+
+def test_round_trips_in_arbitrary_pieces():
+    rng = random.Random(7)
+    for size in list(range(0, 20)) + [1000, 4097]:
+        data = rng.randbytes(size)
+        encoded = base64.b64encode(data)
+        assert decode_in_pieces(encoded, rng) == data
+        assert decode_in_pieces(encoded.rstrip(b"="), rng) == data
+        assert decode_in_pieces(b"data:image/jpeg;base64," + encoded, rng) == data
+
+
+@pytest.mark.parametrize("text", [b"aGVs*G8=", b"aGVsbG8=aGVs", b"aG=sbG8=", b"a", b"aGVsb"])
+def test_rejects_malformed_base64(text):
+    decoder = Base64StreamDecoder()
+    with pytest.raises(ValueError):
+        decoder.feed(text)
+        decoder.finish()
+
+
+def test_analyze_accepts_json_base64():
+    import main
+
+    client = TestClient(main.app)
+    response = client.post(
+        "/api/combinations/analyze",
+        json={"imageBase64": base64.b64encode(b"hello").decode(), "healthNotes": "cold hands"},
+    )
+    assert response.status_code == 200
+    assert response.json()["ingredients"]
+
+    response = client.post("/api/combinations/analyze", json={"imageBase64": "aGVs*G8=", "healthNotes": ""})
+    assert response.status_code == 400
+
+
+def multipart_body(parts) -> bytes:
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        content_type = b"Content-Type: image/png\r\n" if filename else b""
+        body += b"--XyZ\r\nContent-Disposition: " + disposition.encode() + b"\r\n" + content_type + b"\r\n" + data + b"\r\n"
+    return body + b"--XyZ--\r\n"
+
+
+def ingest_in_pieces(body: bytes, rng: random.Random, **options):
+    async def chunks():
+        i = 0
+        while i < len(body):
+            step = rng.randint(1, 70_000)
+            yield body[i:i + step]
+            i += step
+
+    return asyncio.run(ingest_multipart(chunks(), "multipart/form-data; boundary=XyZ", **options))
+
+
+def test_multipart_files_are_hashed_while_streaming():
+    rng = random.Random(3)
+    images = [rng.randbytes(size) for size in (1, 70_000, 2 * 1024 * 1024)]
+    body = multipart_body([("healthNotes", None, b"cold hands")] + [("files", f"{i}.png", d) for i, d in enumerate(images)])
+    form = ingest_in_pieces(body, rng, max_size=4 * 1024 * 1024, max_files=3)
+    try:
+        assert form.fields == {"healthNotes": "cold hands"}
+        for part, data in zip(form.files, images):
+            assert part.content_type == "image/png"
+            assert (part.upload.digest, part.upload.size) == (hashlib.sha256(data).hexdigest(), len(data))
+            assert part.upload.read() == data
+    finally:
+        form.close()
+
+
+def test_multipart_file_errors_fail_fast_or_stay_on_their_part():
+    body = multipart_body([("files", "big.png", b"x" * 2048), ("files", "empty.png", b""), ("files", "ok.png", b"ok")])
+    with pytest.raises(HTTPException) as failure:
+        ingest_in_pieces(body, random.Random(1), max_size=1024, max_files=3)
+    assert failure.value.status_code == 413
+
+    form = ingest_in_pieces(body, random.Random(1), max_size=1024, max_files=3, fail_fast=False)
+    assert [part.error.status_code if part.error else None for part in form.files] == [413, 400, None]
+    assert form.files[2].upload.read() == b"ok"
+    form.close()
+
+
+def test_large_uploads_are_handed_off_by_their_spool_path():
+    data = random.Random(5).randbytes(3 * 1024 * 1024)
+    form = ingest_in_pieces(multipart_body([("file", "big.png", data)]), random.Random(2), max_size=4 * 1024 * 1024)
+    upload = form.file("file").upload
+    path = upload.handoff()
+    with open(path, "rb") as f:
+        assert f.read() == data
+    form.close()
+    assert not os.path.exists(path)
+
+    small = ingest_in_pieces(multipart_body([("file", "small.png", b"tiny")]), random.Random(2), max_size=1024)
+    assert small.file("file").upload.handoff() == b"tiny"
+    small.close()
+
+
+def test_analyze_multipart_matches_json():
+    import main
+
+    client = TestClient(main.app)
+    image = random.Random(9).randbytes(4096)
+    as_json = client.post(
+        "/api/combinations/analyze", json={"imageBase64": base64.b64encode(image).decode(), "healthNotes": "cold hands"}
+    )
+    as_form = client.post(
+        "/api/combinations/analyze",
+        content=multipart_body([("healthNotes", None, b"cold hands"), ("file", "photo.png", image)]),
+        headers={"Content-Type": "multipart/form-data; boundary=XyZ"},
+    )
+    assert as_form.status_code == 200 and as_form.json() == as_json.json()
+
+    no_file = client.post(
+        "/api/combinations/analyze",
+        content=multipart_body([("healthNotes", None, b"cold hands")]),
+        headers={"Content-Type": "multipart/form-data; boundary=XyZ"},
+    )
+    assert no_file.status_code == 422
+    raw = client.post("/api/combinations/analyze", content=image, headers={"Content-Type": "image/png"})
+    assert raw.status_code == 415
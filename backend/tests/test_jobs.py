@@ -0,0 +1,64 @@
+import asyncio
+import socket
+import subprocess
+import sys
+
+from jobs import JobRunner, JobStore
+from models import JobState
+
+
+def make_store(tmp_path) -> JobStore:
+    return JobStore(str(tmp_path / "jobs.sqlite3"), ttl=60)
+
+
+def test_identical_submissions_share_a_job_until_it_fails(tmp_path):
+    store = make_store(tmp_path)
+    job, created = store.create("analysis", "same", {"n": 1})
+    again, created_again = store.create("analysis", "same", {"n": 1})
+    assert created and not created_again and again["id"] == job["id"]
+
+    store.update(job["id"], status=JobState.DONE.value, result={"ok": True})
+    done, created = store.create("analysis", "same", {"n": 1})
+    assert not created and done["result"] == {"ok": True}
+
+    store.update(job["id"], status=JobState.FAILED.value, error="boom")
+    retry, created = store.create("analysis", "same", {"n": 1})
+    assert created and retry["id"] != job["id"]
+
+
+def test_runner_queues_a_duplicate_submission_once(tmp_path):
+    store = make_store(tmp_path)
+    runner = JobRunner(store, workers=1)
+    calls = []
+
+    async def scenario():
+        first, created = await runner.submit("analysis", "same", {}, lambda progress: calls.append(1) or {"n": 1})
+        second, duplicate = await runner.submit("analysis", "same", {}, lambda progress: calls.append(2) or {"n": 2})
+        async for job in runner.watch(first["id"], heartbeat=5):
+            pass
+        return first, created, second, duplicate, job
+
+    try:
+        first, created, second, duplicate, job = asyncio.run(scenario())
+    finally:
+        runner.shutdown()
+    assert created and not duplicate and second["id"] == first["id"]
+    assert calls == [1] and job["status"] == JobState.DONE.value and job["result"] == {"n": 1}
+
+
+def test_jobs_of_dead_processes_on_this_host_are_failed(tmp_path):
+    store = make_store(tmp_path)
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    host = socket.gethostname()
+
+    orphan, _ = store.create("analysis", "orphan", {})
+    store.update(orphan["id"], owner=f"{host}:{exited.pid}", status=JobState.RUNNING.value)
+    live, _ = store.create("analysis", "live", {})
+    remote, _ = store.create("analysis", "remote", {})
+    store.update(remote["id"], owner=f"elsewhere-{host}:{exited.pid}")
+
+    assert store.fail_orphaned() == 1
+    assert store.get(orphan["id"])["status"] == JobState.FAILED.value
+    assert store.get(live["id"])["status"] == JobState.QUEUED.value
+    assert store.get(remote["id"])["status"] == JobState.QUEUED.value
@@ -0,0 +1,59 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+from catalog import _json_default, load_snapshot
+from mapped_catalog import MappedCatalogSnapshot, compile_catalog
+
+
+@pytest.fixture(scope="module")
+def snapshots(tmp_path_factory):
+    snapshot = load_snapshot()
+    path = compile_catalog(snapshot, str(tmp_path_factory.mktemp("catalog") / "catalog.bin"))
+    return snapshot, MappedCatalogSnapshot(path)
+
+
+def test_lookups_by_key_id_and_name(snapshots):
+    snapshot, mapped = snapshots
+    assert mapped.version == snapshot.version
+    assert list(mapped.food_keys) == list(snapshot.food_keys)
+    for key, food in snapshot.foods.items():
+        assert mapped.foods[key] == food
+        assert mapped.food_by_id(food["id"]) == food
+        assert mapped.food_key_for_name(food["name"].upper()) == snapshot.food_key_for_name(food["name"])
+    assert "no-such-food" not in mapped.foods
+    assert mapped.food_by_id("no-such-id") is None
+    assert mapped.recipes_for("ginger") == snapshot.recipes_for("ginger")
+    assert mapped.recipes_for("no-such-food") == []
+
+
+def test_compiled_indexes_answer_like_the_in_process_ones(snapshots):
+    snapshot, mapped = snapshots
+    for query in ("gin", "ginger", "gnger", "warm", "xyz"):
+        assert mapped.search_index.search(query, limit=10) == snapshot.search_index.search(query, limit=10)
+
+    for notes in ("no fever but cold hands and bloating", "消化不良和失眠", "最近胃口很好"):
+        expected = [match.condition for match in snapshot.health_notes.match(notes)]
+        assert [match.condition for match in mapped.health_notes.match(notes)] == expected
+
+    at = datetime(2026, 6, 10, 15, tzinfo=timezone.utc)
+    for ingredients in ((), ("ginger",), ("ginger", "tofu")):
+        expected = [(d, m["id"], o) for d, m, o in snapshot.market_index.nearest(43.05, -76.15, ingredients, at=at)]
+        actual = [(d, m["id"], o) for d, m, o in mapped.market_index.nearest(43.05, -76.15, ingredients, at=at)]
+        assert actual == expected
+
+
+def test_round_trips_to_the_catalog_dict(snapshots):
+    snapshot, mapped = snapshots
+    assert mapped.to_dict() == json.loads(json.dumps(snapshot.to_dict(), default=_json_default))
+
+
+def test_indexes_open_on_first_use(snapshots, monkeypatch):
+    _, mapped = snapshots
+    monkeypatch.setenv("CATALOG_SNAPSHOT", mapped.file.path)
+    lazy = load_snapshot()
+    assert "search_index" not in vars(lazy) and "market_index" not in vars(lazy)
+    monkeypatch.setenv("CATALOG_WARM_INDEXES", "1")
+    warm = load_snapshot()
+    assert "search_index" in vars(warm) and "market_index" in vars(warm)
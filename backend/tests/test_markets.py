@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+
+import markets
+from markets import MarketIndex
+
+MARKET = {
+    "id": "late",
+    "coordinates": {"latitude": 43.05, "longitude": -76.15},
+    "hours": "Mon-Sun: 6AM - 11PM",
+    "timezone": "America/New_York",
+}
+
+
+def open_at(market: dict, at: datetime):
+    return [open_now for _, _, open_now in MarketIndex.from_markets([market]).nearest(43.05, -76.15, at=at)]
+
+
+def test_hours_are_read_in_the_market_time_zone():
+    # 02:30 UTC is 22:30 the evening before in New York (EDT): still open.
+    assert open_at(MARKET, datetime(2026, 6, 10, 2, 30, tzinfo=timezone.utc)) == [True]
+    # 04:30 UTC is 00:30 in New York: closed, so the market is filtered out.
+    assert open_at(MARKET, datetime(2026, 6, 10, 4, 30, tzinfo=timezone.utc)) == []
+
+
+def test_unknown_time_zone_keeps_the_market_with_unknown_hours():
+    for zone in (None, "Not/AZone"):
+        market = dict(MARKET, timezone=zone)
+        assert open_at(market, datetime(2026, 6, 10, 4, 30, tzinfo=timezone.utc)) == [None]
+
+
+def test_ring_search_wraps_at_the_antimeridian(monkeypatch):
+    monkeypatch.setattr(markets, "DIRECT_SCAN_LIMIT", 0)  # force the grid walk
+
+    def market(market_id: str, lat: float, lon: float) -> dict:
+        return {"id": market_id, "coordinates": {"latitude": lat, "longitude": lon}}
+
+    # Enough far-away markets that the ring search stays within its probe budget.
+    filler = [market(f"filler{i}", 40.0 + i * 0.01, 10.0) for i in range(200)]
+    index = MarketIndex.from_markets(filler + [market("east", 0.0, 179.95), market("west", 0.0, -179.5)])
+    [(distance, nearest, _)] = index.nearest(0.0, -179.95, k=1)
+    assert nearest["id"] == "east" and distance < 7.0
@@ -0,0 +1,37 @@
+from fastapi.testclient import TestClient
+
+from catalog import snapshot_from_dict
+
+
+def test_recommendations_with_unnormalized_food_keys():
+    import main
+
+    foods = {
+        "Goji-Berry": {"id": "1", "name": "Goji Berry", "energeticType": "neutral", "season": "fall", "benefits": "Nourishes blood"},
+        "goji berry": {"id": "2", "name": "Goji (dried)", "energeticType": "warm", "season": None, "benefits": "Warms"},
+        "Winter Melon": {"id": "3", "name": "Winter Melon", "energeticType": "cold", "season": "summer", "benefits": "Clears heat"},
+    }
+    previous = main.catalog.swap(snapshot_from_dict({"foods": foods, "healthConditions": ["Fatigue"]}))
+    try:
+        response = TestClient(main.app).post("/api/recommendations", json={"season": "fall", "k": 3})
+    finally:
+        main.catalog.swap(previous)
+    assert response.status_code == 200
+    ids = [item["food"]["id"] for item in response.json()["foods"]]
+    assert sorted(ids) == ["1", "2", "3"]
+
+
+def test_recommendations_do_not_build_the_search_index(tmp_path):
+    import main
+    from catalog import load_snapshot
+    from mapped_catalog import MappedCatalogSnapshot, compile_catalog
+
+    mapped = MappedCatalogSnapshot(compile_catalog(load_snapshot(), str(tmp_path / "catalog.bin")))
+    previous = main.catalog.swap(mapped)
+    try:
+        response = TestClient(main.app).post("/api/recommendations", json={"season": "winter", "k": 2})
+    finally:
+        main.catalog.swap(previous)
+    assert response.status_code == 200
+    assert len(response.json()["foods"]) == 2
+    assert "search_index" not in vars(mapped)
@@ -0,0 +1,26 @@
+from search import PREFIX_EXPANSION_LIMIT, RANK_DEPTH_MIN, FoodSearchIndex
+
+
+def food(i: int, name: str, benefits: str = "") -> dict:
+    return {"id": str(i), "name": name, "energeticType": "neutral", "season": None, "benefits": benefits}
+
+
+def test_pages_past_the_cached_depth_cover_every_match_once():
+    foods = {f"melon{i}": food(i, f"Melon {i:03d}") for i in range(RANK_DEPTH_MIN * 3)}
+    index = FoodSearchIndex.from_foods(foods, "v1")
+    seen, cursor = [], None
+    while True:
+        page, cursor = index.search("melon", limit=50, cursor=cursor)
+        seen += [doc["id"] for doc in page]
+        if cursor is None:
+            break
+    assert sorted(seen, key=int) == [str(i) for i in range(RANK_DEPTH_MIN * 3)]
+
+
+def test_wide_prefixes_keep_the_most_relevant_terms():
+    # Many rare benefit words share the prefix "ba"; the name term "bamboo" must survive the cut.
+    foods = {f"f{i}": food(i, f"Food {i}", f"ba{i:04d}") for i in range(PREFIX_EXPANSION_LIMIT * 2)}
+    foods["bamboo"] = food(9999, "Bamboo Shoots")
+    index = FoodSearchIndex.from_foods(foods, "v1")
+    page, _ = index.search("ba", limit=1)
+    assert page[0]["name"] == "Bamboo Shoots"
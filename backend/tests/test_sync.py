@@ -0,0 +1,77 @@
+import gzip
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import sync
+from catalog import snapshot_from_dict
+from sync import SyncLog, SyncNotReady
+
+
+def catalog(*names: str):
+    foods = {
+        name: {"id": name, "name": name.title(), "energeticType": "neutral", "season": None, "benefits": ""}
+        for name in names
+    }
+    return snapshot_from_dict({"foods": foods})
+
+
+def read(rendered) -> dict:
+    return json.loads(gzip.decompress(rendered.body))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sync, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def log(tmp_path, clock):
+    log = SyncLog(str(tmp_path / "sync.sqlite3"), str(tmp_path / "snapshots"), tombstone_retention=1500)
+    yield log
+    log.close()
+
+
+def test_delta_holds_only_what_changed_since_the_cursor(log, clock):
+    with pytest.raises(SyncNotReady):
+        log.delta(None)
+    first = log.record(catalog("rice", "ginger"))
+    assert log.record(catalog("rice", "ginger")) == first  # same version: no-op
+
+    clock[0] = 2000.0
+    changed = catalog("rice", "tofu")
+    head = log.record(changed)
+    delta = read(log.delta(log.cursor(first)))
+    assert delta["reset"] is False and delta["cursor"] == log.cursor(head)
+    tofu = json.loads(sync._dumps(changed.foods["tofu"]))
+    assert delta["changes"] == {"foods": {"upsert": {"tofu": tofu}, "delete": ["ginger"]}}
+    assert read(log.delta(log.cursor(head)))["changes"] == {}
+
+
+def test_cursors_from_another_log_or_the_future_reset(log):
+    head = log.record(catalog("rice"))
+    for cursor in (None, "", f"other.{head}", f"{log.log_id}.{head + 1}", f"{log.log_id}.x"):
+        assert read(log.delta(cursor)) == {"reset": True, "cursor": None, "changes": {}}
+
+
+def test_cursors_older_than_the_tombstone_floor_reset(log, clock):
+    first = log.record(catalog("rice", "ginger"))
+    clock[0] = 2000.0
+    second = log.record(catalog("rice"))
+    assert read(log.delta(log.cursor(first)))["changes"] == {"foods": {"delete": ["ginger"]}}
+
+    # Past retention, the "ginger" tombstone is dropped, so a client at `first` could miss the delete.
+    clock[0] = 5000.0
+    head = log.record(catalog("rice", "tofu"))
+    assert read(log.delta(log.cursor(first)))["reset"] is True
+    delta = read(log.delta(log.cursor(second)))
+    assert delta["reset"] is False and list(delta["changes"]["foods"]) == ["upsert"]
+
+    path, cursor = log.snapshot_file()
+    assert cursor == log.cursor(head)
+    with gzip.open(path) as f:
+        snapshot = json.load(f)
+    assert snapshot["reset"] is True and sorted(snapshot["changes"]["foods"]["upsert"]) == ["rice", "tofu"]